@@ -0,0 +1,69 @@
+"""create contrato_nf_resumo aggregate table
+
+Revision ID: 5b8e2c7d41a9
+Revises: 2575a27aa575
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2c7d41a9'
+down_revision = '2575a27aa575'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Cria o agregado de NFs por contrato e popula com os dados existentes
+    """
+    op.create_table('contrato_nf_resumo',
+    sa.Column('contrato_id', sa.Integer(), nullable=False),
+    sa.Column('valor_realizado', sa.DECIMAL(precision=15, scale=2), nullable=False, server_default='0'),
+    sa.Column('valor_pendente', sa.DECIMAL(precision=15, scale=2), nullable=False, server_default='0'),
+    sa.Column('nfs_total', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('nfs_validadas', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('nfs_processadas', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('nfs_erro', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('itens_total', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('itens_integrados', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['contrato_id'], ['contracts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('contrato_id')
+    )
+
+    print("Populando contrato_nf_resumo...")
+    connection = op.get_bind()
+    connection.execute(sa.text("""
+        INSERT INTO contrato_nf_resumo (
+            contrato_id, valor_realizado, valor_pendente,
+            nfs_total, nfs_validadas, nfs_processadas, nfs_erro,
+            itens_total, itens_integrados
+        )
+        SELECT
+            nf.contrato_id,
+            COALESCE(SUM(nf.valor_total) FILTER (WHERE nf.status_processamento = 'validado'), 0),
+            COALESCE(SUM(nf.valor_total) FILTER (WHERE nf.status_processamento = 'processado'), 0),
+            COUNT(*),
+            COUNT(*) FILTER (WHERE nf.status_processamento = 'validado'),
+            COUNT(*) FILTER (WHERE nf.status_processamento = 'processado'),
+            COUNT(*) FILTER (WHERE nf.status_processamento = 'erro'),
+            COALESCE(SUM(i.itens), 0),
+            COALESCE(SUM(i.integrados), 0)
+        FROM notas_fiscais nf
+        LEFT JOIN (
+            SELECT nota_id,
+                   COUNT(*) AS itens,
+                   COUNT(*) FILTER (WHERE status_integracao = 'integrado') AS integrados
+            FROM nf_itens
+            GROUP BY nota_id
+        ) i ON i.nota_id = nf.id
+        WHERE nf.contrato_id IS NOT NULL
+        GROUP BY nf.contrato_id
+    """))
+
+
+def downgrade() -> None:
+    op.drop_table('contrato_nf_resumo')
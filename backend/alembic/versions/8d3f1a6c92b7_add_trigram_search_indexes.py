@@ -0,0 +1,56 @@
+"""add trigram search indexes for NF supplier, item description and contract client
+
+Revision ID: 8d3f1a6c92b7
+Revises: 5b8e2c7d41a9
+Create Date: 2026-10-18 11:40:05.527310
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '8d3f1a6c92b7'
+down_revision = '5b8e2c7d41a9'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_INDEXES = [
+    ('ix_notas_fiscais_nome_fornecedor_trgm', 'notas_fiscais', 'nome_fornecedor'),
+    ('ix_nf_itens_descricao_trgm', 'nf_itens', 'descricao'),
+    ('ix_contracts_cliente_trgm', 'contracts', 'cliente'),
+]
+
+
+def upgrade() -> None:
+    """
+    Habilita unaccent/pg_trgm e cria índices GIN trigram sobre
+    f_unaccent(lower(coluna)), a mesma expressão usada em app.core.text_search
+    """
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite de desenvolvimento: as funções são registradas na conexão
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # unaccent() é STABLE; o wrapper IMMUTABLE permite usá-la em índices
+    op.execute("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT AS
+        $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """)
+
+    for index_name, table, column in SEARCH_INDEXES:
+        op.execute(
+            f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} '
+            f'USING gin (f_unaccent(lower({column})) gin_trgm_ops)'
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    for index_name, _, _ in SEARCH_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {index_name}')
+    op.execute('DROP FUNCTION IF EXISTS f_unaccent(text)')
@@ -0,0 +1,44 @@
+"""create webhook_outbox
+
+Revision ID: a6e3d8f10c25
+Revises: f2b9c5e07a14
+Create Date: 2026-10-18 18:05:44.218307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a6e3d8f10c25'
+down_revision = 'f2b9c5e07a14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('webhook_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('processamento_log_id', sa.Integer(), nullable=False),
+    sa.Column('url', sa.String(length=1000), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False, server_default='pendente'),
+    sa.Column('tentativas', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('proxima_tentativa_em', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('resposta_status', sa.Integer(), nullable=True),
+    sa.Column('ultimo_erro', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('enviado_em', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['processamento_log_id'], ['processamento_logs.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_webhook_outbox_id'), 'webhook_outbox', ['id'], unique=False)
+    op.create_index(op.f('ix_webhook_outbox_processamento_log_id'), 'webhook_outbox', ['processamento_log_id'], unique=False)
+    op.create_index('ix_webhook_outbox_status_proxima', 'webhook_outbox', ['status', 'proxima_tentativa_em'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_outbox_status_proxima', table_name='webhook_outbox')
+    op.drop_index(op.f('ix_webhook_outbox_processamento_log_id'), table_name='webhook_outbox')
+    op.drop_index(op.f('ix_webhook_outbox_id'), table_name='webhook_outbox')
+    op.drop_table('webhook_outbox')
@@ -0,0 +1,65 @@
+"""add arquivos_importados hash table and unique chave_acesso indexes
+
+Revision ID: c41e7b9a2d53
+Revises: 8d3f1a6c92b7
+Create Date: 2026-10-18 14:05:31.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7b9a2d53'
+down_revision = '8d3f1a6c92b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """
+    Cria a tabela de hashes de arquivos ingeridos e torna chave_acesso única
+    em notas_fiscais e invoices (NULLs continuam permitidos)
+    """
+    op.create_table('arquivos_importados',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('nome_arquivo', sa.String(length=500), nullable=True),
+    sa.Column('origem', sa.String(length=50), nullable=False),
+    sa.Column('documento_tipo', sa.String(length=20), nullable=True),
+    sa.Column('documento_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_arquivos_importados_id'), 'arquivos_importados', ['id'], unique=False)
+    op.create_index(op.f('ix_arquivos_importados_sha256'), 'arquivos_importados', ['sha256'], unique=True)
+
+    connection = op.get_bind()
+    duplicated = connection.execute(sa.text("""
+        SELECT chave_acesso, COUNT(*) FROM notas_fiscais
+        WHERE chave_acesso IS NOT NULL
+        GROUP BY chave_acesso HAVING COUNT(*) > 1
+    """)).fetchall()
+    if duplicated:
+        chaves = ", ".join(row[0] for row in duplicated[:10])
+        raise RuntimeError(
+            f"Existem {len(duplicated)} chaves de acesso duplicadas em notas_fiscais "
+            f"(ex.: {chaves}). Remova as duplicatas antes de aplicar esta migração."
+        )
+
+    op.drop_index('ix_notas_fiscais_chave_acesso', table_name='notas_fiscais')
+    op.create_index('ix_notas_fiscais_chave_acesso', 'notas_fiscais', ['chave_acesso'], unique=True)
+
+    op.add_column('invoices', sa.Column('chave_acesso', sa.String(length=44), nullable=True))
+    op.create_index(op.f('ix_invoices_chave_acesso'), 'invoices', ['chave_acesso'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_invoices_chave_acesso'), table_name='invoices')
+    op.drop_column('invoices', 'chave_acesso')
+
+    op.drop_index('ix_notas_fiscais_chave_acesso', table_name='notas_fiscais')
+    op.create_index('ix_notas_fiscais_chave_acesso', 'notas_fiscais', ['chave_acesso'], unique=False)
+
+    op.drop_index(op.f('ix_arquivos_importados_sha256'), table_name='arquivos_importados')
+    op.drop_index(op.f('ix_arquivos_importados_id'), table_name='arquivos_importados')
+    op.drop_table('arquivos_importados')
@@ -0,0 +1,23 @@
+"""add heartbeat_em to ingest_jobs
+
+Revision ID: c5f19e2a7b40
+Revises: a6e3d8f10c25
+Create Date: 2026-10-18 21:12:07.530418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c5f19e2a7b40'
+down_revision = 'a6e3d8f10c25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('ingest_jobs', sa.Column('heartbeat_em', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ingest_jobs', 'heartbeat_em')
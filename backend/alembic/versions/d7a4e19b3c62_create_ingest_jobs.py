@@ -0,0 +1,43 @@
+"""create ingest_jobs
+
+Revision ID: d7a4e19b3c62
+Revises: c41e7b9a2d53
+Create Date: 2026-10-18 15:22:07.418530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd7a4e19b3c62'
+down_revision = 'c41e7b9a2d53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ingest_jobs',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('parametros', sa.JSON(), nullable=True),
+    sa.Column('total_arquivos', sa.Integer(), nullable=True),
+    sa.Column('processados', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('falhas', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('ignorados', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('resultado', sa.JSON(), nullable=True),
+    sa.Column('erro', sa.Text(), nullable=True),
+    sa.Column('criado_por', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['criado_por'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ingest_jobs_status'), 'ingest_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ingest_jobs_status'), table_name='ingest_jobs')
+    op.drop_table('ingest_jobs')
@@ -0,0 +1,41 @@
+"""create chunked_uploads
+
+Revision ID: f2b9c5e07a14
+Revises: d7a4e19b3c62
+Create Date: 2026-10-18 16:40:12.730915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f2b9c5e07a14'
+down_revision = 'd7a4e19b3c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chunked_uploads',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('contract_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=500), nullable=False),
+    sa.Column('tamanho_total', sa.BigInteger(), nullable=False),
+    sa.Column('recebido', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('sha256', sa.String(length=64), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('job_id', sa.String(length=36), nullable=True),
+    sa.Column('criado_por', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['contract_id'], ['contracts.id'], ),
+    sa.ForeignKeyConstraint(['job_id'], ['ingest_jobs.id'], ),
+    sa.ForeignKeyConstraint(['criado_por'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_chunked_uploads_status'), 'chunked_uploads', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_chunked_uploads_status'), table_name='chunked_uploads')
+    op.drop_table('chunked_uploads')
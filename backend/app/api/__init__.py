@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.routes import auth, contracts, purchases, reports, dashboards, import_data, nf, classification, invoices
+from app.api.routes import auth, contracts, purchases, reports, dashboards, import_data, nf, classification, invoices, jobs
 
 api_router = APIRouter()
 
@@ -17,4 +17,5 @@ api_router.include_router(dashboards.router, prefix="/dashboards", tags=["dashbo
 api_router.include_router(import_data.router, prefix="/import", tags=["import"])
 api_router.include_router(nf.router, prefix="/nf", tags=["notas-fiscais"])
 api_router.include_router(classification.router, prefix="/classification", tags=["classification"])
-api_router.include_router(invoices.router, prefix="/invoices", tags=["invoices"])
\ No newline at end of file
+api_router.include_router(invoices.router, prefix="/invoices", tags=["invoices"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
\ No newline at end of file
@@ -6,6 +6,8 @@ from datetime import datetime
 from sqlalchemy import func
 
 from app.core.database import get_db
+from app.core.pagination import paginate_keyset
+from app.core.text_search import contains
 from app.api.dependencies import get_current_user, get_comercial_user
 from app.models.users import User
 from app.models.contracts import Contract, BudgetItem, ValorPrevisto
@@ -18,6 +20,7 @@ from app.schemas.contracts import (
     ContractListResponse,
     ValorPrevistoResponse
 )
+from app.services.dashboard_cache import TAG_CONTRACTS, invalidate_dashboards
 from app.services.nf_service import NotaFiscalService
 
 router = APIRouter()
@@ -29,6 +32,9 @@ async def list_contracts(
     limit: int = Query(10, ge=1, le=100),
     cliente: Optional[str] = Query(None),
     status_filter: Optional[str] = Query(None, alias="status"),
+    after: Optional[str] = Query(None, description="Cursor opaco da página anterior (paginação keyset)"),
+    cursor: bool = Query(False, description="Usar paginação por cursor em vez de skip/limit"),
+    include_total: bool = Query(False, description="No modo cursor, contar o total de registros"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -37,18 +43,27 @@ async def list_contracts(
     query = db.query(Contract)
 
     if cliente:
-        query = query.filter(Contract.cliente.ilike(f"%{cliente}%"))
+        query = query.filter(contains(Contract.cliente, cliente))
     if status_filter:
         query = query.filter(Contract.status == status_filter)
 
-    total = query.count()
-    contracts = query.offset(skip).limit(limit).all()
+    cursor_mode = cursor or after is not None
+    total = query.count() if include_total or not cursor_mode else None
+
+    next_cursor = None
+    if cursor_mode:
+        contracts, next_cursor = paginate_keyset(
+            query, Contract.created_at, Contract.id, limit, after=after
+        )
+    else:
+        contracts = query.offset(skip).limit(limit).all()
 
     service = NotaFiscalService(db)
+    realized_values = service.get_contracts_realized_values([contract.id for contract in contracts])
     contract_responses = []
 
     for contract in contracts:
-        valor_realizado = service.calculate_contract_realized_value(contract.id)
+        valor_realizado = realized_values[contract.id]
         percentual_realizado = (
             (valor_realizado / Decimal(contract.valor_original)) * 100
             if contract.valor_original > 0 else Decimal('0')
@@ -87,7 +102,8 @@ async def list_contracts(
         contracts=contract_responses,
         total=total,
         page=(skip // limit) + 1,
-        per_page=limit
+        per_page=limit,
+        next_cursor=next_cursor
     )
 
 
@@ -113,7 +129,7 @@ async def get_contracts_kpis(
     active_contracts = len([c for c in contracts if c.status == "Em Andamento"])
 
     service = NotaFiscalService(db)
-    total_realized = sum(service.calculate_contract_realized_value(contract.id) for contract in contracts)
+    total_realized = service.ledger.total_realized()
 
     avg_progress = (total_realized / total_value) * 100 if total_value > 0 else Decimal('0')
 
@@ -220,6 +236,7 @@ async def create_contract(
 
     db.add(new_contract)
     db.commit()
+    invalidate_dashboards(TAG_CONTRACTS)
     db.refresh(new_contract)
 
     try:
@@ -228,10 +245,12 @@ async def create_contract(
         if not final_import['success']:
             db.delete(new_contract)
             db.commit()
+            invalidate_dashboards(TAG_CONTRACTS)
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Erro ao salvar itens do orçamento: {final_import['errors']}")
     except Exception as e:
         db.delete(new_contract)
         db.commit()
+        invalidate_dashboards(TAG_CONTRACTS)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Erro ao processar orçamento: {str(e)}")
 
     valor_realizado = Decimal('0')
@@ -279,6 +298,7 @@ async def update_contract(
         setattr(contract, field, value)
 
     db.commit()
+    invalidate_dashboards(TAG_CONTRACTS)
     db.refresh(contract)
 
     service = NotaFiscalService(db)
@@ -324,5 +344,6 @@ async def delete_contract(
     db.query(BudgetItem).filter(BudgetItem.contract_id == contract_id).delete()
     db.delete(contract)
     db.commit()
+    invalidate_dashboards(TAG_CONTRACTS)
 
     return {"message": f"Contrato {contract_id} excluído com sucesso"}
@@ -158,12 +158,8 @@ async def get_dashboard_kpis(
 
     # Calcular valores reais baseados nas NFs validadas
     total_value = sum(float(contract.valor_original) for contract in contracts)
-    total_spent = 0
-
-    # Somar valor realizado de todos os contratos
-    for contract in contracts:
-        contract_spent = float(nf_service.calculate_contract_realized_value(contract.id))
-        total_spent += contract_spent
+    # Somar valor realizado de todos os contratos a partir do agregado por contrato
+    total_spent = float(nf_service.ledger.total_realized())
 
     contract_balance = total_value - total_spent
 
@@ -206,12 +202,13 @@ async def get_active_contracts(
     contracts = db.query(Contract).filter(Contract.status == "Em Andamento").limit(5).all()
 
     nf_service = NotaFiscalService(db)
+    realized_values = nf_service.get_contracts_realized_values([contract.id for contract in contracts])
     result = []
 
     for contract in contracts:
         # Calcular valores reais baseados nas NFs validadas
         budget = float(contract.valor_original)
-        spent = float(nf_service.calculate_contract_realized_value(contract.id))
+        spent = float(realized_values[contract.id])
         progress = (spent / budget) * 100 if budget > 0 else 0
 
         result.append({
@@ -1,4 +1,7 @@
+import json
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional
 from app.core.database import get_db
@@ -12,15 +15,18 @@ router = APIRouter()
 @router.post("/validate-file")
 async def validate_file(
     file: UploadFile = File(...),
+    sheet_name: Optional[str] = Form(None),
+    header_rows: int = Form(10, ge=1, le=100),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Valida formato do arquivo e retorna informações básicas.
-    Útil para preview antes do upload real.
+    Útil para preview antes do upload real: lê só o cabeçalho e devolve
+    modelo detectado, mapeamento de colunas e estimativa de linhas.
     """
     service = SimpleDataImportService(db)
-    file_info = await service.validate_file_format(file)
+    file_info = await service.validate_file_format(file, sheet_name, header_rows)
     
     return {
         "valid": file_info["valid"],
@@ -170,72 +176,17 @@ async def bulk_import_invoices(
     """
     Importação em lote de múltiplas notas fiscais.
     Aceita diversos formatos (XML, Excel, CSV).
+
+    Os arquivos são processados em paralelo (limitado) e a resposta é NDJSON:
+    uma linha por arquivo, na ordem em que terminam, e uma linha final com o resumo.
     """
     service = SimpleDataImportService(db)
-    results = []
-    
-    for file in files:
-        try:
-            # Determinar tipo do arquivo e importar apropriadamente
-            if file.filename.endswith('.xml'):
-                # Para XML, precisamos associar a uma ordem de compra existente
-                # Por simplicidade, vamos buscar a primeira OC do contrato
-                from app.models.purchases import PurchaseOrder
-                po = db.query(PurchaseOrder).filter(
-                    PurchaseOrder.contract_id == contract_id
-                ).first()
-                
-                if not po:
-                    results.append({
-                        "file": file.filename,
-                        "success": False,
-                        "error": "Nenhuma ordem de compra encontrada para este contrato"
-                    })
-                    continue
-                
-                result = await service.import_invoice_from_xml(file, po.id)
-                
-            elif file.filename.endswith(('.xlsx', '.xls')):
-                # Para Excel, também precisamos de uma ordem de compra
-                from app.models.purchases import PurchaseOrder
-                po = db.query(PurchaseOrder).filter(
-                    PurchaseOrder.contract_id == contract_id
-                ).first()
-                
-                if not po:
-                    results.append({
-                        "file": file.filename,
-                        "success": False,
-                        "error": "Nenhuma ordem de compra encontrada para este contrato"
-                    })
-                    continue
-                
-                result = await service.import_invoice_from_excel(file, po.id)
-            
-            else:
-                results.append({
-                    "file": file.filename,
-                    "success": False,
-                    "error": "Formato de arquivo não suportado"
-                })
-                continue
-            
-            results.append({
-                "file": file.filename,
-                "success": True,
-                "details": result
-            })
-            
-        except Exception as e:
-            results.append({
-                "file": file.filename,
-                "success": False,
-                "error": str(e)
-            })
-    
-    successful_imports = sum(1 for r in results if r["success"])
-    
-    return {
-        "message": f"{successful_imports}/{len(files)} arquivos importados com sucesso",
-        "results": results
-    }
\ No newline at end of file
+
+    async def stream():
+        results = []
+        async for result in service.iter_contract_invoices(contract_id, files):
+            results.append(result)
+            yield json.dumps(jsonable_encoder(result), ensure_ascii=False) + "\n"
+        yield json.dumps({"summary": service.summarize_contract_invoices(results)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
\ No newline at end of file
@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
 from app.api.dependencies import get_current_user, get_suprimentos_user
 from app.models.users import User
 from app.models.purchases import Invoice, InvoiceItem
+from app.services.dashboard_cache import TAG_PURCHASES, invalidate_dashboards
 from app.services.invoice_processing_service import InvoiceProcessingService
+from app.services.chunked_upload import ChunkedUploadService
 from app.schemas.invoices import InvoiceResponse, InvoiceUploadResponse, OneDriveUrlRequest
+from app.schemas.jobs import ChunkedUploadInit, ChunkedUploadResponse, IngestJobResponse
 
 router = APIRouter()
 
@@ -23,24 +26,7 @@ async def upload_invoices_zip(
     Processa automaticamente todos os arquivos XML/PDF dentro do ZIP.
     """
 
-    # Validar se é arquivo ZIP
-    if not file.filename.lower().endswith('.zip'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Arquivo deve ser do tipo ZIP"
-        )
-
-    # Validar tamanho do arquivo (máximo 100MB)
-    file_size = 0
-    content = await file.read()
-    file_size = len(content)
-    await file.seek(0)  # Reset file position
-
-    if file_size > 100 * 1024 * 1024:  # 100MB
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Arquivo ZIP muito grande. Máximo permitido: 100MB"
-        )
+    InvoiceProcessingService.check_zip_upload(file)
 
     try:
         service = InvoiceProcessingService(db)
@@ -56,9 +42,15 @@ async def upload_invoices_zip(
             processed_count=result['processed_count'],
             failed_count=result['failed_count'],
             invoices=result['invoices'],
-            errors=result['errors']
+            errors=result['errors'],
+            skipped_count=result['skipped_count'],
+            skipped=result['skipped'],
+            needs_xml_count=result['needs_xml_count'],
+            needs_xml=result['needs_xml']
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -66,6 +58,75 @@ async def upload_invoices_zip(
         )
 
 
+@router.post("/uploads", response_model=ChunkedUploadResponse, status_code=status.HTTP_201_CREATED)
+async def init_chunked_upload(
+    request: ChunkedUploadInit,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Inicia um upload retomável de ZIP em partes. Em seguida envie as partes
+    com PUT /uploads/{id}?offset=N (corpo binário, cabeçalho X-Chunk-SHA256)
+    e finalize com POST /uploads/{id}/complete.
+    """
+    service = ChunkedUploadService(db)
+    upload = service.init_upload(
+        request.contract_id, request.filename, request.size, request.sha256, current_user.id
+    )
+    return service.to_response(upload)
+
+
+@router.get("/uploads/{upload_id}", response_model=ChunkedUploadResponse)
+async def get_chunked_upload(
+    upload_id: str,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """Estado do upload; `recebido` é o offset a partir do qual continuar"""
+    service = ChunkedUploadService(db)
+    return service.to_response(service.get_upload(upload_id, current_user.id))
+
+
+@router.put("/uploads/{upload_id}", response_model=ChunkedUploadResponse)
+async def put_upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None, description="SHA-256 (hex) da parte"),
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """Envia a parte que começa em `offset`; o corpo é gravado em stream no staging"""
+    service = ChunkedUploadService(db)
+    upload = await service.write_chunk(upload_id, offset, request.stream(), x_chunk_sha256, current_user.id)
+    return service.to_response(upload)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=IngestJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def complete_chunked_upload(
+    upload_id: str,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Confere o arquivo montado e o entrega ao job de ingestão de ZIP;
+    acompanhe o processamento por GET /jobs/{id}
+    """
+    service = ChunkedUploadService(db)
+    return await service.complete_upload(upload_id, current_user.id)
+
+
+@router.delete("/uploads/{upload_id}")
+async def cancel_chunked_upload(
+    upload_id: str,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """Cancela o upload e remove o arquivo de staging"""
+    ChunkedUploadService(db).cancel_upload(upload_id, current_user.id)
+    return {"message": "Upload cancelado"}
+
+
 @router.post("/onedrive-url/{contract_id}", response_model=InvoiceUploadResponse)
 async def process_onedrive_url(
     contract_id: int,
@@ -92,7 +153,11 @@ async def process_onedrive_url(
             processed_count=result['processed_count'],
             failed_count=result['failed_count'],
             invoices=result['invoices'],
-            errors=result['errors']
+            errors=result['errors'],
+            skipped_count=result['skipped_count'],
+            skipped=result['skipped'],
+            needs_xml_count=result['needs_xml_count'],
+            needs_xml=result['needs_xml']
         )
 
     except Exception as e:
@@ -176,6 +241,7 @@ async def delete_invoice(
     # Deletar nota fiscal
     db.delete(invoice)
     db.commit()
+    invalidate_dashboards(TAG_PURCHASES)
 
     return {"message": f"Nota fiscal {invoice.numero_nf} removida com sucesso"}
 
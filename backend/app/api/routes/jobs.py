@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List
+from app.core.database import get_db
+from app.api.dependencies import get_current_user, get_suprimentos_user
+from app.models.users import User, UserRole
+from app.services.ingest_jobs import IngestJobService
+from app.services.invoice_processing_service import InvoiceProcessingService
+from app.schemas.invoices import OneDriveUrlRequest
+from app.schemas.jobs import IngestJobResponse
+
+router = APIRouter()
+
+
+def _can_see_all_jobs(user: User) -> bool:
+    return user.role in (UserRole.ADMIN, UserRole.DIRETORIA)
+
+
+@router.post("/invoices/upload-zip/{contract_id}", response_model=IngestJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_invoices_zip(
+    contract_id: int,
+    file: UploadFile = File(..., description="Arquivo ZIP contendo notas fiscais"),
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Versão assíncrona de POST /invoices/upload-zip/{contract_id}.
+    O ZIP é guardado e processado em segundo plano; acompanhe por GET /jobs/{id}.
+    """
+    InvoiceProcessingService.check_zip_upload(file)
+
+    service = IngestJobService(db)
+    job = await service.submit(
+        "invoice_zip",
+        {"contract_id": contract_id, "filename": file.filename},
+        current_user.id,
+        files={"upload.zip": file.file}
+    )
+    return service.to_response(job)
+
+
+@router.post("/invoices/onedrive-url/{contract_id}", response_model=IngestJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_onedrive_url(
+    contract_id: int,
+    request: OneDriveUrlRequest,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """Versão assíncrona de POST /invoices/onedrive-url/{contract_id}"""
+    service = IngestJobService(db)
+    job = await service.submit(
+        "onedrive",
+        {"contract_id": contract_id, "folder_url": request.folder_url},
+        current_user.id
+    )
+    return service.to_response(job)
+
+
+@router.post("/import/bulk/invoices", response_model=IngestJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_bulk_invoices(
+    contract_id: int = Form(...),
+    files: list[UploadFile] = File(...),
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """Versão assíncrona de POST /import/bulk/invoices"""
+    service = IngestJobService(db)
+    job = await service.submit(
+        "bulk_invoices",
+        {"contract_id": contract_id, "files": [file.filename for file in files]},
+        current_user.id,
+        files={str(index): file.file for index, file in enumerate(files)}
+    )
+    return service.to_response(job)
+
+
+@router.get("/", response_model=List[IngestJobResponse])
+async def list_jobs(
+    limit: int = 50,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Jobs mais recentes (do próprio usuário; todos para admin/diretoria)"""
+    service = IngestJobService(db)
+    jobs = service.list_jobs(
+        criado_por=None if _can_see_all_jobs(current_user) else current_user.id,
+        limit=min(limit, 200)
+    )
+    return [service.to_response(job) for job in jobs]
+
+
+@router.get("/{job_id}", response_model=IngestJobResponse)
+async def get_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Estado do job: arquivos processados, com falha, ignorados e restantes, e vazão"""
+    service = IngestJobService(db)
+    job = service.get_job(job_id)
+
+    if not job or (job.criado_por != current_user.id and not _can_see_all_jobs(current_user)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job não encontrado"
+        )
+
+    return service.to_response(job)
@@ -1,23 +1,36 @@
 """Endpoints para gestão de Notas Fiscais"""
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-import httpx
+import json
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.pagination import paginate_keyset
 from app.api.dependencies import get_current_user, get_suprimentos_user
 from app.models.users import User
-from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem, ProcessamentoLog
+from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem, ProcessamentoLog, WebhookOutbox
 from app.models.contracts import Contract
-from app.services.nf_service import NotaFiscalService
+from app.services.nf_service import NotaFiscalService, iter_ndjson
+from app.services.nf_kpis import invalidate_nf_kpis
+from app.services.n8n_outbox import N8nOutboxService, wake_n8n_dispatcher
+from app.services.nf_export import NFExportService
+from app.services.nf_search import NFSearchService
+from app.services.cost_center_classifier import CostCenterClassifier
 from app.schemas.notas_fiscais import (
     ProcessFolderRequest,
     ProcessFolderResponse,
+    ProcessFoldersRequest,
+    ProcessFoldersResponse,
+    NotaFiscalIngestResponse,
     NotaFiscalListResponse,
     NotaFiscalStats,
     ProcessamentoLogListResponse,
-    NotaFiscalItemUpdate
+    NotaFiscalItemUpdate,
+    NotaFiscalValidateBatchRequest,
+    NotaFiscalClassifyBatchRequest
 )
 
 router = APIRouter()
@@ -30,29 +43,25 @@ async def get_nfs(
     status_filter: Optional[str] = Query(None, alias="status"),
     supplier: Optional[str] = Query(None),
     contract_id: Optional[int] = Query(None),
+    after: Optional[str] = Query(None, description="Cursor opaco da página anterior (paginação keyset)"),
+    cursor: bool = Query(False, description="Usar paginação por cursor em vez de skip/limit"),
+    include_total: bool = Query(False, description="No modo cursor, contar o total de registros"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Lista todas as notas fiscais processadas pelo n8n"""
 
-    # Consultar notas fiscais reais do banco
-    query = db.query(NotaFiscal)
-
-    # Aplicar filtros
-    if status_filter:
-        query = query.filter(NotaFiscal.status_processamento.ilike(f"%{status_filter}%"))
-
-    if supplier:
-        query = query.filter(NotaFiscal.nome_fornecedor.ilike(f"%{supplier}%"))
-
-    if contract_id:
-        query = query.filter(NotaFiscal.contrato_id == contract_id)
-
-    # Contar total antes da paginação
-    total = query.count()
-
-    # Aplicar paginação
-    nfs = query.offset(skip).limit(limit).all()
+    service = NotaFiscalService(db)
+    rows, total, next_cursor = service.get_notas_fiscais(
+        skip=skip,
+        limit=limit,
+        status_filter=status_filter,
+        supplier=supplier,
+        contract_id=contract_id,
+        after=after,
+        use_cursor=cursor,
+        include_total=include_total
+    )
 
     return {
         "nfs": [
@@ -61,7 +70,7 @@ async def get_nfs(
                 "number": nf.numero,
                 "series": nf.serie,
                 "supplier": nf.nome_fornecedor,
-                "contract": nf.contrato.nome_projeto if nf.contrato else None,
+                "contract": contrato_nome,
                 "contract_id": nf.contrato_id,
                 "valor_total": float(nf.valor_total) if nf.valor_total else 0,
                 "date": nf.data_emissao.strftime("%Y-%m-%d") if nf.data_emissao else None,
@@ -69,74 +78,15 @@ async def get_nfs(
                 "pasta_origem": nf.pasta_origem,
                 "subpasta": nf.subpasta,
                 "chave_acesso": nf.chave_acesso,
-                "items_count": len(nf.itens) if nf.itens else 0,
+                "items_count": itens_count,
                 "processed_at": nf.processed_by_n8n_at.isoformat() if nf.processed_by_n8n_at else None
             }
-            for nf in nfs
+            for nf, contrato_nome, itens_count in rows
         ],
         "total": total,
         "page": skip // limit + 1,
-        "per_page": limit
-    }
-
-
-@router.get("/{nf_id}")
-async def get_nf(
-    nf_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Detalhe de uma nota fiscal específica com seus itens"""
-
-    nf = db.query(NotaFiscal).filter(NotaFiscal.id == nf_id).first()
-    if not nf:
-        raise HTTPException(status_code=404, detail="Nota fiscal não encontrada")
-
-    return {
-        "id": nf.id,
-        "number": nf.numero,
-        "series": nf.serie,
-        "chave_acesso": nf.chave_acesso,
-        "supplier": nf.nome_fornecedor,
-        "cnpj_fornecedor": nf.cnpj_fornecedor,
-        "contract": nf.contrato.nome_projeto if nf.contrato else None,
-        "contract_id": nf.contrato_id,
-        "value": float(nf.valor_total) if nf.valor_total else 0,
-        "valor_produtos": float(nf.valor_produtos) if nf.valor_produtos else 0,
-        "valor_impostos": float(nf.valor_impostos) if nf.valor_impostos else 0,
-        "valor_frete": float(nf.valor_frete) if nf.valor_frete else 0,
-        "date": nf.data_emissao.strftime("%Y-%m-%d") if nf.data_emissao else None,
-        "data_entrada": nf.data_entrada.strftime("%Y-%m-%d") if nf.data_entrada else None,
-        "status": nf.status_processamento,
-        "pasta_origem": nf.pasta_origem,
-        "subpasta": nf.subpasta,
-        "observacoes": nf.observacoes,
-        "ordem_compra_id": nf.ordem_compra_id,
-        "processed_at": nf.processed_by_n8n_at.isoformat() if nf.processed_by_n8n_at else None,
-        "created_at": nf.created_at.isoformat() if nf.created_at else None,
-        "items": [
-            {
-                "id": item.id,
-                "numero_item": item.numero_item,
-                "codigo_produto": item.codigo_produto,
-                "description": item.descricao,
-                "quantity": float(item.quantidade) if item.quantidade else 0,
-                "unitValue": float(item.valor_unitario) if item.valor_unitario else 0,
-                "totalValue": float(item.valor_total) if item.valor_total else 0,
-                "unit": item.unidade,
-                "peso_liquido": float(item.peso_liquido) if item.peso_liquido else None,
-                "peso_bruto": float(item.peso_bruto) if item.peso_bruto else None,
-                "ncm": item.ncm,
-                "centro_custo_id": item.centro_custo_id,
-                "centro_custo": item.centro_custo.nome if item.centro_custo else None,
-                "item_orcamento_id": item.item_orcamento_id,
-                "classificationScore": float(item.score_classificacao) if item.score_classificacao else None,
-                "classificationSource": item.fonte_classificacao,
-                "status_integracao": item.status_integracao,
-                "integrado_em": item.integrado_em.isoformat() if item.integrado_em else None
-            }
-            for item in nf.itens
-        ] if nf.itens else []
+        "per_page": limit,
+        "next_cursor": next_cursor
     }
 
 
@@ -145,15 +95,23 @@ async def get_nfs_by_folder(
     folder_name: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor opaco da página anterior (paginação keyset)"),
+    cursor: bool = Query(False, description="Usar paginação por cursor em vez de skip/limit"),
+    include_total: bool = Query(False, description="No modo cursor, contar o total de registros"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Lista notas fiscais por pasta (subpasta)"""
 
-    query = db.query(NotaFiscal).filter(NotaFiscal.pasta_origem == folder_name)
-
-    total = query.count()
-    nfs = query.offset(skip).limit(limit).all()
+    service = NotaFiscalService(db)
+    rows, total, next_cursor = service.get_notas_fiscais_by_folder(
+        folder_name,
+        skip=skip,
+        limit=limit,
+        after=after,
+        use_cursor=cursor,
+        include_total=include_total
+    )
 
     return {
         "folder_name": folder_name,
@@ -168,13 +126,14 @@ async def get_nfs_by_folder(
                 "subpasta": nf.subpasta,
                 "status_processamento": nf.status_processamento,
                 "contrato_id": nf.contrato_id,
-                "itens_count": len(nf.itens) if nf.itens else 0
+                "itens_count": itens_count
             }
-            for nf in nfs
+            for nf, _, itens_count in rows
         ],
         "total": total,
         "page": skip // limit + 1,
-        "per_page": limit
+        "per_page": limit,
+        "next_cursor": next_cursor
     }
 
 
@@ -241,6 +200,60 @@ async def get_contract_realized_value(
     }
 
 
+@router.get("/contracts/summary")
+async def get_contracts_summary(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    cliente: Optional[str] = Query(None),
+    only_with_nfs: bool = Query(False, description="Apenas contratos com NFs vinculadas"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Sumário dos contratos com contagens de NFs e valor realizado"""
+
+    service = NotaFiscalService(db)
+    contracts = service.get_contracts_summary_with_nfs(
+        skip=skip,
+        limit=limit,
+        status_filter=status_filter,
+        cliente=cliente,
+        only_with_nfs=only_with_nfs
+    )
+
+    return {
+        "contracts": contracts,
+        "page": skip // limit + 1,
+        "per_page": limit
+    }
+
+
+@router.get("/search")
+async def search_nfs(
+    q: str = Query(..., min_length=2, description="Termo buscado no fornecedor e na descrição dos itens"),
+    limit: int = Query(20, ge=1, le=100),
+    contract_id: Optional[int] = Query(None),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Busca NFs por fornecedor e itens, ignorando acentos, ordenadas por relevância"""
+
+    service = NFSearchService(db)
+    results = service.search(
+        q.strip(),
+        limit=limit,
+        contract_id=contract_id,
+        status_filter=status_filter
+    )
+
+    return {
+        "query": q,
+        "results": results,
+        "total": len(results)
+    }
+
+
 @router.get("/stats")
 async def get_nf_stats(
     current_user: User = Depends(get_current_user),
@@ -248,34 +261,25 @@ async def get_nf_stats(
 ):
     """Estatísticas das notas fiscais processadas"""
 
-    from sqlalchemy import func, extract
-
-    # Estatísticas básicas
-    total_nfs = db.query(NotaFiscal).count()
-
-    # Distribuição por status
-    status_counts = db.query(
-        NotaFiscal.status_processamento,
-        func.count(NotaFiscal.id).label('count')
-    ).group_by(NotaFiscal.status_processamento).all()
+    service = NotaFiscalService(db)
+    stats = service.get_statistics()
+    stats.pop("monthly_stats")
 
-    status_distribution = {status: count for status, count in status_counts}
+    return stats
 
-    # Valor total
-    total_value_result = db.query(func.sum(NotaFiscal.valor_total)).scalar()
-    total_value = float(total_value_result) if total_value_result else 0
 
+def _folder_response(processing_log: ProcessamentoLog, entry: WebhookOutbox) -> dict:
     return {
-        "total_nfs": total_nfs,
-        "pending_validation": status_distribution.get("processado", 0),
-        "validated": status_distribution.get("validado", 0),
-        "rejected": status_distribution.get("erro", 0),
-        "total_value": total_value,
-        "status_distribution": status_distribution
+        "success": True,
+        "message": f"Processamento da pasta '{processing_log.pasta_nome}' iniciado com sucesso",
+        "webhook_status": None,
+        "processing_log_id": processing_log.id,
+        "n8n_url": entry.url,
+        "status": processing_log.status
     }
 
 
-@router.post("/process-folder", response_model=ProcessFolderResponse)
+@router.post("/process-folder", response_model=ProcessFolderResponse, status_code=status.HTTP_202_ACCEPTED)
 async def process_folder(
     folder_data: ProcessFolderRequest,
     current_user: User = Depends(get_suprimentos_user),
@@ -283,97 +287,102 @@ async def process_folder(
 ):
     """
     Endpoint para processar pasta de notas fiscais via n8n
-    Recebe nome da pasta e chama webhook do n8n para processamento
+    Registra o log e enfileira o webhook do n8n; o envio é feito em segundo
+    plano e o resultado aparece no log (GET /processing-logs)
     """
 
-    folder_name = folder_data.nome_pasta
+    folder_name = folder_data.nome_pasta.strip()
     if not folder_name:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Nome da pasta é obrigatório"
         )
 
-    # Registrar log de processamento iniciado
-    processing_log = ProcessamentoLog(
-        pasta_nome=folder_name,
-        webhook_chamado_em=datetime.now(),
-        status="iniciado",
-        mensagem="Webhook n8n chamado para processar pasta"
-    )
-    db.add(processing_log)
-    db.commit()
-    db.refresh(processing_log)
-
-    try:
-        # Chamar webhook do n8n
-        n8n_webhook_url = f"https://n8n.gmxindustrial.com.br/webhook/nome_pasta/{folder_name}"
+    [(processing_log, entry)] = N8nOutboxService(db).enqueue_folders([folder_name], current_user)
+    wake_n8n_dispatcher()
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(n8n_webhook_url, json={
-                "nome_pasta": folder_name,
-                "user_id": current_user.id,
-                "user_name": current_user.full_name,
-                "timestamp": datetime.now().isoformat()
-            })
+    return _folder_response(processing_log, entry)
 
-        # Atualizar log com sucesso
-        processing_log.status = "webhook_enviado"
-        processing_log.mensagem = f"Webhook enviado com sucesso. Status: {response.status_code}"
-        db.commit()
 
-        return {
-            "success": True,
-            "message": f"Processamento da pasta '{folder_name}' iniciado com sucesso",
-            "webhook_status": response.status_code,
-            "processing_log_id": processing_log.id,
-            "n8n_url": n8n_webhook_url
-        }
+@router.post("/process-folders", response_model=ProcessFoldersResponse, status_code=status.HTTP_202_ACCEPTED)
+async def process_folders(
+    folders_data: ProcessFoldersRequest,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Enfileira o processamento de várias pastas via n8n em uma única chamada
+    (um log por pasta; nomes repetidos são enviados uma vez)
+    """
+    entries = N8nOutboxService(db).enqueue_folders(folders_data.nomes_pasta, current_user)
+    wake_n8n_dispatcher()
 
-    except httpx.TimeoutException:
-        # Atualizar log com erro de timeout
-        processing_log.status = "erro"
-        processing_log.detalhes_erro = "Timeout ao chamar webhook n8n"
-        db.commit()
+    return {
+        "success": True,
+        "message": f"Processamento de {len(entries)} pasta(s) iniciado com sucesso",
+        "pastas": [_folder_response(processing_log, entry) for processing_log, entry in entries]
+    }
 
-        raise HTTPException(
-            status_code=status.HTTP_408_REQUEST_TIMEOUT,
-            detail="Timeout ao chamar webhook n8n. Tente novamente."
-        )
 
-    except httpx.RequestError as e:
-        # Atualizar log com erro de conexão
-        processing_log.status = "erro"
-        processing_log.detalhes_erro = f"Erro de conexão: {str(e)}"
-        db.commit()
+async def _iter_list(records: list):
+    for record in records:
+        yield record
 
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Erro ao conectar com n8n: {str(e)}"
-        )
 
-    except Exception as e:
-        # Atualizar log com erro geral
-        processing_log.status = "erro"
-        processing_log.detalhes_erro = f"Erro inesperado: {str(e)}"
-        db.commit()
+@router.post("/ingest-batch", response_model=NotaFiscalIngestResponse)
+async def ingest_nf_batch(
+    request: Request,
+    processamento_log_id: Optional[int] = Query(None, description="Log do processamento da pasta (padrão: último log de cada pasta)"),
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Ingestão em lote das NFs processadas pelo n8n, com itens.
 
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro interno: {str(e)}"
-        )
+    Corpo: array JSON de NFs ou NDJSON (Content-Type application/x-ndjson,
+    uma NF por linha, lido em stream). Upsert pela chave de acesso; registros
+    inválidos voltam em `erros` sem impedir os demais.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        records = iter_ndjson(request.stream())
+    else:
+        try:
+            body = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Corpo deve ser um array JSON ou NDJSON")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Corpo deve ser um array JSON de notas fiscais")
+        if len(body) > settings.nf_ingest_max_batch:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Lote excede {settings.nf_ingest_max_batch} NFs por chamada"
+            )
+        records = _iter_list(body)
+
+    return await NotaFiscalService(db).ingest_batch(records, processamento_log_id)
 
 
 @router.get("/processing-logs")
 async def get_processing_logs(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor opaco da página anterior (paginação keyset)"),
+    cursor: bool = Query(False, description="Usar paginação por cursor em vez de skip/limit"),
+    include_total: bool = Query(False, description="No modo cursor, contar o total de registros"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Lista logs de processamento das pastas"""
 
-    logs = db.query(ProcessamentoLog).offset(skip).limit(limit).all()
-    total = db.query(ProcessamentoLog).count()
+    service = NotaFiscalService(db)
+    logs, total, next_cursor = service.get_processing_logs(
+        skip=skip,
+        limit=limit,
+        after=after,
+        use_cursor=cursor,
+        include_total=include_total
+    )
 
     return {
         "logs": [
@@ -392,7 +401,124 @@ async def get_processing_logs(
         ],
         "total": total,
         "page": skip // limit + 1,
-        "per_page": limit
+        "per_page": limit,
+        "next_cursor": next_cursor
+    }
+
+
+@router.patch("/validate-batch")
+async def validate_notas_fiscais_batch(
+    request: NotaFiscalValidateBatchRequest,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """Valida em lote as NFs informadas (ou de uma pasta/contrato) e integra seus itens"""
+
+    service = NotaFiscalService(db)
+    results = service.validate_notas_fiscais_batch(
+        nf_ids=request.nf_ids,
+        pasta_origem=request.pasta_origem,
+        contrato_id=request.contrato_id
+    )
+
+    contract_ids = sorted({r["contrato_id"] for r in results if r["resultado"] == "validada" and r["contrato_id"]})
+    valores_realizados = service.get_contracts_realized_values(contract_ids)
+
+    return {
+        "success": True,
+        "message": "Validação em lote concluída",
+        "validadas": sum(1 for r in results if r["resultado"] == "validada"),
+        "ja_validadas": sum(1 for r in results if r["resultado"] == "ja_validada"),
+        "nao_encontradas": sum(1 for r in results if r["resultado"] == "nao_encontrada"),
+        "results": results,
+        "valor_realizado_contratos": {
+            contract_id: float(valor) for contract_id, valor in valores_realizados.items()
+        },
+        "validated_by": current_user.full_name,
+        "validated_at": datetime.now().isoformat()
+    }
+
+
+@router.post("/classify-batch")
+async def classify_items_batch(
+    request: NotaFiscalClassifyBatchRequest,
+    current_user: User = Depends(get_suprimentos_user),
+    db: Session = Depends(get_db)
+):
+    """Classifica em lote itens de NF em centros de custo (por ids, NF ou contrato)"""
+
+    classifier = CostCenterClassifier(db)
+    result = classifier.classify_items(
+        item_ids=request.item_ids,
+        nota_id=request.nf_id,
+        contrato_id=request.contrato_id,
+        overwrite_manual=request.overwrite_manual
+    )
+
+    return {
+        "success": True,
+        "message": f"{result['classificados']} de {result['total_itens']} itens classificados",
+        **result
+    }
+
+
+@router.get("/{nf_id}")
+async def get_nf(
+    nf_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Detalhe de uma nota fiscal específica com seus itens"""
+
+    nf = db.query(NotaFiscal).filter(NotaFiscal.id == nf_id).first()
+    if not nf:
+        raise HTTPException(status_code=404, detail="Nota fiscal não encontrada")
+
+    return {
+        "id": nf.id,
+        "number": nf.numero,
+        "series": nf.serie,
+        "chave_acesso": nf.chave_acesso,
+        "supplier": nf.nome_fornecedor,
+        "cnpj_fornecedor": nf.cnpj_fornecedor,
+        "contract": nf.contrato.nome_projeto if nf.contrato else None,
+        "contract_id": nf.contrato_id,
+        "value": float(nf.valor_total) if nf.valor_total else 0,
+        "valor_produtos": float(nf.valor_produtos) if nf.valor_produtos else 0,
+        "valor_impostos": float(nf.valor_impostos) if nf.valor_impostos else 0,
+        "valor_frete": float(nf.valor_frete) if nf.valor_frete else 0,
+        "date": nf.data_emissao.strftime("%Y-%m-%d") if nf.data_emissao else None,
+        "data_entrada": nf.data_entrada.strftime("%Y-%m-%d") if nf.data_entrada else None,
+        "status": nf.status_processamento,
+        "pasta_origem": nf.pasta_origem,
+        "subpasta": nf.subpasta,
+        "observacoes": nf.observacoes,
+        "ordem_compra_id": nf.ordem_compra_id,
+        "processed_at": nf.processed_by_n8n_at.isoformat() if nf.processed_by_n8n_at else None,
+        "created_at": nf.created_at.isoformat() if nf.created_at else None,
+        "items": [
+            {
+                "id": item.id,
+                "numero_item": item.numero_item,
+                "codigo_produto": item.codigo_produto,
+                "description": item.descricao,
+                "quantity": float(item.quantidade) if item.quantidade else 0,
+                "unitValue": float(item.valor_unitario) if item.valor_unitario else 0,
+                "totalValue": float(item.valor_total) if item.valor_total else 0,
+                "unit": item.unidade,
+                "peso_liquido": float(item.peso_liquido) if item.peso_liquido else None,
+                "peso_bruto": float(item.peso_bruto) if item.peso_bruto else None,
+                "ncm": item.ncm,
+                "centro_custo_id": item.centro_custo_id,
+                "centro_custo": item.centro_custo.nome if item.centro_custo else None,
+                "item_orcamento_id": item.item_orcamento_id,
+                "classificationScore": float(item.score_classificacao) if item.score_classificacao else None,
+                "classificationSource": item.fonte_classificacao,
+                "status_integracao": item.status_integracao,
+                "integrado_em": item.integrado_em.isoformat() if item.integrado_em else None
+            }
+            for item in nf.itens
+        ] if nf.itens else []
     }
 
 
@@ -423,13 +549,15 @@ async def validate_nota_fiscal(
                 item.integrado_em = datetime.now()
                 item.updated_at = datetime.now()
 
+    service = NotaFiscalService(db)
+    service.ledger.refresh_contracts(nf.contrato_id)
     db.commit()
+    invalidate_nf_kpis()
     db.refresh(nf)
 
     # Calcular novo valor realizado do contrato se aplicável
     valor_realizado = None
     if nf.contrato_id:
-        service = NotaFiscalService(db)
         valor_realizado = float(service.calculate_contract_realized_value(nf.contrato_id))
 
     return {
@@ -558,6 +686,9 @@ async def get_contract_nfs_detailed(
     contract_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor opaco da página anterior (paginação keyset)"),
+    cursor: bool = Query(False, description="Usar paginação por cursor em vez de skip/limit"),
+    include_total: bool = Query(False, description="No modo cursor, contar o total de registros"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -573,8 +704,16 @@ async def get_contract_nfs_detailed(
 
     # Buscar NFs do contrato
     query = db.query(NotaFiscal).filter(NotaFiscal.contrato_id == contract_id)
-    total = query.count()
-    nfs = query.offset(skip).limit(limit).all()
+    cursor_mode = cursor or after is not None
+    total = query.count() if include_total or not cursor_mode else None
+
+    next_cursor = None
+    if cursor_mode:
+        nfs, next_cursor = paginate_keyset(
+            query, NotaFiscal.data_emissao, NotaFiscal.id, limit, after=after
+        )
+    else:
+        nfs = query.offset(skip).limit(limit).all()
 
     # Montar resposta detalhada
     nfs_detailed = []
@@ -659,7 +798,39 @@ async def get_contract_nfs_detailed(
             "total": total,
             "page": skip // limit + 1,
             "per_page": limit,
-            "has_next": (skip + limit) < total,
-            "has_prev": skip > 0
+            "has_next": next_cursor is not None if cursor_mode else (skip + limit) < total,
+            "has_prev": after is not None if cursor_mode else skip > 0,
+            "next_cursor": next_cursor
         }
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/contract/{contract_id}/export")
+async def export_contract_nfs(
+    contract_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson (uma NF por linha) ou csv (um item por linha)"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Exporta em streaming todas as NFs de um contrato com seus itens"""
+
+    contract = db.query(Contract.id).filter(Contract.id == contract_id).first()
+    if not contract:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Contrato não encontrado"
+        )
+
+    exporter = NFExportService(db)
+    if format == "csv":
+        return StreamingResponse(
+            exporter.iter_csv(contract_id),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="contrato_{contract_id}_nfs.csv"'}
+        )
+
+    return StreamingResponse(
+        exporter.iter_ndjson(contract_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="contrato_{contract_id}_nfs.ndjson"'}
+    )
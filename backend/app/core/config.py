@@ -13,6 +13,50 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     redis_url: str = "redis://localhost:6379"
+    nf_kpi_cache_ttl_seconds: int = 30
+    cost_center_cache_ttl_seconds: int = 300
+    dashboard_cache_backend: str = "memory"  # memory (LRU do processo) ou redis (redis_url, compartilhado)
+    dashboard_cache_ttl_seconds: int = 60  # 0 desliga o cache de dashboards
+    dashboard_cache_stale_seconds: int = 600  # janela em que a entrada vencida é servida enquanto recalcula
+    dashboard_cache_max_entries: int = 256
+    invoice_zip_max_size_mb: int = 500
+    invoice_zip_max_members: int = 5000
+    invoice_zip_max_member_mb: int = 20
+    invoice_zip_max_uncompressed_mb: int = 2048
+    nfe_parse_workers: int = 0
+    bulk_write_chunk_size: int = 500
+    nf_ingest_max_batch: int = 10000  # NFs por chamada de POST /nf/ingest-batch
+    budget_parse_cache_size: int = 32
+    bulk_import_concurrency: int = 4  # arquivos de /import/bulk/invoices em processamento ao mesmo tempo
+    job_runner: str = "local"  # local (tarefas asyncio no processo da API) ou celery (workers via redis_url)
+    job_max_concurrency: int = 2
+    job_storage_dir: str = "uploads/jobs"
+    job_progress_interval_seconds: float = 1.0
+    job_heartbeat_seconds: float = 30.0
+    job_stale_after_seconds: float = 120.0  # job em processamento sem heartbeat há mais que isso pode ser retomado
+    chunked_upload_dir: str = "uploads/staging"
+    chunked_upload_max_size_mb: int = 10240
+    chunked_upload_chunk_mb: int = 16
+    chunked_upload_zip_max_members: int = 200000  # limites de ZIP do upload em partes (conferidos no complete)
+    chunked_upload_zip_max_uncompressed_mb: int = 102400
+    onedrive_graph_url: str = "https://graph.microsoft.com/v1.0"
+    onedrive_access_token: str = ""  # token fixo (dev/stand-in); expira em ~1h no Graph real
+    onedrive_tenant_id: str = ""  # credenciais do aplicativo (client credentials): token renovado automaticamente
+    onedrive_client_id: str = ""
+    onedrive_client_secret: str = ""
+    onedrive_token_url: str = "https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+    onedrive_max_concurrency: int = 8
+    onedrive_max_retries: int = 4
+    onedrive_retry_backoff_seconds: float = 0.5
+    onedrive_timeout_seconds: float = 60.0
+    onedrive_page_size: int = 200
+    n8n_webhook_url: str = "https://n8n.gmxindustrial.com.br/webhook/nome_pasta/{nome_pasta}"
+    n8n_dispatcher_enabled: bool = True  # drenar a fila de webhooks neste processo
+    n8n_timeout_seconds: float = 30.0
+    n8n_max_concurrency: int = 4
+    n8n_max_attempts: int = 5
+    n8n_retry_backoff_seconds: float = 5.0
+    n8n_poll_interval_seconds: float = 10.0
     cors_origins: str = "http://localhost:3000,http://localhost:5173,http://localhost:8080"
     debug: bool = True
 
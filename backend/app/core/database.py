@@ -1,17 +1,22 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
+from .text_search import register_sqlite_functions
 
 engine = create_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+if engine.dialect.name == "sqlite":
+    # Funções que no PostgreSQL vêm de unaccent/pg_trgm (ver migração de busca textual)
+    event.listen(engine, "connect", lambda dbapi_connection, _: register_sqlite_functions(dbapi_connection))
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,66 @@
+"""Paginação por cursor (keyset) para as listagens"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import or_
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Gera o token opaco `after` a partir da chave (data, id) da última linha"""
+    payload = json.dumps([sort_value.isoformat() if sort_value else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decodifica o token `after`; cursores malformados geram 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginação inválido"
+        )
+
+
+def paginate_keyset(
+    query,
+    sort_column,
+    id_column,
+    limit: int,
+    after: Optional[str] = None,
+    cursor_key: Optional[Callable[[Any], Tuple[datetime, int]]] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Pagina uma query em ordem decrescente de (sort_column, id_column).
+
+    A condição é escrita como `sort <= v AND (sort < v OR id < i)` para que o
+    índice simples de `sort_column` delimite a varredura. Linhas inseridas
+    depois do cursor ficam antes dele e não deslocam as páginas seguintes.
+    Retorna as linhas da página e o cursor da próxima (None na última).
+    """
+    if after:
+        sort_value, row_id = decode_cursor(after)
+        query = query.filter(
+            sort_column <= sort_value,
+            or_(sort_column < sort_value, id_column < row_id)
+        )
+
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if cursor_key:
+            sort_value, row_id = cursor_key(last)
+        else:
+            sort_value, row_id = getattr(last, sort_column.key), getattr(last, id_column.key)
+        next_cursor = encode_cursor(sort_value, row_id)
+
+    return rows, next_cursor
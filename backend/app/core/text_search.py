@@ -0,0 +1,60 @@
+"""Busca textual sem acento e sem distinção de caixa (pg_trgm no PostgreSQL)"""
+
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import func
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Minúsculas e sem acentos, como `f_unaccent(lower(...))` no banco"""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def normalized(column):
+    """Expressão indexada: os índices GIN trigram usam exatamente esta forma"""
+    return func.f_unaccent(func.lower(column))
+
+
+def contains(column, term: str):
+    """
+    Filtro `coluna contém termo` ignorando acentos e caixa.
+    O termo é normalizado no Python para que o padrão chegue ao banco como
+    constante e o índice trigram possa ser usado.
+    """
+    pattern = f"%{_escape_like(normalize_text(term))}%"
+    return normalized(column).like(pattern, escape="\\")
+
+
+def rank(column, term: str):
+    """Relevância (0 a 1) do termo dentro da coluna"""
+    return func.word_similarity(normalize_text(term), normalized(column))
+
+
+def _trigrams(value: str) -> set:
+    trigrams = set()
+    for word in value.split():
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def _sqlite_word_similarity(term: Optional[str], text: Optional[str]) -> float:
+    """Aproximação de pg_trgm.word_similarity: fração dos trigramas do termo presentes no texto"""
+    term_trigrams = _trigrams(term or "")
+    if not term_trigrams:
+        return 0.0
+    return len(term_trigrams & _trigrams(text or "")) / len(term_trigrams)
+
+
+def register_sqlite_functions(dbapi_connection) -> None:
+    """Registra f_unaccent e word_similarity em conexões SQLite (bancos de desenvolvimento)"""
+    dbapi_connection.create_function("f_unaccent", 1, normalize_text, deterministic=True)
+    dbapi_connection.create_function("word_similarity", 2, _sqlite_word_similarity, deterministic=True)
@@ -0,0 +1,240 @@
+"""
+Leitor streaming de planilhas .xlsx (somente leitura, somente valores).
+
+Lê o XML da aba direto do pacote ZIP com iterparse, liberando cada linha após
+processá-la, sem montar o modelo de células do openpyxl. Entrega linhas como
+tuplas de valores (str, int, float, bool, datetime ou None), na mesma forma de
+`iter_rows(values_only=True)`, em uma fração do tempo em planilhas grandes.
+Fórmulas entregam o último valor calculado salvo no arquivo. Datas respeitam o
+sistema de datas do workbook (1900 ou 1904, `workbookPr/@date1904`).
+"""
+
+import re
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from typing import Any, IO, Iterator, List, Optional, Set, Tuple, Union
+
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+SHEET_DATA = MAIN_NS + "sheetData"
+ROW = MAIN_NS + "row"
+CELL = MAIN_NS + "c"
+VALUE = MAIN_NS + "v"
+TEXT = MAIN_NS + "t"
+SHARED_ITEM = MAIN_NS + "si"
+
+# numFmtId nativos do Excel que representam datas/horas
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+DATE_FORMAT_PATTERN = re.compile(r"[dmyhs]", re.IGNORECASE)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+EXCEL_EPOCH_1904 = datetime(1904, 1, 1)
+
+
+class XlsxFormatError(ValueError):
+    """Arquivo não é um .xlsx válido ou a aba não existe"""
+
+
+def _column_index(reference: str) -> int:
+    index = 0
+    for char in reference:
+        if "A" <= char <= "Z":
+            index = index * 26 + ord(char) - 64
+        else:
+            break
+    return index - 1
+
+
+class XlsxReader:
+    """
+    Uso:
+        with XlsxReader(stream) as reader:
+            for row in reader.iter_rows(sheet_name, min_row=1):
+                ...
+    """
+
+    def __init__(self, source: Union[str, IO[bytes]]):
+        try:
+            self.archive = zipfile.ZipFile(source)
+        except zipfile.BadZipFile as e:
+            raise XlsxFormatError(f"Arquivo .xlsx inválido: {str(e)}")
+        self._shared_strings: Optional[List[str]] = None
+        self._date_styles: Optional[Set[int]] = None
+        self._epoch: Optional[datetime] = None
+
+    def __enter__(self) -> "XlsxReader":
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.archive.close()
+
+    @property
+    def sheetnames(self) -> List[str]:
+        return [name for name, _ in self._sheets()]
+
+    def _workbook(self) -> ET.Element:
+        try:
+            return ET.fromstring(self.archive.read("xl/workbook.xml"))
+        except KeyError as e:
+            raise XlsxFormatError(f"Arquivo .xlsx inválido: {str(e)}")
+
+    def _load_epoch(self) -> datetime:
+        """Data do serial 0: planilhas no sistema 1904 (Excel antigo de Mac) contam de 1904-01-01"""
+        if self._epoch is None:
+            workbook_pr = self._workbook().find(MAIN_NS + "workbookPr")
+            date1904 = workbook_pr.get("date1904", "") if workbook_pr is not None else ""
+            self._epoch = EXCEL_EPOCH_1904 if date1904.lower() in ("1", "true") else EXCEL_EPOCH
+        return self._epoch
+
+    def _sheets(self) -> List[Tuple[str, str]]:
+        """(nome, caminho no pacote) das abas, na ordem do workbook"""
+        workbook = self._workbook()
+        try:
+            rels = ET.fromstring(self.archive.read("xl/_rels/workbook.xml.rels"))
+        except KeyError as e:
+            raise XlsxFormatError(f"Arquivo .xlsx inválido: {str(e)}")
+
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(PKG_REL_NS + "Relationship")}
+        sheets = []
+        for sheet in workbook.iter(MAIN_NS + "sheet"):
+            target = targets.get(sheet.get(REL_NS + "id"), "")
+            path = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+            sheets.append((sheet.get("name"), path))
+        return sheets
+
+    def _load_shared_strings(self) -> List[str]:
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if "xl/sharedStrings.xml" in self.archive.namelist():
+                with self.archive.open("xl/sharedStrings.xml") as f:
+                    for _, elem in ET.iterparse(f):
+                        if elem.tag == SHARED_ITEM:
+                            self._shared_strings.append("".join(t.text or "" for t in elem.iter(TEXT)))
+                            elem.clear()
+        return self._shared_strings
+
+    def _load_date_styles(self) -> Set[int]:
+        """Índices de cellXfs cujo formato numérico é data/hora"""
+        if self._date_styles is None:
+            self._date_styles = set()
+            if "xl/styles.xml" in self.archive.namelist():
+                styles = ET.fromstring(self.archive.read("xl/styles.xml"))
+                custom_dates = {
+                    int(fmt.get("numFmtId"))
+                    for fmt in styles.iter(MAIN_NS + "numFmt")
+                    if DATE_FORMAT_PATTERN.search(re.sub(r'"[^"]*"|\[[^\]]*\]', "", fmt.get("formatCode", "")))
+                }
+                cell_xfs = styles.find(MAIN_NS + "cellXfs")
+                if cell_xfs is not None:
+                    for index, xf in enumerate(cell_xfs.iter(MAIN_NS + "xf")):
+                        fmt_id = int(xf.get("numFmtId", 0))
+                        if fmt_id in BUILTIN_DATE_FORMATS or fmt_id in custom_dates:
+                            self._date_styles.add(index)
+        return self._date_styles
+
+    def _sheet_path(self, sheet_name: Optional[str]) -> str:
+        sheets = self._sheets()
+        if not sheets:
+            raise XlsxFormatError("Planilha sem abas")
+        if sheet_name is None:
+            return sheets[0][1]
+        path = next((sheet_path for name, sheet_path in sheets if name == sheet_name), None)
+        if path is None:
+            raise XlsxFormatError(f"Aba '{sheet_name}' não encontrada")
+        return path
+
+    def dimension(self, sheet_name: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """
+        (linhas, colunas) declarados em `<dimension ref>` da aba, que o Excel
+        grava antes de `sheetData`: lê só o início do XML. None se o arquivo
+        não trouxer a dimensão (alguns geradores omitem).
+        """
+        with self.archive.open(self._sheet_path(sheet_name)) as f:
+            for event, elem in ET.iterparse(f, events=("start",)):
+                if elem.tag == MAIN_NS + "dimension":
+                    last = (elem.get("ref") or "").split(":")[-1]
+                    match = re.fullmatch(r"([A-Z]+)(\d+)", last)
+                    if not match:
+                        return None
+                    return int(match.group(2)), _column_index(match.group(1)) + 1
+                if elem.tag == SHEET_DATA:
+                    return None
+        return None
+
+    def iter_rows(self, sheet_name: Optional[str] = None, min_row: int = 1) -> Iterator[Tuple[Any, ...]]:
+        """
+        Linhas da aba (a primeira se `sheet_name` for None) a partir de
+        `min_row` (1-based). Linhas vazias no meio da aba são entregues como
+        tuplas vazias, preservando a numeração.
+        """
+        path = self._sheet_path(sheet_name)
+        shared = self._load_shared_strings()
+        date_styles = self._load_date_styles()
+        epoch = self._load_epoch()
+        expected_row = 1
+
+        with self.archive.open(path) as f:
+            sheet_data = None
+            for event, elem in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == SHEET_DATA:
+                        sheet_data = elem
+                    continue
+                if elem.tag != ROW:
+                    continue
+
+                # Linhas já lidas saem da árvore: a memória não cresce com a aba
+                if sheet_data is not None:
+                    sheet_data.remove(elem)
+
+                row_number = int(elem.get("r") or expected_row)
+                while expected_row < row_number:
+                    if expected_row >= min_row:
+                        yield ()
+                    expected_row += 1
+                expected_row = row_number + 1
+
+                if row_number < min_row:
+                    continue
+
+                values: List[Any] = []
+                for cell in elem:
+                    if cell.tag != CELL:
+                        continue
+                    reference = cell.get("r")
+                    if reference:
+                        column = _column_index(reference)
+                        if column > len(values):
+                            values.extend([None] * (column - len(values)))
+
+                    cell_type = cell.get("t")
+                    value_elem = cell.find(VALUE)
+                    text = value_elem.text if value_elem is not None else None
+
+                    if cell_type == "s":
+                        value = shared[int(text)] if text is not None else None
+                    elif cell_type == "inlineStr":
+                        value = "".join(t.text or "" for t in cell.iter(TEXT))
+                    elif cell_type in ("str", "e"):
+                        value = text
+                    elif cell_type == "b":
+                        value = text == "1" if text is not None else None
+                    elif text is None:
+                        value = None
+                    elif int(cell.get("s", 0)) in date_styles:
+                        value = epoch + timedelta(days=float(text))
+                    elif "." in text or "E" in text or "e" in text:
+                        value = float(text)
+                    else:
+                        value = int(text)
+
+                    values.append(value)
+
+                yield tuple(values)
@@ -2,6 +2,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api import api_router
+from app.services.nfe_parsing import shutdown_parse_executor
+from app.services.dashboard_cache import shutdown_dashboard_cache
+from app.services.ingest_jobs import resume_local_jobs
+from app.services.n8n_outbox import start_n8n_dispatcher, stop_n8n_dispatcher
 
 app = FastAPI(
     title="GMX - Módulo de Custos de Obras",
@@ -22,6 +26,19 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api/v1")
 
 
+@app.on_event("startup")
+async def resume_jobs():
+    resume_local_jobs()
+    await start_n8n_dispatcher()
+
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    await stop_n8n_dispatcher()
+    shutdown_parse_executor()
+    shutdown_dashboard_cache()
+
+
 @app.get("/")
 async def root():
     return {"message": "GMX - Módulo de Custos de Obras API"}
@@ -4,7 +4,8 @@ from .purchases import Supplier, PurchaseOrder, Invoice, Quotation
 from .cost_centers import CostCenter
 from .attachments import Attachment
 from .audit import AuditLog
-from .notas_fiscais import NotaFiscal, NotaFiscalItem, ProcessamentoLog
+from .notas_fiscais import NotaFiscal, NotaFiscalItem, ProcessamentoLog, ContratoNFResumo, ArquivoImportado, WebhookOutbox
+from .jobs import IngestJob, ChunkedUpload
 
 __all__ = [
     "User",
@@ -19,5 +20,10 @@ __all__ = [
     "AuditLog",
     "NotaFiscal",
     "NotaFiscalItem",
-    "ProcessamentoLog"
+    "ProcessamentoLog",
+    "ContratoNFResumo",
+    "ArquivoImportado",
+    "WebhookOutbox",
+    "IngestJob",
+    "ChunkedUpload"
 ]
\ No newline at end of file
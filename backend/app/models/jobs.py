@@ -0,0 +1,67 @@
+"""Modelos dos jobs de ingestão em segundo plano e dos uploads em partes"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Text, JSON
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class IngestJob(Base):
+    """
+    Job de ingestão (ZIP de notas, pasta do OneDrive, lote de arquivos)
+    O estado fica no banco para que a API e qualquer worker vejam o mesmo progresso
+    """
+    __tablename__ = "ingest_jobs"
+
+    id = Column(String(36), primary_key=True)  # UUID
+    tipo = Column(String(50), nullable=False)  # invoice_zip, onedrive, bulk_invoices
+    status = Column(String(20), nullable=False, default="pendente", index=True)  # pendente, processando, concluido, erro
+    parametros = Column(JSON, nullable=True)
+
+    # Progresso
+    total_arquivos = Column(Integer, nullable=True)
+    processados = Column(Integer, nullable=False, default=0)
+    falhas = Column(Integer, nullable=False, default=0)
+    ignorados = Column(Integer, nullable=False, default=0)
+
+    resultado = Column(JSON, nullable=True)
+    erro = Column(Text, nullable=True)
+
+    # Auditoria
+    criado_por = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_em = Column(DateTime(timezone=True), nullable=True)  # Renovado pelo processo que executa o job
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relacionamentos
+    usuario = relationship("User")
+
+    def __repr__(self):
+        return f"<IngestJob(id={self.id}, tipo={self.tipo}, status={self.status})>"
+
+
+class ChunkedUpload(Base):
+    """
+    Upload retomável em partes (init / PUT da parte no offset / complete)
+    As partes são anexadas a um arquivo de staging; `recebido` é o offset confirmado
+    """
+    __tablename__ = "chunked_uploads"
+
+    id = Column(String(36), primary_key=True)  # UUID
+    contract_id = Column(Integer, ForeignKey("contracts.id"), nullable=False)
+    filename = Column(String(500), nullable=False)
+    tamanho_total = Column(BigInteger, nullable=False)
+    recebido = Column(BigInteger, nullable=False, default=0)
+    sha256 = Column(String(64), nullable=True)  # Hash do arquivo inteiro, conferido no complete
+    status = Column(String(20), nullable=False, default="aberto", index=True)  # aberto, concluido, cancelado
+    job_id = Column(String(36), ForeignKey("ingest_jobs.id"), nullable=True)
+
+    # Auditoria
+    criado_por = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ChunkedUpload(id={self.id}, recebido={self.recebido}/{self.tamanho_total}, status={self.status})>"
@@ -1,6 +1,6 @@
 """Modelos para Notas Fiscais processadas pelo n8n"""
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, DECIMAL
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, DECIMAL, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -19,7 +19,7 @@ class NotaFiscal(Base):
     # Dados da nota fiscal
     numero = Column(String(50), nullable=False, index=True)
     serie = Column(String(10), nullable=False)
-    chave_acesso = Column(String(44), nullable=True, index=True)  # Chave única da NFe
+    chave_acesso = Column(String(44), nullable=True, unique=True, index=True)  # Chave única da NFe
 
     # Fornecedor
     cnpj_fornecedor = Column(String(18), nullable=False, index=True)
@@ -135,4 +135,89 @@ class ProcessamentoLog(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     def __repr__(self):
-        return f"<ProcessamentoLog(pasta={self.pasta_nome}, status={self.status})>"
\ No newline at end of file
+        return f"<ProcessamentoLog(pasta={self.pasta_nome}, status={self.status})>"
+
+
+class WebhookOutbox(Base):
+    """
+    Fila (outbox) de chamadas ao webhook do n8n
+    Gravada pelo endpoint junto com o ProcessamentoLog e drenada em segundo
+    plano por app.services.n8n_outbox, que atualiza o log com o resultado
+    """
+    __tablename__ = "webhook_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    processamento_log_id = Column(Integer, ForeignKey("processamento_logs.id", ondelete="CASCADE"), nullable=False, index=True)
+    url = Column(String(1000), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), nullable=False, default="pendente")  # pendente, enviando, enviado, erro
+    tentativas = Column(Integer, nullable=False, default=0)
+    proxima_tentativa_em = Column(DateTime(timezone=True), nullable=False)  # Também é o fim da reserva quando "enviando"
+    resposta_status = Column(Integer, nullable=True)
+    ultimo_erro = Column(Text, nullable=True)
+
+    # Auditoria
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    enviado_em = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Relacionamentos
+    processamento_log = relationship("ProcessamentoLog")
+
+    __table_args__ = (
+        Index("ix_webhook_outbox_status_proxima", "status", "proxima_tentativa_em"),
+    )
+
+    def __repr__(self):
+        return f"<WebhookOutbox(id={self.id}, status={self.status}, tentativas={self.tentativas})>"
+
+
+class ArquivoImportado(Base):
+    """
+    Hash SHA-256 dos arquivos brutos já ingeridos (XML/PDF de ZIPs, OneDrive, lotes)
+    Consultado antes do parsing para pular reenvios de arquivos conhecidos
+    """
+    __tablename__ = "arquivos_importados"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False, unique=True, index=True)
+    nome_arquivo = Column(String(500), nullable=True)
+    origem = Column(String(50), nullable=False)  # invoice_zip, onedrive, nf_batch
+    documento_tipo = Column(String(20), nullable=True)  # invoice, nota_fiscal
+    documento_id = Column(Integer, nullable=True)
+
+    # Auditoria
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ArquivoImportado(sha256={self.sha256[:12]}, origem={self.origem})>"
+
+
+class ContratoNFResumo(Base):
+    """
+    Agregado por contrato das notas fiscais (valor realizado, contagens por status e itens)
+    Atualizado na mesma transação das escritas de NF; reconstruível com rebuild_contract_ledger.py
+    """
+    __tablename__ = "contrato_nf_resumo"
+
+    contrato_id = Column(Integer, ForeignKey("contracts.id", ondelete="CASCADE"), primary_key=True)
+
+    # Valores
+    valor_realizado = Column(DECIMAL(15, 2), nullable=False, default=0)  # Soma das NFs validadas
+    valor_pendente = Column(DECIMAL(15, 2), nullable=False, default=0)  # Soma das NFs processadas (não validadas)
+
+    # Contagens de NFs por status
+    nfs_total = Column(Integer, nullable=False, default=0)
+    nfs_validadas = Column(Integer, nullable=False, default=0)
+    nfs_processadas = Column(Integer, nullable=False, default=0)
+    nfs_erro = Column(Integer, nullable=False, default=0)
+
+    # Contagens de itens
+    itens_total = Column(Integer, nullable=False, default=0)
+    itens_integrados = Column(Integer, nullable=False, default=0)
+
+    # Auditoria
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<ContratoNFResumo(contrato_id={self.contrato_id}, valor_realizado={self.valor_realizado})>"
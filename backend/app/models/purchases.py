@@ -98,6 +98,7 @@ class Invoice(Base):
     contract_id = Column(Integer, ForeignKey("contracts.id"), nullable=True)  # Novo: vinculação direta ao contrato
     purchase_order_id = Column(Integer, ForeignKey("purchase_orders.id"), nullable=True)  # Agora opcional
     numero_nf = Column(String, nullable=False, index=True)
+    chave_acesso = Column(String(44), nullable=True, unique=True, index=True)  # Chave da NF-e (deduplicação)
     fornecedor = Column(String, nullable=True)  # Novo: nome do fornecedor
     valor_total = Column(Numeric(15, 2), nullable=False)
     data_emissao = Column(DateTime(timezone=True), nullable=False)
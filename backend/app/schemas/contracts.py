@@ -144,6 +144,7 @@ class ContractDetailResponse(ContractResponse):
 
 class ContractListResponse(BaseSchema):
     contracts: List[ContractResponse]
-    total: int
+    total: Optional[int] = None
     page: int
-    per_page: int
\ No newline at end of file
+    per_page: int
+    next_cursor: Optional[str] = None
\ No newline at end of file
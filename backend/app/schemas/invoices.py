@@ -34,6 +34,7 @@ class InvoiceResponse(BaseSchema):
     contract_id: Optional[int] = None
     purchase_order_id: Optional[int] = None
     numero_nf: str
+    chave_acesso: Optional[str] = None
     fornecedor: Optional[str] = None
     valor_total: Decimal
     data_emissao: datetime
@@ -56,6 +57,10 @@ class InvoiceUploadResponse(BaseSchema):
     failed_count: int
     invoices: List[InvoiceResponse]
     errors: List[str] = []
+    skipped_count: int = 0  # Arquivos já importados (mesmo conteúdo ou mesma chave de acesso)
+    skipped: List[str] = []
+    needs_xml_count: int = 0  # PDFs sem extração confiável; reenviar como XML
+    needs_xml: List[str] = []
 
 
 class OneDriveUrlRequest(BaseSchema):
@@ -0,0 +1,51 @@
+import re
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing import Any, Optional
+from datetime import datetime
+
+
+class IngestJobResponse(BaseModel):
+    """Estado e progresso de um job de ingestão"""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: str
+    tipo: str
+    status: str  # pendente, processando, concluido, erro
+    total_arquivos: Optional[int] = None
+    processados: int = 0
+    falhas: int = 0
+    ignorados: int = 0
+    restantes: Optional[int] = None
+    arquivos_por_segundo: Optional[float] = None
+    resultado: Optional[Any] = None
+    erro: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ChunkedUploadInit(BaseModel):
+    """Início de um upload em partes"""
+    contract_id: int
+    filename: str
+    size: int  # bytes
+    sha256: Optional[str] = None  # SHA-256 (hex) do arquivo inteiro, conferido no complete
+
+    @field_validator('sha256')
+    @classmethod
+    def validate_sha256(cls, v):
+        if v is not None and not re.fullmatch(r'[0-9a-fA-F]{64}', v):
+            raise ValueError('sha256 deve ter 64 caracteres hexadecimais')
+        return v
+
+
+class ChunkedUploadResponse(BaseModel):
+    """Estado de um upload em partes; `recebido` é o offset da próxima parte"""
+    id: str
+    contract_id: int
+    filename: str
+    tamanho_total: int
+    recebido: int
+    status: str  # aberto, concluido, cancelado
+    chunk_size: int
+    job_id: Optional[str] = None
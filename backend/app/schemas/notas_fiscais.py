@@ -1,7 +1,7 @@
 """Schemas Pydantic para Notas Fiscais"""
 
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, Field, ConfigDict, model_validator, field_validator
+from typing import Any, Dict, List, Optional
 from decimal import Decimal
 from datetime import datetime
 
@@ -78,6 +78,22 @@ class NotaFiscalCreate(NotaFiscalBase):
     itens: Optional[List[NotaFiscalItemCreate]] = Field(default_factory=list)
 
 
+class NotaFiscalIngest(NotaFiscalCreate):
+    """Schema de cada NF recebida em POST /nf/ingest-batch (upsert pela chave de acesso)"""
+    chave_acesso: str = Field(..., pattern=r"^\d{44}$", description="Chave de acesso NFe (44 dígitos)")
+
+
+class NotaFiscalIngestResponse(BaseModel):
+    """Schema para resposta da ingestão em lote"""
+    recebidas: int
+    criadas: int
+    atualizadas: int
+    ignoradas: List[Dict[str, Any]]  # NFs já validadas não são sobrescritas
+    erros: List[Dict[str, Any]]
+    processamento_log_ids: List[int]
+    limite_excedido: bool = False  # leitura parou em NF_INGEST_MAX_BATCH; reenviar a partir de `recebidas`
+
+
 class NotaFiscalUpdate(BaseModel):
     """Schema para atualização de nota fiscal"""
     contrato_id: Optional[int] = None
@@ -135,13 +151,61 @@ class ProcessFolderRequest(BaseModel):
     nome_pasta: str = Field(..., min_length=1, max_length=255, description="Nome da pasta a ser processada")
 
 
+class ProcessFoldersRequest(BaseModel):
+    """Schema para envio de várias pastas ao n8n em uma chamada"""
+    nomes_pasta: List[str] = Field(..., min_length=1, max_length=500, description="Nomes das pastas a serem processadas")
+
+    @field_validator("nomes_pasta")
+    @classmethod
+    def validate_nomes_pasta(cls, nomes: List[str]) -> List[str]:
+        nomes = [nome.strip() for nome in nomes]
+        if any(not nome or len(nome) > 255 for nome in nomes):
+            raise ValueError("Nomes de pasta devem ter entre 1 e 255 caracteres")
+        return nomes
+
+
 class ProcessFolderResponse(BaseModel):
-    """Schema para resposta de processamento de pasta"""
+    """Schema para resposta de processamento de pasta (webhook enfileirado)"""
     success: bool
     message: str
-    webhook_status: int
+    webhook_status: Optional[int] = None  # Preenchido no log quando o envio ao n8n terminar
     processing_log_id: int
     n8n_url: str
+    status: str
+
+
+class ProcessFoldersResponse(BaseModel):
+    """Schema para resposta do envio de pastas em lote"""
+    success: bool
+    message: str
+    pastas: List[ProcessFolderResponse]
+
+
+class NotaFiscalValidateBatchRequest(BaseModel):
+    """Schema para validação em lote: ids e/ou filtro por pasta e contrato"""
+    nf_ids: Optional[List[int]] = Field(None, max_length=10000, description="IDs das notas fiscais")
+    pasta_origem: Optional[str] = Field(None, max_length=255, description="Validar as NFs desta pasta")
+    contrato_id: Optional[int] = Field(None, description="Validar as NFs deste contrato")
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if not self.nf_ids and not self.pasta_origem and not self.contrato_id:
+            raise ValueError("Informe nf_ids, pasta_origem ou contrato_id")
+        return self
+
+
+class NotaFiscalClassifyBatchRequest(BaseModel):
+    """Schema para classificação em lote: ids de itens, uma NF ou um contrato"""
+    item_ids: Optional[List[int]] = Field(None, max_length=50000, description="IDs dos itens")
+    nf_id: Optional[int] = Field(None, description="Classificar os itens desta NF")
+    contrato_id: Optional[int] = Field(None, description="Classificar os itens das NFs deste contrato")
+    overwrite_manual: bool = Field(False, description="Reclassificar itens classificados manualmente")
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        if not self.item_ids and not self.nf_id and not self.contrato_id:
+            raise ValueError("Informe item_ids, nf_id ou contrato_id")
+        return self
 
 
 class NotaFiscalStats(BaseModel):
@@ -158,14 +222,16 @@ class NotaFiscalStats(BaseModel):
 class NotaFiscalListResponse(BaseModel):
     """Schema para resposta de listagem de notas fiscais"""
     nfs: List[dict]
-    total: int
+    total: Optional[int] = None
     page: int
     per_page: int
+    next_cursor: Optional[str] = None
 
 
 class ProcessamentoLogListResponse(BaseModel):
     """Schema para resposta de listagem de logs"""
     logs: List[ProcessamentoLog]
-    total: int
+    total: Optional[int] = None
     page: int
-    per_page: int
\ No newline at end of file
+    per_page: int
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,247 @@
+"""Gravação em lote de documentos cabeçalho + itens (NFs e invoices)"""
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+
+# (chave do documento, colunas do cabeçalho, itens)
+Document = Tuple[Any, Dict[str, Any], List[Dict[str, Any]]]
+
+
+class BulkDocumentWriter:
+    """
+    Grava documentos em blocos de `chunk_size` por transação.
+
+    Cada bloco faz um INSERT multi-linha dos cabeçalhos com RETURNING (na ordem
+    dos parâmetros) e um INSERT executemany de todos os itens. Se o bloco
+    falhar, ele é refeito documento a documento, cada um em seu SAVEPOINT, de
+    modo que só os documentos com erro ficam de fora.
+
+    Com `conflict_column` (coluna com índice único, ex.: chave_acesso) os
+    cabeçalhos que a preenchem são gravados com INSERT ... ON CONFLICT DO
+    NOTHING: documentos já existentes no banco, ou repetidos no próprio bloco,
+    vão para `skipped` em vez de derrubar o bloco.
+
+    Com `conflict_update` (função que recebe `excluded` e devolve o SET) o
+    conflito vira ON CONFLICT DO UPDATE: o cabeçalho existente é atualizado,
+    seus itens são substituídos pelos do documento e a chave vai para
+    `written` e também para `updated`. `conflict_update_where` restringe quais
+    linhas existentes podem ser atualizadas; as demais vão para `skipped`.
+    Com `item_match` (colunas que identificam o item dentro do documento) e
+    `item_merge(antigo, novo)`, cada item novo que corresponde a um antigo é
+    gravado como `item_merge` devolver (ex.: preservando a classificação).
+
+    `before_commit` roda na transação do bloco (ex.: registro dos hashes) e
+    `after_commit` depois que ela foi confirmada (ex.: invalidar caches).
+    """
+
+    # Dialetos com INSERT ... ON CONFLICT DO NOTHING ... RETURNING
+    UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+    def __init__(
+        self,
+        db: Session,
+        header_model,
+        item_model,
+        item_fk: str,
+        returning: Optional[Sequence] = None,
+        chunk_size: Optional[int] = None,
+        before_commit: Optional[Callable[[Dict[str, List]], None]] = None,
+        after_commit: Optional[Callable[[Dict[str, List]], None]] = None,
+        conflict_column=None,
+        conflict_update: Optional[Callable[[Any], Dict[str, Any]]] = None,
+        conflict_update_where=None,
+        item_match: Sequence[str] = (),
+        item_merge: Optional[Callable[[Any, Dict[str, Any]], Dict[str, Any]]] = None
+    ):
+        self.db = db
+        self.header_model = header_model
+        self.item_model = item_model
+        self.item_fk = item_fk
+        self.returning = list(returning) if returning else [header_model.id]
+        self.chunk_size = chunk_size or settings.bulk_write_chunk_size
+        self.before_commit = before_commit
+        self.after_commit = after_commit
+        self.conflict_column = conflict_column
+        self.conflict_update = conflict_update
+        self.conflict_update_where = conflict_update_where
+        self.item_match = tuple(item_match)
+        self.item_merge = item_merge
+
+    def write(self, documents: Iterable[Document]) -> Dict[str, List]:
+        """
+        Grava todos os documentos; retorna `written` [(chave, linha RETURNING)],
+        `updated` [chave] (subconjunto de `written` com `conflict_update`),
+        `skipped` [chave] (conflito em `conflict_column`) e `errors` [(chave, mensagem)]
+        """
+        result = {"written": [], "updated": [], "skipped": [], "errors": []}
+        chunk: List[Document] = []
+
+        for document in documents:
+            chunk.append(document)
+            if len(chunk) >= self.chunk_size:
+                self._merge(result, self.write_chunk(chunk))
+                chunk = []
+
+        if chunk:
+            self._merge(result, self.write_chunk(chunk))
+
+        return result
+
+    def write_chunk(self, chunk: List[Document]) -> Dict[str, List]:
+        """Grava um bloco em uma transação, isolando os documentos com erro"""
+        result = {"written": [], "updated": [], "skipped": [], "errors": []}
+
+        try:
+            with self.db.begin_nested():
+                written, updated, skipped = self._insert(chunk)
+            result["written"].extend(written)
+            result["updated"].extend(updated)
+            result["skipped"].extend(skipped)
+        except SQLAlchemyError:
+            # Refazer um a um para descobrir quais documentos falham
+            for document in chunk:
+                try:
+                    with self.db.begin_nested():
+                        written, updated, skipped = self._insert([document])
+                    result["written"].extend(written)
+                    result["updated"].extend(updated)
+                    result["skipped"].extend(skipped)
+                except SQLAlchemyError as e:
+                    result["errors"].append((document[0], str(getattr(e, "orig", None) or e)))
+
+        try:
+            if self.before_commit and (result["written"] or result["skipped"]):
+                self.before_commit(result)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+        if self.after_commit and result["written"]:
+            self.after_commit(result)
+
+        return result
+
+    def _insert(self, documents: List[Document]) -> Tuple[List[Tuple[Any, Any]], List[Any], List[Any]]:
+        if self.conflict_column is None:
+            plain, keyed = documents, []
+        else:
+            name = self.conflict_column.key
+            plain = [document for document in documents if document[1].get(name) is None]
+            keyed = [document for document in documents if document[1].get(name) is not None]
+
+        written: List[Tuple[Any, Any]] = []
+        updated: List[Any] = []
+        skipped: List[Any] = []
+
+        if plain:
+            rows = self.db.execute(
+                insert(self.header_model).returning(*self.returning, sort_by_parameter_order=True),
+                [header for _, header, _ in plain]
+            ).all()
+            written.extend(zip((key for key, _, _ in plain), rows))
+
+        previous: Dict[Tuple, Any] = {}
+        if keyed:
+            keyed_written, updated, skipped = self._insert_on_conflict(keyed)
+            written.extend(keyed_written)
+            if updated:
+                updated_keys = set(updated)
+                previous = self._take_items([row[0] for key, row in keyed_written if key in updated_keys])
+
+        items_by_key = {key: document_items for key, _, document_items in documents}
+        items = []
+        for key, row in written:
+            for item in items_by_key[key]:
+                item = {**item, self.item_fk: row[0]}
+                old = previous.get((row[0], *(item.get(column) for column in self.item_match)))
+                items.append(self.item_merge(old, item) if old is not None else item)
+        if items:
+            self.db.execute(insert(self.item_model), items)
+
+        return written, updated, skipped
+
+    def _take_items(self, header_ids: List[Any]) -> Dict[Tuple, Any]:
+        """
+        Remove os itens dos cabeçalhos atualizados; com `item_merge`, devolve os
+        antigos por (fk, *item_match) para serem casados com os novos
+        """
+        fk = getattr(self.item_model, self.item_fk)
+        previous: Dict[Tuple, Any] = {}
+        if self.item_merge is not None:
+            rows = self.db.execute(select(self.item_model.__table__).where(fk.in_(header_ids))).mappings()
+            for row in rows:
+                previous[(row[self.item_fk], *(row[column] for column in self.item_match))] = row
+        self.db.execute(delete(self.item_model).where(fk.in_(header_ids)))
+        return previous
+
+    def _insert_on_conflict(self, documents: List[Document]) -> Tuple[List[Tuple[Any, Any]], List[Any], List[Any]]:
+        """
+        INSERT ... ON CONFLICT (conflict_column) DO NOTHING (ou DO UPDATE com
+        `conflict_update`); as linhas do RETURNING são casadas pelo valor da
+        coluna, já que as ignoradas não voltam
+        """
+        name = self.conflict_column.key
+        unique: Dict[Any, Document] = {}
+        skipped: List[Any] = []
+        for document in documents:
+            if document[1][name] in unique:
+                skipped.append(document[0])
+            else:
+                unique[document[1][name]] = document
+
+        dialect = self.db.get_bind().dialect.name
+        upsert = self.UPSERT_INSERTS.get(dialect)
+        existing: set = set()
+        if upsert is not None and self.conflict_update is not None:
+            # Valores já existentes: as linhas que voltarem no RETURNING com eles foram atualizadas
+            existing = {
+                value for (value,) in self.db.query(self.conflict_column).filter(
+                    self.conflict_column.in_(list(unique))
+                )
+            }
+
+            statement = upsert(self.header_model)
+            statement = statement.on_conflict_do_update(
+                index_elements=[self.conflict_column],
+                set_=self.conflict_update(statement.excluded),
+                where=self.conflict_update_where
+            ).returning(*self.returning, self.conflict_column)
+            rows = self.db.execute(statement, [header for _, header, _ in unique.values()]).all()
+        elif upsert is not None:
+            statement = upsert(self.header_model).on_conflict_do_nothing(
+                index_elements=[self.conflict_column]
+            ).returning(*self.returning, self.conflict_column)
+            rows = self.db.execute(statement, [header for _, header, _ in unique.values()]).all()
+        else:
+            # Dialetos sem ON CONFLICT: descarta antes os valores que já existem
+            existing = {
+                value for (value,) in self.db.query(self.conflict_column).filter(
+                    self.conflict_column.in_(list(unique))
+                )
+            }
+            pending = [document for value, document in unique.items() if value not in existing]
+            rows = self.db.execute(
+                insert(self.header_model).returning(*self.returning, self.conflict_column),
+                [header for _, header, _ in pending]
+            ).all() if pending else []
+
+        written = [(unique[row[-1]][0], row) for row in rows]
+        updated = [unique[row[-1]][0] for row in rows if row[-1] in existing]
+        returned = {row[-1] for row in rows}
+        skipped.extend(document[0] for value, document in unique.items() if value not in returned)
+
+        return written, updated, skipped
+
+    @staticmethod
+    def _merge(result: Dict[str, List], chunk_result: Dict[str, List]) -> None:
+        result["written"].extend(chunk_result["written"])
+        result["updated"].extend(chunk_result["updated"])
+        result["skipped"].extend(chunk_result["skipped"])
+        result["errors"].extend(chunk_result["errors"])
@@ -0,0 +1,311 @@
+"""
+Upload retomável em partes para ZIPs grandes de notas fiscais.
+
+Protocolo: `init` registra o upload (nome, tamanho e, opcionalmente, o
+SHA-256 do arquivo inteiro); cada `PUT` envia a parte seguinte no offset
+confirmado, com o SHA-256 da parte; `complete` confere tamanho, hash e os
+limites de ZIP (CHUNKED_UPLOAD_ZIP_*) e entrega o arquivo montado ao job de
+ingestão de ZIP (o mesmo pipeline de InvoiceProcessingService.process_zip_file).
+Uma conexão perdida custa no máximo a parte em andamento: o cliente consulta o
+offset e continua dali.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid
+import zipfile
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiofiles
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.contracts import Contract
+from app.models.jobs import ChunkedUpload
+from app.services.ingest_jobs import IngestJobService, dispatch_job, job_storage_path
+from app.services.invoice_processing_service import InvoiceProcessingService, ZipLimits
+
+
+UPLOAD_STATUS_OPEN = "aberto"
+UPLOAD_STATUS_DONE = "concluido"
+UPLOAD_STATUS_CANCELLED = "cancelado"
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def staging_path(upload_id: str) -> str:
+    """Arquivo de staging onde as partes são anexadas"""
+    return os.path.join(settings.chunked_upload_dir, f"{upload_id}.part")
+
+
+def chunk_path(upload_id: str) -> str:
+    """Arquivo temporário de uma parte em recebimento"""
+    return os.path.join(settings.chunked_upload_dir, f"{upload_id}.{uuid.uuid4().hex}.chunk")
+
+
+def _append_part(path: str, offset: int, part: str) -> None:
+    with open(path, "r+b") as f, open(part, "rb") as source:
+        f.truncate(offset)
+        f.seek(offset)
+        shutil.copyfileobj(source, f, HASH_BLOCK_SIZE)
+
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _check_zip_archive(path: str) -> None:
+    """Limites de ZIP do upload em partes, pelo diretório central (sem descompactar)"""
+    try:
+        with zipfile.ZipFile(path) as zip_ref:
+            InvoiceProcessingService._check_zip_limits(zip_ref, ZipLimits.for_chunked_upload())
+    except zipfile.BadZipFile:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Arquivo montado não é um ZIP válido"
+        )
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ChunkedUploadService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def init_upload(
+        self,
+        contract_id: int,
+        filename: str,
+        size: int,
+        sha256: Optional[str],
+        criado_por: Optional[int]
+    ) -> ChunkedUpload:
+        """Registra um upload e cria o arquivo de staging vazio"""
+        if not filename.lower().endswith('.zip'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Arquivo deve ser do tipo ZIP"
+            )
+
+        if size <= 0 or size > settings.chunked_upload_max_size_mb * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Tamanho inválido. Máximo permitido: {settings.chunked_upload_max_size_mb}MB"
+            )
+
+        if not self.db.query(Contract.id).filter(Contract.id == contract_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Contrato não encontrado"
+            )
+
+        upload = ChunkedUpload(
+            id=str(uuid.uuid4()),
+            contract_id=contract_id,
+            filename=filename,
+            tamanho_total=size,
+            recebido=0,
+            sha256=sha256.lower() if sha256 else None,
+            status=UPLOAD_STATUS_OPEN,
+            criado_por=criado_por
+        )
+
+        os.makedirs(settings.chunked_upload_dir, exist_ok=True)
+        open(staging_path(upload.id), "wb").close()
+
+        self.db.add(upload)
+        self.db.commit()
+        self.db.refresh(upload)
+        return upload
+
+    def get_upload(
+        self,
+        upload_id: str,
+        criado_por: Optional[int] = None,
+        for_update: bool = False
+    ) -> ChunkedUpload:
+        query = self.db.query(ChunkedUpload).filter(ChunkedUpload.id == upload_id)
+        if criado_por is not None:
+            query = query.filter(ChunkedUpload.criado_por == criado_por)
+        if for_update:
+            # Trava a linha para que duas requisições no mesmo upload não se sobreponham
+            query = query.with_for_update()
+        upload = query.first()
+
+        if not upload:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Upload não encontrado"
+            )
+        return upload
+
+    @staticmethod
+    def _check_open(upload: ChunkedUpload, offset: int) -> None:
+        if upload.status != UPLOAD_STATUS_OPEN:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload já está {upload.status}"
+            )
+
+        if offset != upload.recebido:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Offset {offset} não corresponde ao recebido ({upload.recebido})",
+                headers={"Upload-Offset": str(upload.recebido)}
+            )
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        offset: int,
+        chunk: AsyncIterator[bytes],
+        chunk_sha256: Optional[str],
+        criado_por: Optional[int] = None
+    ) -> ChunkedUpload:
+        """
+        Anexa uma parte no offset confirmado. A parte é gravada em stream num
+        arquivo próprio enquanto o hash é calculado, sem travar o upload; só a
+        anexação ao staging e o novo offset são feitos com a linha travada. Se
+        o hash não conferir, exceder o tamanho declarado, a conexão cair ou
+        outra requisição anexar antes, o staging fica como estava.
+        """
+        upload = self.get_upload(upload_id, criado_por)
+        tamanho_total = upload.tamanho_total
+        try:
+            self._check_open(upload, offset)
+        finally:
+            # Nenhuma transação aberta enquanto a parte chega
+            self.db.rollback()
+
+        max_chunk = settings.chunked_upload_chunk_mb * 1024 * 1024
+        limit = min(tamanho_total - offset, max_chunk)
+        digest = hashlib.sha256()
+        written = 0
+        part = chunk_path(upload_id)
+
+        try:
+            async with aiofiles.open(part, "wb") as f:
+                async for data in chunk:
+                    written += len(data)
+                    if written > limit:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"Parte excede o limite de {limit} bytes a partir do offset {offset}"
+                        )
+                    digest.update(data)
+                    await f.write(data)
+
+            if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="SHA-256 da parte não confere; reenvie a partir do mesmo offset"
+                )
+
+            upload = self.get_upload(upload_id, criado_por, for_update=True)
+            try:
+                self._check_open(upload, offset)
+                await asyncio.to_thread(_append_part, staging_path(upload_id), offset, part)
+                upload.recebido = offset + written
+                self.db.commit()
+            except BaseException:
+                self.db.rollback()
+                await asyncio.to_thread(os.truncate, staging_path(upload_id), offset)
+                raise
+        finally:
+            await asyncio.to_thread(_remove_file, part)
+
+        self.db.refresh(upload)
+        return upload
+
+    async def complete_upload(self, upload_id: str, criado_por: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Confere tamanho, SHA-256 e limites de ZIP do arquivo montado e o move
+        (sem cópia) para o diretório de um job de ingestão de ZIP. Job, upload
+        concluído e arquivo movido são confirmados juntos com a linha do upload
+        travada (um complete concorrente recebe 409); o job é despachado depois
+        do commit.
+        """
+        upload = self.get_upload(upload_id, criado_por, for_update=True)
+        path = staging_path(upload.id)
+
+        try:
+            if upload.status == UPLOAD_STATUS_OPEN and upload.recebido != upload.tamanho_total:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Upload incompleto: {upload.recebido} de {upload.tamanho_total} bytes",
+                    headers={"Upload-Offset": str(upload.recebido)}
+                )
+            self._check_open(upload, upload.tamanho_total)
+
+            if upload.sha256:
+                sha256 = await asyncio.to_thread(_file_sha256, path)
+                if sha256 != upload.sha256:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="SHA-256 do arquivo montado não confere com o informado no início do upload"
+                    )
+
+            await asyncio.to_thread(_check_zip_archive, path)
+
+            jobs = IngestJobService(self.db)
+            job = jobs.create_job(
+                "invoice_zip",
+                {"contract_id": upload.contract_id, "filename": upload.filename, "chunked_upload_id": upload.id},
+                upload.criado_por,
+                commit=False
+            )
+            job_path = os.path.join(job_storage_path(job.id), "upload.zip")
+            os.makedirs(job_storage_path(job.id), exist_ok=True)
+            os.replace(path, job_path)
+
+            upload.status = UPLOAD_STATUS_DONE
+            upload.job_id = job.id
+            try:
+                self.db.commit()
+            except BaseException:
+                os.replace(job_path, path)
+                shutil.rmtree(job_storage_path(job.id), ignore_errors=True)
+                raise
+        except BaseException:
+            self.db.rollback()
+            raise
+
+        self.db.refresh(job)
+        dispatch_job(job.id)
+        return jobs.to_response(job)
+
+    def cancel_upload(self, upload_id: str, criado_por: Optional[int] = None) -> None:
+        upload = self.get_upload(upload_id, criado_por)
+        if upload.status != UPLOAD_STATUS_OPEN:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload já está {upload.status}"
+            )
+
+        upload.status = UPLOAD_STATUS_CANCELLED
+        self.db.commit()
+        if os.path.exists(staging_path(upload.id)):
+            os.remove(staging_path(upload.id))
+
+    @staticmethod
+    def to_response(upload: ChunkedUpload) -> Dict[str, Any]:
+        return {
+            "id": upload.id,
+            "contract_id": upload.contract_id,
+            "filename": upload.filename,
+            "tamanho_total": upload.tamanho_total,
+            "recebido": upload.recebido,
+            "status": upload.status,
+            "chunk_size": settings.chunked_upload_chunk_mb * 1024 * 1024,
+            "job_id": upload.job_id,
+        }
@@ -0,0 +1,167 @@
+"""Serviço do agregado de NFs por contrato (valor realizado e contagens)"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Dict, Iterable, List, Optional
+from decimal import Decimal
+
+from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem, ContratoNFResumo
+from app.services.dashboard_cache import TAG_NF, invalidate_dashboards
+
+
+class ContractLedgerService:
+    """
+    Mantém a tabela contrato_nf_resumo.
+
+    As escritas de NF chamam `refresh_contracts` antes do commit, de modo que o
+    agregado é gravado na mesma transação. Cada refresh recalcula apenas os
+    contratos afetados com uma consulta agrupada pelo índice de contrato_id.
+
+    Escritas concorrentes no mesmo contrato são serializadas pela linha do
+    resumo: ela é criada com INSERT ... ON CONFLICT DO NOTHING e travada com
+    SELECT ... FOR UPDATE (em ordem de contrato_id, sem deadlock) antes da
+    agregação, então quem agrega depois já enxerga as NFs de quem fez commit.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def refresh_contracts(self, *contract_ids: Optional[int]) -> None:
+        """Recalcula o agregado dos contratos informados (ignora None); não faz commit"""
+        ids = {contract_id for contract_id in contract_ids if contract_id}
+        if not ids:
+            return
+
+        # Garantir que as alterações pendentes da sessão entrem no cálculo
+        self.db.flush()
+
+        resumos = self._lock_rows(sorted(ids))
+        aggregates = self._aggregate(ids)
+        for contract_id in ids:
+            self._apply(resumos[contract_id], aggregates.get(contract_id))
+
+    def _lock_rows(self, contract_ids: List[int]) -> Dict[int, ContratoNFResumo]:
+        """Cria as linhas que faltam (sem corrida na chave primária) e trava todas, em ordem"""
+        rows = [{'contrato_id': contract_id} for contract_id in contract_ids]
+        dialect = self.db.get_bind().dialect.name
+        upsert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect)
+        if upsert is not None:
+            self.db.execute(upsert(ContratoNFResumo).on_conflict_do_nothing(
+                index_elements=[ContratoNFResumo.contrato_id]
+            ), rows)
+        else:
+            existing = {contract_id for (contract_id,) in self.db.query(ContratoNFResumo.contrato_id).filter(
+                ContratoNFResumo.contrato_id.in_(contract_ids)
+            )}
+            missing = [row for row in rows if row['contrato_id'] not in existing]
+            if missing:
+                self.db.execute(insert(ContratoNFResumo), missing)
+
+        locked = self.db.query(ContratoNFResumo).filter(
+            ContratoNFResumo.contrato_id.in_(contract_ids)
+        ).order_by(ContratoNFResumo.contrato_id).with_for_update().populate_existing().all()
+        return {row.contrato_id: row for row in locked}
+
+    def rebuild(self) -> int:
+        """Reconstrói o agregado de todos os contratos (correção de divergências)"""
+        aggregates = self._aggregate()
+        existing = {row.contrato_id: row for row in self.db.query(ContratoNFResumo).all()}
+
+        for contract_id in set(aggregates) | set(existing):
+            resumo = existing.get(contract_id)
+            if resumo is None:
+                resumo = ContratoNFResumo(contrato_id=contract_id)
+                self.db.add(resumo)
+            self._apply(resumo, aggregates.get(contract_id))
+
+        self.db.commit()
+        invalidate_dashboards(TAG_NF)
+        return len(aggregates)
+
+    def get(self, contract_id: int) -> Optional[ContratoNFResumo]:
+        """Agregado de um contrato (lookup por chave primária)"""
+        return self.db.get(ContratoNFResumo, contract_id)
+
+    def get_many(self, contract_ids: Iterable[int]) -> Dict[int, ContratoNFResumo]:
+        """Agregados de vários contratos em uma única consulta"""
+        ids = list(contract_ids)
+        if not ids:
+            return {}
+
+        rows = self.db.query(ContratoNFResumo).filter(
+            ContratoNFResumo.contrato_id.in_(ids)
+        ).all()
+        return {row.contrato_id: row for row in rows}
+
+    def total_realized(self, contract_ids: Optional[Iterable[int]] = None) -> Decimal:
+        """Soma do valor realizado de todos os contratos (ou dos informados)"""
+        query = self.db.query(func.sum(ContratoNFResumo.valor_realizado))
+        if contract_ids is not None:
+            query = query.filter(ContratoNFResumo.contrato_id.in_(list(contract_ids)))
+
+        result = query.scalar()
+        return Decimal(result) if result else Decimal('0.00')
+
+    def _aggregate(self, contract_ids: Optional[set] = None) -> Dict[int, dict]:
+        """Calcula os agregados por contrato a partir de notas_fiscais e nf_itens"""
+        nf_filter = NotaFiscal.contrato_id.in_(contract_ids) if contract_ids else NotaFiscal.contrato_id.isnot(None)
+
+        itens_query = self.db.query(
+            NotaFiscalItem.nota_id.label('nota_id'),
+            func.count(NotaFiscalItem.id).label('itens'),
+            func.sum(case((NotaFiscalItem.status_integracao == 'integrado', 1), else_=0)).label('integrados')
+        )
+        if contract_ids:
+            itens_query = itens_query.filter(
+                NotaFiscalItem.nota_id.in_(self.db.query(NotaFiscal.id).filter(nf_filter))
+            )
+        itens = itens_query.group_by(NotaFiscalItem.nota_id).subquery()
+
+        validado = NotaFiscal.status_processamento == 'validado'
+        processado = NotaFiscal.status_processamento == 'processado'
+        erro = NotaFiscal.status_processamento == 'erro'
+
+        rows = self.db.query(
+            NotaFiscal.contrato_id,
+            func.sum(case((validado, NotaFiscal.valor_total), else_=0)),
+            func.sum(case((processado, NotaFiscal.valor_total), else_=0)),
+            func.count(NotaFiscal.id),
+            func.sum(case((validado, 1), else_=0)),
+            func.sum(case((processado, 1), else_=0)),
+            func.sum(case((erro, 1), else_=0)),
+            func.sum(itens.c.itens),
+            func.sum(itens.c.integrados)
+        ).outerjoin(
+            itens, itens.c.nota_id == NotaFiscal.id
+        ).filter(nf_filter).group_by(NotaFiscal.contrato_id).all()
+
+        return {
+            contract_id: {
+                'valor_realizado': Decimal(valor_realizado or 0),
+                'valor_pendente': Decimal(valor_pendente or 0),
+                'nfs_total': nfs_total or 0,
+                'nfs_validadas': nfs_validadas or 0,
+                'nfs_processadas': nfs_processadas or 0,
+                'nfs_erro': nfs_erro or 0,
+                'itens_total': itens_total or 0,
+                'itens_integrados': itens_integrados or 0
+            }
+            for (contract_id, valor_realizado, valor_pendente, nfs_total, nfs_validadas,
+                 nfs_processadas, nfs_erro, itens_total, itens_integrados) in rows
+        }
+
+    def _apply(self, resumo: ContratoNFResumo, values: Optional[dict]) -> None:
+        """Copia os valores agregados para a linha do resumo (zera se o contrato não tem NFs)"""
+        values = values or {
+            'valor_realizado': Decimal('0.00'),
+            'valor_pendente': Decimal('0.00'),
+            'nfs_total': 0,
+            'nfs_validadas': 0,
+            'nfs_processadas': 0,
+            'nfs_erro': 0,
+            'itens_total': 0,
+            'itens_integrados': 0
+        }
+        for field, value in values.items():
+            setattr(resumo, field, value)
@@ -2,9 +2,11 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
 from decimal import Decimal
+from app.core.text_search import contains
 from app.models.contracts import Contract, BudgetItem
 from app.models.purchases import PurchaseOrder, Invoice
 from app.schemas.contracts import ContractCreate, ContractUpdate, ContractResponse
+from app.services.dashboard_cache import TAG_CONTRACTS, invalidate_dashboards
 from fastapi import HTTPException, status
 
 
@@ -51,6 +53,7 @@ class ContractService:
             self.db.add(budget_item)
 
         self.db.commit()
+        invalidate_dashboards(TAG_CONTRACTS)
         return contract
 
     def get_contract_by_id(self, contract_id: int) -> Optional[Contract]:
@@ -66,7 +69,7 @@ class ContractService:
         query = self.db.query(Contract)
         
         if cliente:
-            query = query.filter(Contract.cliente.ilike(f"%{cliente}%"))
+            query = query.filter(contains(Contract.cliente, cliente))
         
         if status:
             query = query.filter(Contract.status == status)
@@ -83,6 +86,7 @@ class ContractService:
             setattr(contract, field, value)
 
         self.db.commit()
+        invalidate_dashboards(TAG_CONTRACTS)
         self.db.refresh(contract)
         return contract
 
@@ -104,6 +108,7 @@ class ContractService:
 
         self.db.delete(contract)
         self.db.commit()
+        invalidate_dashboards(TAG_CONTRACTS)
         return True
 
     def calculate_contract_metrics(self, contract_id: int) -> dict:
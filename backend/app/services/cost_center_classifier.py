@@ -0,0 +1,164 @@
+"""Classificação em lote dos itens de NF em centros de custo"""
+
+import threading
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from decimal import Decimal
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.text_search import normalize_text
+from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem
+from app.models.cost_centers import CostCenter
+from app.services.nf_kpis import invalidate_nf_kpis
+
+
+# Palavras-chave por código de centro de custo (a ordem desempata scores iguais)
+COST_CENTER_KEYWORDS = {
+    "materia_prima": ["cimento", "concreto", "areia", "brita", "cal", "gesso"],
+    "mao_de_obra": ["servico", "mao", "obra", "trabalhador", "pedreiro"],
+    "equipamento": ["equipamento", "ferramenta", "maquina", "betoneira"],
+    "transporte": ["frete", "transporte", "entrega", "logistica"]
+}
+
+# Mapa codigo -> id dos centros de custo, compartilhado pelo processo
+_lock = threading.Lock()
+_cost_center_ids: Optional[Dict[str, int]] = None
+_expires_at = 0.0
+
+
+def invalidate_cost_center_cache(*_args) -> None:
+    """Descarta o mapa de centros de custo em cache"""
+    global _cost_center_ids
+    with _lock:
+        _cost_center_ids = None
+
+
+# Qualquer escrita de CostCenter pelo ORM invalida o mapa; o TTL cobre alterações externas
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(CostCenter, _event_name, invalidate_cost_center_cache)
+
+
+class CostCenterClassifier:
+    """
+    Classifica itens por palavras-chave da descrição.
+
+    As descrições são pontuadas de uma vez (uma operação vetorizada por
+    palavra-chave sobre a coluna inteira) e os resultados são gravados com um
+    único UPDATE em lote por chave primária.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_cost_center_ids(self) -> Dict[str, int]:
+        """Mapa codigo -> id dos centros de custo com palavras-chave, em cache"""
+        global _cost_center_ids, _expires_at
+
+        with _lock:
+            if _cost_center_ids is not None and time.monotonic() < _expires_at:
+                return _cost_center_ids
+
+        rows = self.db.query(CostCenter.codigo, CostCenter.id).filter(
+            CostCenter.codigo.in_(list(COST_CENTER_KEYWORDS))
+        ).all()
+        mapping = {codigo: center_id for codigo, center_id in rows}
+
+        with _lock:
+            _cost_center_ids = mapping
+            _expires_at = time.monotonic() + settings.cost_center_cache_ttl_seconds
+
+        return mapping
+
+    def score(self, descriptions: List[str]) -> pd.DataFrame:
+        """
+        Retorna, para cada descrição, o código vencedor e o score (quantidade de
+        palavras-chave encontradas); código None quando nenhuma palavra aparece
+        """
+        codes = list(COST_CENTER_KEYWORDS)
+        if not descriptions:
+            return pd.DataFrame({"codigo": pd.Series(dtype=object), "score": pd.Series(dtype=np.int64)})
+
+        normalized = pd.Series(descriptions, dtype=object).fillna("").map(normalize_text)
+        scores = np.column_stack([
+            sum(normalized.str.contains(keyword, regex=False).to_numpy(dtype=np.int64) for keyword in keywords)
+            for keywords in COST_CENTER_KEYWORDS.values()
+        ])
+
+        best = scores.argmax(axis=1)
+        best_score = scores[np.arange(len(best)), best]
+
+        return pd.DataFrame({
+            "codigo": [codes[index] if value > 0 else None for index, value in zip(best, best_score)],
+            "score": best_score
+        })
+
+    def classify_items(
+        self,
+        item_ids: Optional[List[int]] = None,
+        nota_id: Optional[int] = None,
+        contrato_id: Optional[int] = None,
+        overwrite_manual: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Classifica os itens selecionados (ids, uma NF ou todas as NFs de um
+        contrato) e grava tudo em um commit. Itens classificados manualmente são
+        preservados, a menos que `overwrite_manual`.
+        """
+        query = self.db.query(NotaFiscalItem.id, NotaFiscalItem.descricao)
+        if item_ids:
+            query = query.filter(NotaFiscalItem.id.in_(item_ids))
+        if nota_id:
+            query = query.filter(NotaFiscalItem.nota_id == nota_id)
+        if contrato_id:
+            query = query.join(
+                NotaFiscal, NotaFiscal.id == NotaFiscalItem.nota_id
+            ).filter(NotaFiscal.contrato_id == contrato_id)
+        if not overwrite_manual:
+            query = query.filter(
+                (NotaFiscalItem.fonte_classificacao.is_(None)) |
+                (NotaFiscalItem.fonte_classificacao != 'manual')
+            )
+
+        rows = query.all()
+        center_ids = self.get_cost_center_ids()
+        scored = self.score([descricao for _, descricao in rows])
+
+        now = datetime.now()
+        updates = []
+        results = []
+        for (item_id, _), codigo, score in zip(rows, scored["codigo"], scored["score"]):
+            center_id = center_ids.get(codigo) if codigo else None
+            if center_id is None:
+                results.append({"item_id": item_id, "centro_custo_id": None, "score_classificacao": None})
+                continue
+
+            score_classificacao = Decimal(str(min(95, int(score) * 20)))
+            updates.append({
+                "id": item_id,
+                "centro_custo_id": center_id,
+                "score_classificacao": score_classificacao,
+                "fonte_classificacao": 'ai',
+                "updated_at": now
+            })
+            results.append({
+                "item_id": item_id,
+                "centro_custo_id": center_id,
+                "score_classificacao": float(score_classificacao)
+            })
+
+        if updates:
+            self.db.execute(update(NotaFiscalItem), updates)
+            self.db.commit()
+            invalidate_nf_kpis()
+
+        return {
+            "total_itens": len(rows),
+            "classificados": len(updates),
+            "nao_classificados": len(rows) - len(updates),
+            "results": results
+        }
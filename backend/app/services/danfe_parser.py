@@ -0,0 +1,220 @@
+"""
+Extração de dados de DANFE em PDF pela camada de texto (sem OCR).
+
+Só as páginas necessárias são lidas: a primeira traz chave de acesso, datas,
+totais e os primeiros itens; as seguintes só são abertas enquanto a soma dos
+itens não fecha com o "valor total dos produtos". Os campos saem de regras
+fixas (regex compiladas) sobre o texto da página achatado em uma linha, o que
+funciona tanto para PDFs que extraem uma célula por linha quanto para os que
+extraem a linha inteira da tabela.
+
+Nada é inventado: se a chave não for válida, faltar data ou total, ou os
+itens não fecharem com o total, o arquivo é recusado com DanfeNeedsXml e deve
+ser reenviado como XML. Como parse_nfe, as funções são de módulo e rodam no
+pool de processos de app.services.nfe_parsing.
+"""
+
+import io
+import re
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, IO, List, Optional, Union
+
+from pypdf import PdfReader
+from pypdf.errors import PdfReadError
+
+
+class DanfeNeedsXml(ValueError):
+    """O PDF não permite extrair a nota com segurança; é preciso o XML"""
+
+
+MONEY = r"\d{1,3}(?:\.\d{3})*,\d{2,10}|\d+,\d{2,10}"
+
+CHAVE_PATTERN = re.compile(r"(?<!\d)\d{4}(?: ?\d{4}){10}(?!\d)")
+FORNECEDOR_PATTERN = re.compile(r"RECEBEMOS DE (.+?) OS PRODUTOS", re.IGNORECASE)
+DATA_EMISSAO_PATTERN = re.compile(
+    r"DATA D[AE] EMISS[ÃA]O.{0,200}?(\d{2}/\d{2}/\d{4})", re.IGNORECASE
+)
+VALOR_PRODUTOS_PATTERN = re.compile(
+    rf"VALOR TOTAL DOS PRODUTOS((?: (?:{MONEY}))+)", re.IGNORECASE
+)
+VALOR_NOTA_PATTERN = re.compile(
+    rf"VALOR TOTAL DA NOTA((?: (?:{MONEY}))+)", re.IGNORECASE
+)
+
+# Linha de item: NCM, CST/CSOSN, CFOP, unidade, quantidade, valor unitário e total;
+# código e descrição ficam no texto entre o item anterior e o NCM
+ITEM_PATTERN = re.compile(
+    rf"(?<!\S)(?P<ncm>\d{{8}}) (?P<cst>\d{{2,4}}) (?P<cfop>[1-7]\d{{3}}) (?P<unidade>[A-Za-z][A-Za-z0-9.]{{0,5}}) "
+    rf"(?P<quantidade>{MONEY}) (?P<valor_unitario>{MONEY}) (?P<valor_total>{MONEY})(?!\S)"
+)
+PRODUCTS_START = re.compile(r"DADOS DOS? PRODUTOS?(?: ?/ ?SERVI[ÇC]OS?)?", re.IGNORECASE)
+PRODUCTS_END = re.compile(r"DADOS ADICIONAIS|C[ÁA]LCULO DO ISSQN", re.IGNORECASE)
+# Última coluna do cabeçalho da tabela de itens, antes do primeiro item da página
+PRODUCTS_HEADER = re.compile(
+    r"AL[ÍI]Q\.? ?(?:ICMS|IPI)|V(?:ALOR|\.) ?(?:ICMS|IPI)|BC ?ICMS|V(?:ALOR|\.) ?TOTAL", re.IGNORECASE
+)
+# Colunas numéricas que sobram do item anterior (BC ICMS, V. ICMS, alíquotas...)
+TRAILING_VALUE = re.compile(r"^[\d.]*,\d+%?$")
+
+# Diferença aceita entre a soma dos itens e o total dos produtos (arredondamentos)
+TOTAL_TOLERANCE = Decimal("0.05")
+
+
+def _to_decimal(text: str) -> Decimal:
+    return Decimal(text.replace(".", "").replace(",", "."))
+
+
+def _flatten(text: str) -> str:
+    return " ".join(text.split())
+
+
+def chave_valida(chave: str) -> bool:
+    """Dígito verificador (módulo 11) e modelo 55 da chave de acesso"""
+    if len(chave) != 44 or not chave.isdigit() or chave[20:22] != "55":
+        return False
+    weights = [2, 3, 4, 5, 6, 7, 8, 9]
+    total = sum(int(digit) * weights[i % 8] for i, digit in enumerate(reversed(chave[:43])))
+    digit = 11 - total % 11
+    return (0 if digit >= 10 else digit) == int(chave[43])
+
+
+def _find_chave(text: str) -> Optional[str]:
+    for match in CHAVE_PATTERN.finditer(text):
+        chave = match.group(0).replace(" ", "")
+        if chave_valida(chave):
+            return chave
+    return None
+
+
+def _last_money(pattern: re.Pattern, text: str) -> Optional[Decimal]:
+    """
+    Valor de um campo do quadro de totais. Com uma célula por linha o valor
+    vem logo após o rótulo; com a linha de rótulos seguida da linha de valores
+    (esses rótulos são os últimos da sua linha), é o último valor da sequência.
+    """
+    match = pattern.search(text)
+    if not match:
+        return None
+    return _to_decimal(match.group(1).split()[-1])
+
+
+def _page_items(text: str) -> List[Dict[str, Any]]:
+    """Itens do quadro "dados dos produtos" de uma página (texto achatado)"""
+    start = PRODUCTS_START.search(text)
+    if not start:
+        return []
+    end = PRODUCTS_END.search(text, start.end())
+    section = text[start.end():end.start() if end else len(text)]
+
+    items = []
+    position = 0
+    for match in ITEM_PATTERN.finditer(section):
+        gap = section[position:match.start()]
+        if not items:
+            header = None
+            for header in PRODUCTS_HEADER.finditer(gap):
+                pass
+            if header:
+                gap = gap[header.end():]
+        tokens = gap.split()
+        while tokens and TRAILING_VALUE.match(tokens[0]):
+            tokens.pop(0)
+
+        if len(tokens) >= 2:
+            codigo, descricao = tokens[0], " ".join(tokens[1:])
+        else:
+            codigo, descricao = None, " ".join(tokens)
+
+        items.append({
+            "codigo": codigo,
+            "descricao": descricao or "Item não identificado",
+            "ncm": match.group("ncm"),
+            "cfop": match.group("cfop"),
+            "unidade": match.group("unidade"),
+            "quantidade": _to_decimal(match.group("quantidade")),
+            "valor_unitario": _to_decimal(match.group("valor_unitario")),
+            "valor_total": _to_decimal(match.group("valor_total")),
+            "centro_custo": "Não Classificado"
+        })
+        position = match.end()
+
+    return items
+
+
+def parse_danfe(source: Union[bytes, IO]) -> Dict[str, Any]:
+    """
+    Lê um DANFE em PDF e devolve cabeçalho, totais e itens. Levanta
+    DanfeNeedsXml quando a extração não é confiável.
+    """
+    try:
+        reader = PdfReader(io.BytesIO(source) if isinstance(source, bytes) else source)
+        if reader.is_encrypted:
+            # DANFEs costumam vir protegidos só com senha de proprietário (vazia para leitura)
+            reader.decrypt("")
+        page_count = len(reader.pages)
+        first = _flatten(reader.pages[0].extract_text() or "") if page_count else ""
+    except (PdfReadError, ValueError, KeyError, IndexError) as e:
+        raise DanfeNeedsXml(f"PDF ilegível ({str(e)})")
+
+    if not first:
+        raise DanfeNeedsXml("PDF sem camada de texto (digitalizado)")
+
+    chave = _find_chave(first)
+    if not chave:
+        raise DanfeNeedsXml("chave de acesso não encontrada ou inválida")
+
+    data_emissao = DATA_EMISSAO_PATTERN.search(first)
+    valor_produtos = _last_money(VALOR_PRODUTOS_PATTERN, first)
+    valor_total = _last_money(VALOR_NOTA_PATTERN, first)
+    if not data_emissao:
+        raise DanfeNeedsXml("data de emissão não encontrada")
+    if valor_total is None:
+        raise DanfeNeedsXml("valor total da nota não encontrado")
+
+    # Itens das páginas seguintes só enquanto a soma não fecha com os produtos
+    expected = valor_produtos if valor_produtos is not None else valor_total
+    items = _page_items(first)
+    pages_read = 1
+    while abs(sum(item["valor_total"] for item in items) - expected) > TOTAL_TOLERANCE and pages_read < page_count:
+        text = _flatten(reader.pages[pages_read].extract_text() or "")
+        items.extend(_page_items(text))
+        pages_read += 1
+
+    items_total = sum(item["valor_total"] for item in items)
+    if not items:
+        raise DanfeNeedsXml("itens não encontrados no PDF")
+    if abs(items_total - expected) > TOTAL_TOLERANCE:
+        raise DanfeNeedsXml(f"soma dos itens ({items_total}) não confere com o total ({expected})")
+
+    fornecedor = FORNECEDOR_PATTERN.search(first)
+    return {
+        "chave_acesso": chave,
+        "numero": str(int(chave[25:34])),
+        "serie": str(int(chave[22:25])),
+        "cnpj_emitente": chave[6:20],
+        "nome_emitente": fornecedor.group(1).strip() if fornecedor else None,
+        "data_emissao": datetime.strptime(data_emissao.group(1), "%d/%m/%Y"),
+        "valor_produtos": valor_produtos,
+        "valor_total": valor_total,
+        "itens": items,
+        "paginas_lidas": pages_read,
+        "paginas": page_count,
+    }
+
+
+def parse_invoice_pdf(content: Union[bytes, IO]) -> Dict[str, Any]:
+    """DANFE no formato de parse_invoice_xml (InvoiceProcessingService); levanta DanfeNeedsXml"""
+    danfe = parse_danfe(content)
+    return {
+        "numero_nf": danfe["numero"],
+        "fornecedor": danfe["nome_emitente"],
+        "cnpj_fornecedor": danfe["cnpj_emitente"],
+        "chave_acesso": danfe["chave_acesso"],
+        "valor_total": danfe["valor_total"],
+        "data_emissao": danfe["data_emissao"],
+        "items": [
+            {key: item[key] for key in ("descricao", "quantidade", "valor_unitario", "valor_total", "unidade", "ncm", "centro_custo")}
+            for item in danfe["itens"]
+        ]
+    }
@@ -0,0 +1,283 @@
+"""
+Cache das respostas dos dashboards com invalidação por tags.
+
+Os métodos de DashboardService/SimpleDashboardService decorados com
+`cached_dashboard` têm o resultado guardado por endpoint + argumentos
+normalizados (DashboardFilters sem campos vazios, listas ordenadas), em um LRU
+do processo (DASHBOARD_CACHE_BACKEND=memory) ou no Redis de REDIS_URL
+(DASHBOARD_CACHE_BACKEND=redis, compartilhado entre os processos da API).
+
+Cada entrada guarda a versão das tags dos dados que leu (nf, compras,
+contratos); as escritas chamam `invalidate_dashboards(tag)`, que incrementa a
+versão. Entrada vencida (DASHBOARD_CACHE_TTL_SECONDS) ou com tag invalidada
+ainda é servida por até DASHBOARD_CACHE_STALE_SECONDS enquanto um único
+recálculo roda em segundo plano com sessão própria (stale-while-revalidate),
+então a requisição não espera pelos agregados. Um recálculo que começou antes
+de uma escrita grava as versões antigas e é refeito na próxima leitura.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Set, Tuple
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+
+
+TAG_NF = "nf"
+TAG_PURCHASES = "compras"  # ordens de compra, cotações, fornecedores e invoices
+TAG_CONTRACTS = "contratos"  # contratos e itens de orçamento
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    tag_versions: Tuple[int, ...]
+    fresh_until: float
+    stale_until: float
+
+
+class MemoryCacheBackend:
+    """LRU em memória do processo; invalidações só valem para este processo"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._tags: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, key: str, tags: Sequence[str]) -> Tuple[Optional[CacheEntry], Tuple[int, ...]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry, tuple(self._tags.get(tag, 0) for tag in tags)
+
+    def tag_versions(self, tags: Sequence[str]) -> Tuple[int, ...]:
+        with self._lock:
+            return tuple(self._tags.get(tag, 0) for tag in tags)
+
+    def store(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump_tags(self, tags: Sequence[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+
+class RedisCacheBackend:
+    """
+    Entradas e versões de tags no Redis (uma ida e volta por leitura);
+    a expiração fica no TTL da chave e o descarte por memória na política do servidor
+    """
+
+    def __init__(self, url: str, prefix: str = "dashboard_cache"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _tag_keys(self, tags: Sequence[str]):
+        return [f"{self.prefix}:tag:{tag}" for tag in tags]
+
+    def lookup(self, key: str, tags: Sequence[str]) -> Tuple[Optional[CacheEntry], Tuple[int, ...]]:
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.get(f"{self.prefix}:{key}")
+        pipeline.mget(self._tag_keys(tags))
+        raw, versions = pipeline.execute()
+        entry = pickle.loads(raw) if raw else None
+        return entry, tuple(int(version or 0) for version in versions)
+
+    def tag_versions(self, tags: Sequence[str]) -> Tuple[int, ...]:
+        return tuple(int(version or 0) for version in self.client.mget(self._tag_keys(tags)))
+
+    def store(self, key: str, entry: CacheEntry) -> None:
+        ttl = max(int(entry.stale_until - time.time()) + 1, 1)
+        self.client.set(f"{self.prefix}:{key}", pickle.dumps(entry), ex=ttl)
+
+    def bump_tags(self, tags: Sequence[str]) -> None:
+        pipeline = self.client.pipeline(transaction=False)
+        for tag_key in self._tag_keys(tags):
+            pipeline.incr(tag_key)
+        pipeline.execute()
+
+
+class DashboardCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self._refreshing: Set[str] = set()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _entry(self, value: Any, versions: Tuple[int, ...]) -> CacheEntry:
+        now = time.time()
+        fresh_until = now + settings.dashboard_cache_ttl_seconds
+        return CacheEntry(value, versions, fresh_until, fresh_until + settings.dashboard_cache_stale_seconds)
+
+    def get_or_compute(
+        self,
+        key: str,
+        tags: Sequence[str],
+        compute: Callable[[], Any],
+        recompute: Callable[[], Any]
+    ) -> Any:
+        """
+        Valor em cache ou calculado agora com `compute`; entradas vencidas ou
+        invalidadas (dentro da janela de stale) disparam `recompute` em segundo plano
+        """
+        try:
+            entry, versions = self.backend.lookup(key, tags)
+        except Exception as e:
+            print(f"Cache de dashboards indisponível: {str(e)}")
+            return compute()
+
+        if entry is not None:
+            now = time.time()
+            if entry.tag_versions == versions and now < entry.fresh_until:
+                return entry.value
+            if now < entry.stale_until:
+                self._refresh(key, tags, recompute)
+                return entry.value
+
+        # Versões lidas antes do cálculo: uma escrita durante ele deixa a entrada já vencida
+        value = compute()
+        self._store(key, self._entry(value, versions))
+        return value
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        try:
+            self.backend.store(key, entry)
+        except Exception as e:
+            print(f"Não foi possível gravar no cache de dashboards: {str(e)}")
+
+    def _refresh(self, key: str, tags: Sequence[str], recompute: Callable[[], Any]) -> None:
+        """Um recálculo por chave em andamento, fora da requisição"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dashboard-cache")
+
+        def run() -> None:
+            try:
+                versions = self.backend.tag_versions(tags)
+                self._store(key, self._entry(recompute(), versions))
+            except Exception as e:
+                print(f"Erro ao recalcular dashboard {key}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(run)
+
+    def invalidate(self, *tags: str) -> None:
+        try:
+            self.backend.bump_tags(tags)
+        except Exception as e:
+            print(f"Não foi possível invalidar o cache de dashboards: {str(e)}")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_cache: Optional[DashboardCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_dashboard_cache() -> DashboardCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if settings.dashboard_cache_backend == "redis":
+                backend = RedisCacheBackend(settings.redis_url)
+            else:
+                backend = MemoryCacheBackend(settings.dashboard_cache_max_entries)
+            _cache = DashboardCache(backend)
+        return _cache
+
+
+def invalidate_dashboards(*tags: str) -> None:
+    """Invalida os dashboards que leem dados das tags informadas; chamado pelas escritas"""
+    get_dashboard_cache().invalidate(*tags)
+
+
+def shutdown_dashboard_cache() -> None:
+    if _cache is not None:
+        _cache.shutdown()
+
+
+def _normalize(value: Any) -> Any:
+    """Forma canônica dos argumentos para a chave: sem campos vazios, listas ordenadas"""
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        normalized = {key: _normalize(item) for key, item in value.items()}
+        return {key: item for key, item in sorted(normalized.items()) if item not in (None, [], {}, "")}
+    if isinstance(value, (list, tuple, set)):
+        items = [_normalize(item) for item in value]
+        try:
+            return sorted(set(items))
+        except TypeError:
+            return items
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def cache_key(endpoint: str, arguments: Dict[str, Any]) -> str:
+    digest = hashlib.sha1(json.dumps(_normalize(arguments), sort_keys=True, default=str).encode()).hexdigest()
+    return f"{endpoint}:{digest[:20]}"
+
+
+def cached_dashboard(endpoint: str, tags: Sequence[str]):
+    """
+    Decora um método de serviço de dashboard (`self.db` + argumentos de filtro).
+    O recálculo em segundo plano instancia o mesmo serviço com uma sessão nova.
+    Com DASHBOARD_CACHE_TTL_SECONDS=0 o cache é desligado.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if settings.dashboard_cache_ttl_seconds <= 0:
+                return method(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            key = cache_key(endpoint, {name: value for name, value in bound.arguments.items() if name != "self"})
+
+            def recompute():
+                db = SessionLocal()
+                try:
+                    return method(type(self)(db), *args, **kwargs)
+                finally:
+                    db.close()
+
+            return get_dashboard_cache().get_or_compute(key, tags, lambda: method(self, *args, **kwargs), recompute)
+
+        return wrapper
+
+    return decorator
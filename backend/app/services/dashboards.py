@@ -9,12 +9,14 @@ from app.schemas.dashboards import (
     SuppliesDashboard, ExecutiveDashboard, KPICard, ChartData,
     SupplierMetric, CostCenterMetric, ContractProgress, DashboardFilters
 )
+from app.services.dashboard_cache import TAG_CONTRACTS, TAG_PURCHASES, cached_dashboard
 
 
 class DashboardService:
     def __init__(self, db: Session):
         self.db = db
 
+    @cached_dashboard("dashboards.supplies", (TAG_PURCHASES, TAG_CONTRACTS))
     def get_supplies_dashboard(self, filters: DashboardFilters) -> SuppliesDashboard:
         # Base query with filters
         base_date_filter = self._build_date_filter(filters)
@@ -89,6 +91,7 @@ class DashboardService:
             certificacoes_pendentes=certificacoes_pendentes
         )
 
+    @cached_dashboard("dashboards.executive", (TAG_PURCHASES, TAG_CONTRACTS))
     def get_executive_dashboard(self, filters: DashboardFilters) -> ExecutiveDashboard:
         # KPIs estratégicos
         percentual_realizado_total = self._calculate_overall_completion_percentage(filters)
@@ -9,12 +9,14 @@ from decimal import Decimal
 from app.models.contracts import Contract, BudgetItem
 from app.models.purchases import PurchaseOrder, Invoice, Supplier, Quotation
 from app.models.users import User
+from app.services.dashboard_cache import TAG_CONTRACTS, TAG_NF, TAG_PURCHASES, cached_dashboard
 
 
 class SimpleDashboardService:
     def __init__(self, db: Session):
         self.db = db
 
+    @cached_dashboard("dashboards_simple.supplies", (TAG_NF, TAG_PURCHASES, TAG_CONTRACTS))
     def get_supplies_dashboard(
         self,
         filters: Optional[Dict[str, Any]] = None
@@ -125,6 +127,7 @@ class SimpleDashboardService:
             "generated_at": datetime.now().isoformat()
         }
 
+    @cached_dashboard("dashboards_simple.executive", (TAG_NF, TAG_PURCHASES, TAG_CONTRACTS))
     def get_executive_dashboard(
         self,
         filters: Optional[Dict[str, Any]] = None
@@ -148,12 +151,9 @@ class SimpleDashboardService:
         from app.services.nf_service import NotaFiscalService
 
         nf_service = NotaFiscalService(self.db)
-        total_realized = 0
 
-        # Somar valor realizado de todos os contratos
-        all_contracts = self.db.query(Contract).all()
-        for contract in all_contracts:
-            total_realized += float(nf_service.calculate_contract_realized_value(contract.id))
+        # Somar valor realizado de todos os contratos a partir do agregado por contrato
+        total_realized = float(nf_service.ledger.total_realized())
 
         # Percentual de realização geral
         realization_percentage = (total_realized / float(total_contract_value) * 100) if total_contract_value > 0 else 0
@@ -245,6 +245,7 @@ class SimpleDashboardService:
             "generated_at": datetime.now().isoformat()
         }
 
+    @cached_dashboard("dashboards_simple.kpis_summary", (TAG_PURCHASES, TAG_CONTRACTS))
     def get_kpis_summary(
         self,
         period_days: int = 30
@@ -0,0 +1,299 @@
+"""
+Inspeção rápida de arquivos para /import/validate-file.
+
+Lê só o começo de cada arquivo, em tempo independente do tamanho:
+- XML: os primeiros KB, com parser incremental, até achar `infNFe`
+- Excel (.xlsx): nomes das abas, as primeiras linhas da aba e a dimensão
+  declarada no XML da aba (estimativa de linhas sem percorrer a planilha)
+- ZIP: só o diretório central (lista de membros e tamanhos)
+- CSV: os primeiros KB, com estimativa de linhas pelo tamanho médio da linha
+Nada é gravado em disco e o conteúdo completo nunca é carregado.
+"""
+
+import csv
+import io
+import os
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, IO, List, Optional, Sequence, Set, Tuple
+
+from app.core.xlsx_reader import XlsxFormatError, XlsxReader
+from app.services.nfe_parser import NFE_NAMESPACE
+
+
+SNIFF_BYTES = 64 * 1024
+SNIFF_ROWS = 10
+BUDGET_SHEETS = ("QQP_Cliente", "QQP Cliente")
+NFE_ROOTS = {"nfeProc", "NFe"}
+FILE_TYPES = {".xml": "xml", ".xlsx": "excel", ".xlsm": "excel", ".xls": "excel", ".csv": "csv", ".zip": "zip"}
+
+# (template, mapeamento de colunas, campos obrigatórios), na ordem de preferência
+ColumnTemplate = Tuple[str, Dict[str, str], Set[str]]
+
+
+def stream_size(stream: IO[bytes]) -> int:
+    """Tamanho do arquivo pelo seek ao fim, sem ler o conteúdo"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def _local_name(tag: str) -> Tuple[str, Optional[str]]:
+    if tag.startswith("{"):
+        namespace, _, name = tag[1:].partition("}")
+        return name, namespace
+    return tag, None
+
+
+def sniff_xml(stream: IO[bytes], max_bytes: int = SNIFF_BYTES) -> Dict[str, Any]:
+    """Raiz, namespace e presença de `infNFe` lendo no máximo `max_bytes`"""
+    parser = ET.XMLPullParser(events=("start",))
+    info: Dict[str, Any] = {"root": None, "namespace": None, "infNFe": False, "chave_acesso": None}
+    read = 0
+
+    try:
+        while read < max_bytes:
+            data = stream.read(min(8192, max_bytes - read))
+            if not data:
+                break
+            read += len(data)
+            parser.feed(data)
+            for _, elem in parser.read_events():
+                name, namespace = _local_name(elem.tag)
+                if info["root"] is None:
+                    info["root"], info["namespace"] = name, namespace
+                if name == "infNFe":
+                    info["infNFe"] = True
+                    info["versao"] = elem.get("versao")
+                    chave = (elem.get("Id") or "").replace("NFe", "")
+                    info["chave_acesso"] = chave or None
+                    return info
+    except ET.ParseError as e:
+        info["error"] = f"XML malformado: {str(e)}"
+
+    return info
+
+
+def _xml_result(info: Dict[str, Any]) -> Dict[str, Any]:
+    is_nfe = (
+        info["root"] in NFE_ROOTS
+        and info["namespace"] == NFE_NAMESPACE.strip("{}")
+        and info["infNFe"]
+    )
+    return {
+        "type": "xml",
+        "valid": is_nfe,
+        "template": "nfe" if is_nfe else None,
+        "estimated_rows": 1 if is_nfe else 0,
+        "details": info,
+        "error": info.get("error") or (None if is_nfe else "XML não é uma NF-e (infNFe ausente)"),
+    }
+
+
+def _match_template(
+    rows: Sequence[Sequence[Any]],
+    templates: Sequence[ColumnTemplate]
+) -> Tuple[Optional[str], Optional[int], Dict[str, str]]:
+    """
+    Procura nas primeiras linhas o cabeçalho que cobre os campos obrigatórios
+    de algum template. Retorna (template, índice da linha de cabeçalho, mapeamento)
+    """
+    for index, row in enumerate(rows):
+        headers = [str(value).strip() for value in row if value is not None and str(value).strip()]
+        for name, mapping, required in templates:
+            column_map = {header: mapping[header.lower()] for header in headers if header.lower() in mapping}
+            if required <= set(column_map.values()):
+                return name, index, column_map
+    return None, None, {}
+
+
+def _table_result(
+    file_type: str,
+    rows: List[Sequence[Any]],
+    total_rows: Optional[int],
+    templates: Sequence[ColumnTemplate],
+    header_rows: int
+) -> Dict[str, Any]:
+    template, header_index, column_map = _match_template(rows, templates)
+    if header_index is None:
+        header_index = next((i for i, row in enumerate(rows) if any(v is not None for v in row)), 0)
+
+    header = list(rows[header_index]) if rows else []
+    return {
+        "type": file_type,
+        "valid": True,
+        "template": template,
+        "header_row": header_index + 1 if rows else None,
+        "columns": header,
+        "column_mapping": column_map,
+        "preview": [list(row) for row in rows[header_index + 1:header_index + 1 + header_rows]],
+        "estimated_rows": max(total_rows - header_index - 1, 0) if total_rows is not None else None,
+        "error": None if template else "Cabeçalho não corresponde a nenhum modelo de importação",
+    }
+
+
+def sniff_xlsx(
+    stream: IO[bytes],
+    templates: Sequence[ColumnTemplate],
+    sheet_name: Optional[str] = None,
+    header_rows: int = SNIFF_ROWS
+) -> Dict[str, Any]:
+    with XlsxReader(stream) as reader:
+        sheets = reader.sheetnames
+        budget_sheet = next((name for name in BUDGET_SHEETS if name in sheets), None)
+
+        # QQP_Cliente tem layout fixo (serviços nas linhas 12-22, total em E41)
+        if sheet_name is None and budget_sheet:
+            dimension = reader.dimension(budget_sheet)
+            return {
+                "type": "excel",
+                "valid": True,
+                "template": "orcamento_qqp",
+                "sheets": sheets,
+                "sheet": budget_sheet,
+                "dimension": dimension,
+                "estimated_rows": 11,
+                "error": None,
+            }
+
+        rows: List[Sequence[Any]] = []
+        for row in reader.iter_rows(sheet_name):
+            rows.append(row)
+            if len(rows) >= header_rows * 2:
+                break
+        dimension = reader.dimension(sheet_name)
+
+    result = _table_result("excel", rows, dimension[0] if dimension else None, templates, header_rows)
+    result.update({"sheets": sheets, "sheet": sheet_name or (sheets[0] if sheets else None), "dimension": dimension})
+    return result
+
+
+def sniff_xls(
+    stream: IO[bytes],
+    templates: Sequence[ColumnTemplate],
+    sheet_name: Optional[str] = None,
+    header_rows: int = SNIFF_ROWS
+) -> Dict[str, Any]:
+    """
+    .xls (BIFF) não tem leitura parcial: o xlrd carrega o arquivo, mas com
+    on_demand só decodifica a aba pedida. O formato é limitado a 65.536 linhas.
+    """
+    import xlrd
+
+    book = xlrd.open_workbook(file_contents=stream.read(), on_demand=True)
+    try:
+        sheets = book.sheet_names()
+        sheet = book.sheet_by_name(sheet_name) if sheet_name else book.sheet_by_index(0)
+        rows = [sheet.row_values(i) for i in range(min(sheet.nrows, header_rows * 2))]
+        result = _table_result("excel", rows, sheet.nrows, templates, header_rows)
+        result.update({"sheets": sheets, "sheet": sheet.name, "dimension": (sheet.nrows, sheet.ncols)})
+    finally:
+        book.release_resources()
+    return result
+
+
+def sniff_csv(
+    stream: IO[bytes],
+    size: int,
+    templates: Sequence[ColumnTemplate],
+    header_rows: int = SNIFF_ROWS
+) -> Dict[str, Any]:
+    sample = stream.read(SNIFF_BYTES)
+    try:
+        text = sample.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = sample.decode("latin-1")
+
+    # A última linha da amostra pode estar cortada
+    lines = text.splitlines()
+    complete = lines if len(sample) >= size else lines[:-1]
+    try:
+        dialect = csv.Sniffer().sniff("\n".join(complete[:header_rows]), delimiters=";,\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = list(csv.reader(io.StringIO("\n".join(complete[:header_rows * 2])), dialect))
+
+    sampled_bytes = len("\n".join(complete).encode("utf-8")) or 1
+    total_rows = len(complete) if len(sample) >= size else round(size * len(complete) / sampled_bytes)
+
+    result = _table_result("csv", rows, total_rows, templates, header_rows)
+    result["delimiter"] = dialect.delimiter
+    return result
+
+
+def sniff_zip(stream: IO[bytes]) -> Dict[str, Any]:
+    """Conta os membros pelo diretório central e confere a primeira XML"""
+    with zipfile.ZipFile(stream) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        by_extension: Dict[str, int] = {}
+        for info in members:
+            extension = os.path.splitext(info.filename)[1].lower() or "(sem extensão)"
+            by_extension[extension] = by_extension.get(extension, 0) + 1
+
+        first_xml = next((info for info in members if info.filename.lower().endswith(".xml")), None)
+        sample = None
+        if first_xml is not None:
+            with archive.open(first_xml) as member:
+                sample = sniff_xml(member)
+                sample["arquivo"] = first_xml.filename
+
+    documents = by_extension.get(".xml", 0) + by_extension.get(".pdf", 0)
+    return {
+        "type": "zip",
+        "valid": documents > 0,
+        "template": "nfe_zip" if documents else None,
+        "estimated_rows": documents,
+        "details": {
+            "arquivos": len(members),
+            "por_extensao": by_extension,
+            "tamanho_descompactado": sum(info.file_size for info in members),
+            "amostra_xml": sample,
+        },
+        "error": None if documents else "ZIP sem arquivos XML ou PDF",
+    }
+
+
+def sniff_file(
+    stream: IO[bytes],
+    filename: str,
+    templates: Sequence[ColumnTemplate],
+    sheet_name: Optional[str] = None,
+    header_rows: int = SNIFF_ROWS
+) -> Dict[str, Any]:
+    """
+    Identifica tipo, modelo de importação, mapeamento de colunas e uma
+    estimativa de linhas lendo só o cabeçalho do arquivo. Nunca levanta
+    exceção: arquivos ilegíveis voltam com `valid` False e `error`.
+    """
+    started = time.perf_counter()
+    size = stream_size(stream)
+    extension = os.path.splitext(filename or "")[1].lower()
+
+    try:
+        if extension == ".xml":
+            result = _xml_result(sniff_xml(stream))
+        elif extension in (".xlsx", ".xlsm"):
+            result = sniff_xlsx(stream, templates, sheet_name, header_rows)
+        elif extension == ".xls":
+            result = sniff_xls(stream, templates, sheet_name, header_rows)
+        elif extension == ".csv":
+            result = sniff_csv(stream, size, templates, header_rows)
+        elif extension == ".zip":
+            result = sniff_zip(stream)
+        else:
+            result = {"type": None, "valid": False, "error": f"Extensão não suportada: {extension or '(nenhuma)'}"}
+    except (XlsxFormatError, zipfile.BadZipFile) as e:
+        result = {"type": FILE_TYPES.get(extension), "valid": False, "error": str(e)}
+    except Exception as e:
+        result = {"type": FILE_TYPES.get(extension), "valid": False, "error": f"Erro ao ler arquivo: {str(e)}"}
+    finally:
+        stream.seek(0)
+
+    result.update({
+        "filename": filename,
+        "size": size,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return result
@@ -1,20 +1,31 @@
 import pandas as pd
-import xml.etree.ElementTree as ET
+import numpy as np
 import json
 import asyncio
-from typing import List, Dict, Any, Optional, Union
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Union
 from decimal import Decimal
 from datetime import datetime
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from fastapi import UploadFile, HTTPException, status
-import os
 import tempfile
-import aiofiles
-import openpyxl
+from app.core.config import settings
+from app.core.xlsx_reader import XlsxFormatError, XlsxReader
 from app.models.contracts import Contract, BudgetItem, ValorPrevisto
 from app.models.purchases import Invoice, InvoiceItem, PurchaseOrder
 from app.models.cost_centers import CostCenter
 from app.schemas.contracts import BudgetItemCreate
+from app.services.dashboard_cache import TAG_CONTRACTS, TAG_PURCHASES, invalidate_dashboards
+from app.services.file_sniffing import SNIFF_ROWS, sniff_file
+from app.services.nfe_parsing import parse_nfe_data, run_in_parse_pool
+
+
+# Resultado do parsing de planilhas de orçamento por (SHA-256 do arquivo, aba), LRU
+_budget_cache: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+_budget_cache_lock = threading.Lock()
 
 
 class DataImportService:
@@ -85,92 +96,132 @@ class DataImportService:
                 detail="Arquivo deve ser Excel (.xlsx, .xls ou .xlsm)"
             )
 
-        # Salvar arquivo temporariamente
-        temp_path = os.path.join(self.temp_dir, f"budget_{contract_id or 'new'}_{file.filename}")
+        # Se contract_id for fornecido, verificar se existe
+        if contract_id:
+            contract = self.db.query(Contract).filter(Contract.id == contract_id).first()
+            if not contract:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Contrato não encontrado"
+                )
+
+        # Lido direto do upload em spool; o resultado fica em cache pelo hash do arquivo
+        parsed = await asyncio.to_thread(self._parse_budget_file, file.file, file.filename, sheet_name)
+        valores_previstos = parsed['valores_previstos']
 
-        async with aiofiles.open(temp_path, 'wb') as temp_file:
-            content = await file.read()
-            await temp_file.write(content)
+        # Se contract_id fornecido, criar itens no banco
+        if contract_id and valores_previstos:
+            for item_data in valores_previstos:
+                self.db.add(ValorPrevisto(
+                    contract_id=contract_id,
+                    **{k: v for k, v in item_data.items() if v is not None}
+                ))
+            self.db.commit()
+            invalidate_dashboards(TAG_CONTRACTS)
 
-        try:
-            # Se contract_id for fornecido, verificar se existe
-            if contract_id:
-                contract = self.db.query(Contract).filter(Contract.id == contract_id).first()
-                if not contract:
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail="Contrato não encontrado"
-                    )
-
-            # Ler planilha QQP_Cliente sem header para processar estrutura customizada
-            df = pd.read_excel(temp_path, sheet_name=sheet_name, header=None)
-
-            # Extrair valor total do contrato (linha 40, coluna 4)
-            valor_total_contrato = None
-            if df.shape[0] > 40 and df.shape[1] > 4:
-                valor_total = df.iloc[40, 4]
-                if pd.notna(valor_total) and isinstance(valor_total, (int, float)):
-                    valor_total_contrato = Decimal(str(valor_total))
-
-            # Processar tabela de serviços detalhados (linhas 11-21)
-            valores_previstos = []
-            errors = []
-
-            for i in range(11, min(22, df.shape[0])):
+        return {
+            'success': True,
+            'imported_items': len(valores_previstos),
+            'errors': parsed['errors'],
+            'items_total': sum(item['preco_total'] for item in valores_previstos if item['preco_total']),
+            'contract_total_value': parsed['contract_total_value'],  # Valor total do contrato
+            'valores_previstos': valores_previstos  # Incluir os itens para uso na criação
+        }
+
+    def _parse_budget_file(self, source, filename: str, sheet_name: str) -> Dict[str, Any]:
+        """
+        Extrai da aba QQP_Cliente os serviços (linhas 12-22 do Excel) e o valor
+        total do contrato (E41). Só a aba pedida é lida, e só até a linha 41.
+        O resultado é guardado por (SHA-256 do arquivo, aba), então validar e
+        depois importar o mesmo arquivo parseia a planilha uma vez só.
+        """
+        digest = hashlib.sha256()
+        source.seek(0)
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+        source.seek(0)
+        cache_key = (digest.hexdigest(), sheet_name)
+
+        with _budget_cache_lock:
+            cached = _budget_cache.get(cache_key)
+            if cached is not None:
+                _budget_cache.move_to_end(cache_key)
+
+        if cached is None:
+            cached = self._read_budget_rows(source, filename, sheet_name)
+            with _budget_cache_lock:
+                _budget_cache[cache_key] = cached
+                while len(_budget_cache) > settings.budget_parse_cache_size:
+                    _budget_cache.popitem(last=False)
+
+        # Cópias rasas: quem chama pode alterar os itens sem afetar o cache
+        return {
+            'contract_total_value': cached['contract_total_value'],
+            'valores_previstos': [dict(item) for item in cached['valores_previstos']],
+            'errors': list(cached['errors'])
+        }
+
+    def _read_budget_rows(self, source, filename: str, sheet_name: str) -> Dict[str, Any]:
+        # Índices 0-based (como no DataFrame sem header): serviços 11-21, total em (40, 4)
+        first_item_row, last_item_row, total_row, total_col = 11, 21, 40, 4
+
+        if filename.lower().endswith('.xls'):
+            df = pd.read_excel(source, sheet_name=sheet_name, header=None, nrows=total_row + 1)
+            rows = [tuple(None if pd.isna(value) else value for value in row) for row in df.itertuples(index=False)]
+        else:
+            rows = []
+            with XlsxReader(source) as reader:
+                for row in reader.iter_rows(sheet_name):
+                    rows.append(row)
+                    if len(rows) > total_row:
+                        break
+
+        def cell(row_index: int, col_index: int):
+            if row_index >= len(rows) or col_index >= len(rows[row_index]):
+                return None
+            value = rows[row_index][col_index]
+            return None if isinstance(value, float) and np.isnan(value) else value
+
+        def to_decimal_safe(value):
+            if value is not None and value != '':
                 try:
-                    row = df.iloc[i]
-
-                    # Verificar se a linha tem dados válidos (item, serviço e preço total)
-                    if pd.notna(row[2]) and pd.notna(row[3]) and pd.notna(row[12]):
-                        # Função auxiliar para converter para Decimal
-                        def to_decimal_safe(value):
-                            if pd.notna(value) and value != '':
-                                try:
-                                    return Decimal(str(value))
-                                except:
-                                    return None
-                            return None
-
-                        item_data = {
-                            'item': str(row[2]),  # Coluna 2: Código do item
-                            'servicos': str(row[3]),  # Coluna 3: Descrição do serviço
-                            'unidade': str(row[4]) if pd.notna(row[4]) else None,  # Coluna 4: Unidade
-                            'qtd_mensal': to_decimal_safe(row[5]),  # Coluna 6: QTD Mensal (row[5] = coluna 6)
-                            'duracao_meses': to_decimal_safe(row[6]),  # Coluna 7: Duração Meses (row[6] = coluna 7)
-                            'preco_total': Decimal(str(row[12])),  # Coluna 12: Preço Total
-                            'observacao': str(row[13]) if pd.notna(row[13]) else None  # Coluna 13: Observação
-                        }
-
-                        # Se contract_id fornecido, criar item no banco
-                        if contract_id:
-                            valor_previsto = ValorPrevisto(
-                                contract_id=contract_id,
-                                **{k: v for k, v in item_data.items() if v is not None}
-                            )
-                            self.db.add(valor_previsto)
-
-                        valores_previstos.append(item_data)
-
-                except Exception as e:
-                    errors.append(f"Linha {i + 1}: {str(e)}")
-
-            # Commit apenas se contract_id foi fornecido
-            if contract_id and valores_previstos:
-                self.db.commit()
-            
-            return {
-                'success': True,
-                'imported_items': len(valores_previstos),
-                'errors': errors,
-                'items_total': sum(item['preco_total'] for item in valores_previstos if item['preco_total']),
-                'contract_total_value': valor_total_contrato,  # Valor total do contrato
-                'valores_previstos': valores_previstos  # Incluir os itens para uso na criação
-            }
-            
-        finally:
-            # Limpar arquivo temporário
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+                    return Decimal(str(value))
+                except Exception:
+                    return None
+            return None
+
+        # Extrair valor total do contrato (linha 40, coluna 4)
+        contract_total_value = None
+        valor_total = cell(total_row, total_col)
+        if isinstance(valor_total, (int, float)) and not isinstance(valor_total, bool):
+            contract_total_value = Decimal(str(valor_total))
+
+        # Processar tabela de serviços detalhados (linhas 11-21)
+        valores_previstos = []
+        errors = []
+
+        for i in range(first_item_row, min(last_item_row + 1, len(rows))):
+            try:
+                # Verificar se a linha tem dados válidos (item, serviço e preço total)
+                if cell(i, 2) is not None and cell(i, 3) is not None and cell(i, 12) is not None:
+                    valores_previstos.append({
+                        'item': str(cell(i, 2)),  # Coluna 2: Código do item
+                        'servicos': str(cell(i, 3)),  # Coluna 3: Descrição do serviço
+                        'unidade': str(cell(i, 4)) if cell(i, 4) is not None else None,  # Coluna 4: Unidade
+                        'qtd_mensal': to_decimal_safe(cell(i, 5)),  # Coluna 6: QTD Mensal (row[5] = coluna 6)
+                        'duracao_meses': to_decimal_safe(cell(i, 6)),  # Coluna 7: Duração Meses (row[6] = coluna 7)
+                        'preco_total': Decimal(str(cell(i, 12))),  # Coluna 12: Preço Total
+                        'observacao': str(cell(i, 13)) if cell(i, 13) is not None else None  # Coluna 13: Observação
+                    })
+
+            except Exception as e:
+                errors.append(f"Linha {i + 1}: {str(e)}")
+
+        return {
+            'contract_total_value': contract_total_value,
+            'valores_previstos': valores_previstos,
+            'errors': errors
+        }
 
     async def import_invoice_from_xml(self, file: UploadFile, purchase_order_id: int) -> Dict[str, Any]:
         """
@@ -193,11 +244,8 @@ class DataImportService:
         content = await file.read()
         
         try:
-            # Parse XML
-            root = ET.fromstring(content)
-            
-            # Extrair dados da NF-e (padrão brasileiro)
-            nfe_data = self._extract_nfe_data(root)
+            # Extrair dados da NF-e (padrão brasileiro) no pool de parsing
+            nfe_data = await run_in_parse_pool(parse_nfe_data, content)
             
             # Criar invoice
             invoice = Invoice(
@@ -229,6 +277,7 @@ class DataImportService:
                 self.db.add(invoice_item)
             
             self.db.commit()
+            invalidate_dashboards(TAG_PURCHASES)
             
             return {
                 'success': True,
@@ -253,7 +302,13 @@ class DataImportService:
         skip_rows: int = 0
     ) -> Dict[str, Any]:
         """
-        Importa itens de nota fiscal de planilha Excel
+        Importa itens de nota fiscal de planilha Excel.
+
+        Pipeline colunar: a planilha vira um DataFrame, os valores são
+        convertidos por coluna (pandas), o centro de custo é classificado uma
+        vez por descrição distinta, as linhas inválidas são apontadas por
+        máscara e os itens entram com um único INSERT em lote, na mesma
+        transação da invoice.
         """
         if not file.filename.endswith(('.xlsx', '.xls')):
             raise HTTPException(
@@ -269,88 +324,156 @@ class DataImportService:
                 detail="Ordem de compra não encontrada"
             )
 
-        # Salvar arquivo temporariamente
-        temp_path = os.path.join(self.temp_dir, f"invoice_{purchase_order_id}_{file.filename}")
-        
-        async with aiofiles.open(temp_path, 'wb') as temp_file:
-            content = await file.read()
-            await temp_file.write(content)
+        # Ler e converter a planilha (fora do event loop)
+        items, errors = await asyncio.to_thread(
+            self.parse_invoice_excel, file.file, file.filename, sheet_name, skip_rows
+        )
 
-        try:
-            # Ler planilha
-            if sheet_name:
-                df = pd.read_excel(temp_path, sheet_name=sheet_name, skiprows=skip_rows)
-            else:
-                df = pd.read_excel(temp_path, skiprows=skip_rows)
-            
-            # Normalizar nomes das colunas
-            df.columns = df.columns.str.lower().str.strip()
-            
-            # Mapear colunas
-            df_mapped = self._map_columns(df, self.invoice_column_mapping)
-            
-            # Validar colunas obrigatórias
-            required_columns = ['descricao', 'valor_total']
-            missing_columns = [col for col in required_columns if col not in df_mapped.columns]
-            
-            if missing_columns:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Colunas obrigatórias ausentes: {missing_columns}"
-                )
+        # Invoice e itens na mesma transação
+        invoice = Invoice(
+            purchase_order_id=purchase_order_id,
+            numero_nf=f"IMPORT_{purchase_order_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            valor_total=Decimal(str(round(float(items['valor_total'].sum()), 2))),
+            data_emissao=datetime.now(),
+            observacoes=f"Importado de planilha: {file.filename}"
+        )
 
-            # Criar invoice se não existir
-            invoice = Invoice(
-                purchase_order_id=purchase_order_id,
-                numero_nf=f"IMPORT_{purchase_order_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
-                valor_total=df_mapped['valor_total'].sum(),
-                data_emissao=datetime.now(),
-                observacoes=f"Importado de planilha: {file.filename}"
-            )
-            
+        try:
             self.db.add(invoice)
+            self.db.flush()
+
+            items['invoice_id'] = invoice.id
+            records = items.astype(object).where(items.notna(), None).to_dict('records')
+            for start in range(0, len(records), settings.bulk_write_chunk_size):
+                self.db.execute(insert(InvoiceItem), records[start:start + settings.bulk_write_chunk_size])
+
             self.db.commit()
-            self.db.refresh(invoice)
-            
-            # Processar itens
-            items_imported = 0
-            errors = []
-            
-            for index, row in df_mapped.iterrows():
-                try:
-                    centro_custo = self._classify_cost_center(row['descricao'])
-                    
-                    invoice_item = InvoiceItem(
-                        invoice_id=invoice.id,
-                        descricao=str(row['descricao']),
-                        centro_custo=row.get('centro_custo', centro_custo),
-                        unidade=row.get('unidade'),
-                        quantidade=self._to_decimal(row.get('quantidade')),
-                        peso=self._to_decimal(row.get('peso')),
-                        valor_unitario=self._to_decimal(row.get('valor_unitario')),
-                        valor_total=self._to_decimal(row['valor_total'])
-                    )
-                    
-                    self.db.add(invoice_item)
-                    items_imported += 1
-                    
-                except Exception as e:
-                    errors.append(f"Linha {index + 1}: {str(e)}")
-            
-            self.db.commit()
-            
-            return {
-                'success': True,
-                'invoice_id': invoice.id,
-                'items_imported': items_imported,
-                'errors': errors,
-                'total_value': float(invoice.valor_total)
-            }
-            
-        finally:
-            # Limpar arquivo temporário
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+        except Exception:
+            self.db.rollback()
+            raise
+        invalidate_dashboards(TAG_PURCHASES)
+
+        return {
+            'success': True,
+            'invoice_id': invoice.id,
+            'items_imported': len(records),
+            'errors': errors,
+            'total_value': float(invoice.valor_total)
+        }
+
+    def parse_invoice_excel(
+        self,
+        source,
+        filename: str,
+        sheet_name: Optional[str] = None,
+        skip_rows: int = 0
+    ) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Lê a planilha e devolve os itens de invoice válidos (colunas de
+        InvoiceItem, sem invoice_id) e as mensagens das linhas descartadas.
+        Síncrono: quem chama decide em que thread roda.
+        """
+        df = self._read_excel(source, filename, sheet_name, skip_rows)
+
+        # Normalizar nomes das colunas
+        df.columns = df.columns.astype(str).str.lower().str.strip()
+
+        # Mapear colunas
+        df_mapped = self._map_columns(df, self.invoice_column_mapping)
+        df_mapped = df_mapped.loc[:, ~df_mapped.columns.duplicated()].dropna(how='all')
+
+        # Validar colunas obrigatórias
+        required_columns = ['descricao', 'valor_total']
+        missing_columns = [col for col in required_columns if col not in df_mapped.columns]
+
+        if missing_columns:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Colunas obrigatórias ausentes: {missing_columns}"
+            )
+
+        return self._build_invoice_items(df_mapped)
+
+    def _read_excel(self, source, filename: str, sheet_name: Optional[str] = None, skip_rows: int = 0) -> pd.DataFrame:
+        """
+        Lê a planilha para um DataFrame. .xlsx usa o leitor streaming
+        (app.core.xlsx_reader), bem mais rápido que pd.read_excel em planilhas
+        grandes; .xls continua com o xlrd do pandas.
+        """
+        if filename.lower().endswith('.xls'):
+            return pd.read_excel(source, sheet_name=sheet_name or 0, skiprows=skip_rows)
+
+        try:
+            with XlsxReader(source) as reader:
+                rows = reader.iter_rows(sheet_name, min_row=skip_rows + 1)
+                header = next(rows, None)
+                if not header:
+                    return pd.DataFrame()
+
+                width = len(header)
+                columns = [f"unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+                records = [
+                    row[:width] if len(row) >= width else row + (None,) * (width - len(row))
+                    for row in rows
+                ]
+        except XlsxFormatError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        return pd.DataFrame.from_records(records, columns=columns)
+
+    def _build_invoice_items(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+        """
+        Converte o DataFrame mapeado nas colunas de InvoiceItem. Retorna os
+        itens válidos e as mensagens das linhas descartadas (sem descrição ou
+        sem valor total numérico).
+        """
+        descricao = df['descricao'].astype('string').str.strip()
+        items = pd.DataFrame({'descricao': descricao}, index=df.index)
+
+        for column in ('quantidade', 'peso', 'valor_unitario', 'valor_total'):
+            items[column] = self._to_numeric_series(df[column]) if column in df.columns else np.nan
+
+        items['unidade'] = df['unidade'].astype('string').str.strip() if 'unidade' in df.columns else None
+
+        # Linhas inválidas, apontadas por máscara
+        missing_description = (descricao.isna() | (descricao == '')).fillna(True).astype(bool)
+        invalid_total = items['valor_total'].isna()
+        errors = [
+            f"Linha {index + 1}: descrição ausente" if missing_description[index]
+            else f"Linha {index + 1}: valor_total inválido ({df.at[index, 'valor_total']!r})"
+            for index in df.index[missing_description | invalid_total]
+        ]
+        items = items[~(missing_description | invalid_total)]
+
+        # Classificação uma vez por descrição distinta
+        classified = items['descricao'].map(
+            {description: self._classify_cost_center(description) for description in items['descricao'].unique()}
+        )
+        if 'centro_custo' in df.columns:
+            informed = df.loc[items.index, 'centro_custo'].astype('string').str.strip()
+            classified = informed.where(informed.notna() & (informed != ''), classified)
+        items['centro_custo'] = classified
+
+        items['quantidade'] = items['quantidade'].round(4)
+        items['peso'] = items['peso'].round(4)
+        items['valor_unitario'] = items['valor_unitario'].round(2)
+        items['valor_total'] = items['valor_total'].round(2)
+
+        return items, errors
+
+    def _to_numeric_series(self, series: pd.Series) -> pd.Series:
+        """
+        Versão vetorizada de `_to_decimal` para uma coluna: remove símbolos de
+        moeda e converte texto no formato brasileiro (1.234,56); valores
+        inválidos viram NaN
+        """
+        if pd.api.types.is_numeric_dtype(series):
+            return series.astype(float)
+
+        text = series.astype('string').str.replace(r'R?\$|\s', '', regex=True)
+        decimal_comma = text.str.contains(',', regex=False, na=False)
+        text = text.mask(decimal_comma, text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+        return pd.to_numeric(text, errors='coerce').astype(float)
 
     def _map_columns(self, df: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
         """
@@ -398,92 +521,22 @@ class DataImportService:
         except:
             return None
 
-    def _extract_nfe_data(self, root: ET.Element) -> Dict[str, Any]:
-        """
-        Extrai dados de uma NF-e XML (padrão brasileiro)
-        """
-        # Namespaces comuns da NF-e
-        ns = {
-            'nfe': 'http://www.portalfiscal.inf.br/nfe'
-        }
-        
-        try:
-            # Buscar dados principais da NF
-            inf_nfe = root.find('.//nfe:infNFe', ns)
-            ide = inf_nfe.find('nfe:ide', ns)
-            total = inf_nfe.find('.//nfe:total/nfe:ICMSTot', ns)
-            
-            numero = ide.find('nfe:nNF', ns).text
-            data_emissao = datetime.strptime(ide.find('nfe:dhEmi', ns).text[:10], '%Y-%m-%d')
-            valor_total = Decimal(total.find('nfe:vNF', ns).text)
-            
-            # Extrair itens
-            itens = []
-            for det in inf_nfe.findall('nfe:det', ns):
-                prod = det.find('nfe:prod', ns)
-                
-                item = {
-                    'descricao': prod.find('nfe:xProd', ns).text,
-                    'unidade': prod.find('nfe:uCom', ns).text,
-                    'quantidade': Decimal(prod.find('nfe:qCom', ns).text),
-                    'valor_unitario': Decimal(prod.find('nfe:vUnCom', ns).text),
-                    'valor_total': Decimal(prod.find('nfe:vProd', ns).text)
-                }
-                
-                itens.append(item)
-            
-            return {
-                'numero': numero,
-                'data_emissao': data_emissao,
-                'valor_total': valor_total,
-                'itens': itens
-            }
-            
-        except Exception as e:
-            raise ValueError(f"Erro ao extrair dados da NF-e: {str(e)}")
-
-    async def validate_file_format(self, file: UploadFile) -> Dict[str, Any]:
+    async def validate_file_format(
+        self,
+        file: UploadFile,
+        sheet_name: Optional[str] = None,
+        header_rows: int = SNIFF_ROWS
+    ) -> Dict[str, Any]:
         """
-        Valida formato do arquivo e retorna informações básicas
+        Valida formato do arquivo lendo só o cabeçalho (app.services.file_sniffing):
+        tipo, abas, modelo detectado, mapeamento de colunas e estimativa de linhas
         """
-        file_info = {
-            'filename': file.filename,
-            'size': 0,
-            'type': None,
-            'valid': False,
-            'sheets': []
-        }
-        
-        # Calcular tamanho
-        content = await file.read()
-        file_info['size'] = len(content)
-        
-        # Resetar ponteiro do arquivo
-        await file.seek(0)
-        
-        if file.filename.endswith('.xlsx') or file.filename.endswith('.xls'):
-            file_info['type'] = 'excel'
-            file_info['valid'] = True
-            
-            # Listar planilhas (sheets)
-            try:
-                temp_path = os.path.join(self.temp_dir, f"validate_{file.filename}")
-                async with aiofiles.open(temp_path, 'wb') as temp_file:
-                    await temp_file.write(content)
-                
-                workbook = openpyxl.load_workbook(temp_path)
-                file_info['sheets'] = workbook.sheetnames
-                
-                os.remove(temp_path)
-            except:
-                pass
-                
-        elif file.filename.endswith('.xml'):
-            file_info['type'] = 'xml'
-            file_info['valid'] = True
-            
-        elif file.filename.endswith('.csv'):
-            file_info['type'] = 'csv'
-            file_info['valid'] = True
-        
+        templates = [
+            ('orcamento', self.budget_column_mapping, {'codigo_item', 'descricao'}),
+            ('nf_itens', self.invoice_column_mapping, {'descricao', 'valor_total'}),
+        ]
+        file_info = await asyncio.to_thread(
+            sniff_file, file.file, file.filename or '', templates, sheet_name, header_rows
+        )
+        file_info.setdefault('sheets', [])
         return file_info
\ No newline at end of file
@@ -1,39 +1,46 @@
 """Serviço de importação de dados simplificado"""
 
+import asyncio
+import hashlib
 import json
+import os
 import openpyxl
 from io import BytesIO
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Any, Optional, Tuple
 from fastapi import UploadFile, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime
+from decimal import Decimal
 
+from app.core.config import settings
 from app.models.contracts import Contract, BudgetItem
-from app.models.purchases import Invoice, InvoiceItem
+from app.models.purchases import Invoice, InvoiceItem, PurchaseOrder
+from app.services.bulk_writer import Document
+from app.services.dashboard_cache import TAG_CONTRACTS, invalidate_dashboards
+from app.services.file_sniffing import SNIFF_ROWS
+from app.services.import_service import DataImportService
+from app.services.ingest_dedup import IngestDedupService
+from app.services.invoice_processing_service import HASH_BLOCK_SIZE, InvoiceProcessingService
+from app.services.nfe_parsing import parse_invoice_xml, run_in_parse_pool
 
 
 class SimpleDataImportService:
     def __init__(self, db: Session):
         self.db = db
 
-    async def validate_file_format(self, file: UploadFile) -> Dict[str, Any]:
-        """Valida formato do arquivo"""
-
-        valid_extensions = ['.xlsx', '.xls', '.xml']
-        file_extension = None
-
-        if file.filename:
-            file_extension = '.' + file.filename.split('.')[-1].lower()
-
-        valid = file_extension in valid_extensions if file_extension else False
+    async def validate_file_format(
+        self,
+        file: UploadFile,
+        sheet_name: Optional[str] = None,
+        header_rows: int = SNIFF_ROWS
+    ) -> Dict[str, Any]:
+        """Valida formato do arquivo lendo só o cabeçalho (ver DataImportService.validate_file_format)"""
 
-        return {
-            "valid": valid,
-            "filename": file.filename,
-            "file_type": file_extension,
-            "size": file.size if hasattr(file, 'size') else None,
-            "supported_formats": valid_extensions
-        }
+        valid_extensions = ['.xlsx', '.xlsm', '.xls', '.xml', '.csv', '.zip']
+        file_info = await DataImportService(self.db).validate_file_format(file, sheet_name, header_rows)
+        file_info["file_type"] = os.path.splitext(file.filename or "")[1].lower() or None
+        file_info["supported_formats"] = valid_extensions
+        return file_info
 
     async def import_budget_from_excel(
         self,
@@ -111,6 +118,7 @@ class SimpleDataImportService:
                     })
 
             self.db.commit()
+            invalidate_dashboards(TAG_CONTRACTS)
 
             return {
                 "success": True,
@@ -151,27 +159,14 @@ class SimpleDataImportService:
     async def import_invoice_from_excel(
         self,
         file: UploadFile,
-        purchase_order_id: int
+        purchase_order_id: int,
+        sheet_name: Optional[str] = None,
+        skip_rows: int = 0
     ) -> Dict[str, Any]:
-        """Importa nota fiscal de planilha Excel"""
-
-        try:
-            contents = await file.read()
-            workbook = openpyxl.load_workbook(BytesIO(contents))
-            worksheet = workbook.active
-
-            # Processar dados básicos da nota fiscal
-            # Assumir formato simples por enquanto
-
-            return {
-                "success": True,
-                "message": "Importação de NF por Excel processada",
-                "file_processed": file.filename,
-                "purchase_order_id": purchase_order_id
-            }
-
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Erro ao processar planilha: {str(e)}")
+        """Importa itens de nota fiscal de planilha Excel (pipeline colunar do DataImportService)"""
+        return await DataImportService(self.db).import_invoice_from_excel(
+            file, purchase_order_id, sheet_name=sheet_name, skip_rows=skip_rows
+        )
 
     async def bulk_import_invoices(
         self,
@@ -206,4 +201,242 @@ class SimpleDataImportService:
             "failed_imports": len(errors),
             "results": results,
             "errors": errors
-        }
\ No newline at end of file
+        }
+
+    async def import_contract_invoices(
+        self,
+        contract_id: int,
+        files: List[UploadFile],
+        progress: Optional[Callable[..., None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Importa notas fiscais (XML ou Excel) de um contrato, associando-as à
+        primeira ordem de compra do contrato. `progress` (opcional, usado pelos
+        jobs de ingestão) recebe as contagens à medida que os arquivos avançam.
+        """
+        results = [result async for result in self.iter_contract_invoices(contract_id, files, progress)]
+        return {**self.summarize_contract_invoices(results), "results": results}
+
+    @staticmethod
+    def summarize_contract_invoices(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        imported = sum(1 for r in results if r["success"] and not r.get("skipped"))
+        skipped = sum(1 for r in results if r.get("skipped"))
+        return {
+            "message": f"{imported}/{len(results)} arquivos importados com sucesso",
+            "imported": imported,
+            "skipped": skipped,
+            "failed": len(results) - imported - skipped
+        }
+
+    async def iter_contract_invoices(
+        self,
+        contract_id: int,
+        files: List[UploadFile],
+        progress: Optional[Callable[..., None]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Versão em stream de `import_contract_invoices`: entrega o resultado de
+        cada arquivo assim que ele é gravado, na ordem em que terminam.
+
+        Até `bulk_import_concurrency` arquivos são processados ao mesmo tempo
+        (XML no pool de processos de parsing, Excel em threads); os documentos
+        prontos são gravados juntos, em uma transação por lote, pelo
+        BulkDocumentWriter das invoices (ON CONFLICT em chave_acesso e registro
+        dos hashes). Arquivos já importados são ignorados pelo SHA-256.
+
+        A gravação roda em uma thread, com sessão própria (a sessão do request
+        não é compartilhada entre threads), para que o event loop continue
+        atendendo outras requisições, parseando os próximos arquivos e
+        entregando os resultados do stream enquanto o lote é gravado.
+        """
+        po = self.db.query(PurchaseOrder).filter(
+            PurchaseOrder.contract_id == contract_id
+        ).first()
+
+        counts = {"processados": 0, "falhas": 0, "ignorados": 0}
+
+        def done(result: Dict[str, Any]) -> Dict[str, Any]:
+            if result.get("skipped"):
+                counts["ignorados"] += 1
+            elif result["success"]:
+                counts["processados"] += 1
+            else:
+                counts["falhas"] += 1
+            return result
+
+        if progress:
+            progress(total=len(files))
+
+        # Nomes únicos: são a chave dos documentos no lote e o nome registrado do arquivo
+        keyed: Dict[str, UploadFile] = {}
+        for file in files:
+            key = file.filename or "arquivo"
+            n = 1
+            while key in keyed:
+                n += 1
+                key = f"{file.filename} ({n})"
+            keyed[key] = file
+
+        supported: Dict[str, UploadFile] = {}
+        for key, file in keyed.items():
+            if not (file.filename or '').lower().endswith(('.xml', '.xlsx', '.xls')):
+                yield done(self._file_error(file, "Formato de arquivo não suportado"))
+            elif not po:
+                yield done(self._file_error(file, "Nenhuma ordem de compra encontrada para este contrato"))
+            else:
+                supported[key] = file
+
+        if not supported:
+            if progress:
+                progress(**counts)
+            return
+
+        # Reenvios saem antes do parsing: uma consulta para todos os hashes
+        hashes = {
+            key: await asyncio.to_thread(self._file_sha256, file.file)
+            for key, file in supported.items()
+        }
+        known = IngestDedupService(self.db).known_hashes(hashes.values())
+        seen = set()
+        pending_files: Dict[str, UploadFile] = {}
+        for key, file in supported.items():
+            if hashes[key] in known or hashes[key] in seen:
+                message = "arquivo já importado" if hashes[key] in known else "arquivo repetido no envio"
+                yield done({"file": file.filename, "success": True, "skipped": True, "message": message})
+            else:
+                seen.add(hashes[key])
+                pending_files[key] = file
+
+        processing = InvoiceProcessingService(self.db)
+        writer_db = Session(bind=self.db.get_bind(), autoflush=False)
+        writer = InvoiceProcessingService(writer_db)._invoice_writer('bulk_invoices', hashes)
+        semaphore = asyncio.Semaphore(settings.bulk_import_concurrency)
+
+        async def parse(key: str, file: UploadFile) -> Tuple[Document, List[str]]:
+            async with semaphore:
+                return await self._parse_contract_invoice(processing, key, file, contract_id, po.id)
+
+        write: Optional[asyncio.Future] = None
+        tasks = {asyncio.create_task(parse(key, file)): key for key, file in pending_files.items()}
+        try:
+            while tasks:
+                # Tudo o que terminou enquanto o lote anterior era gravado vai no mesmo lote
+                finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                documents: List[Document] = []
+                row_errors: Dict[str, List[str]] = {}
+                for task in finished:
+                    key = tasks.pop(task)
+                    try:
+                        document, errors = task.result()
+                    except Exception as e:
+                        yield done(self._file_error(keyed[key], str(getattr(e, "detail", None) or e)))
+                        continue
+                    documents.append(document)
+                    row_errors[key] = errors
+
+                for start in range(0, len(documents), writer.chunk_size):
+                    chunk = documents[start:start + writer.chunk_size]
+                    write = asyncio.ensure_future(asyncio.to_thread(writer.write_chunk, chunk))
+                    written = await asyncio.shield(write)
+                    for result in self._chunk_results(written, chunk, keyed, row_errors):
+                        yield done(result)
+
+                if progress:
+                    progress(**counts)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if write is not None and not write.done():
+                # Stream interrompido no meio de um lote: a sessão fecha quando a thread terminar
+                write.add_done_callback(lambda _: writer_db.close())
+            else:
+                writer_db.close()
+
+        if progress:
+            progress(**counts)
+
+    async def _parse_contract_invoice(
+        self,
+        processing: InvoiceProcessingService,
+        key: str,
+        file: UploadFile,
+        contract_id: int,
+        purchase_order_id: int
+    ) -> Tuple[Document, List[str]]:
+        """Converte um arquivo em documento (chave, cabeçalho, itens) e erros de linha"""
+        if file.filename.lower().endswith('.xml'):
+            invoice_data = await run_in_parse_pool(parse_invoice_xml, await file.read())
+            if not invoice_data:
+                raise ValueError("Não foi possível extrair dados do XML")
+            _, header, items = processing._to_document(key, invoice_data, contract_id, file.filename)
+            header['observacoes'] = f"Importado de XML: {file.filename}"
+            errors: List[str] = []
+        else:
+            service = DataImportService(self.db)
+            df, errors = await asyncio.to_thread(service.parse_invoice_excel, file.file, file.filename)
+            items = df.astype(object).where(df.notna(), None).to_dict('records')
+            header = {
+                'contract_id': contract_id,
+                'numero_nf': f"IMPORT_{purchase_order_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                'valor_total': Decimal(str(round(float(df['valor_total'].sum()), 2))),
+                'data_emissao': datetime.now(),
+                'arquivo_original': file.filename,
+                'observacoes': f"Importado de planilha: {file.filename}"
+            }
+
+        header['purchase_order_id'] = purchase_order_id
+        return (key, header, items), errors
+
+    @staticmethod
+    def _chunk_results(
+        result: Dict[str, List],
+        chunk: List[Document],
+        keyed: Dict[str, UploadFile],
+        row_errors: Dict[str, List[str]]
+    ) -> Iterator[Dict[str, Any]]:
+        """Resultado por arquivo de um lote gravado pelo BulkDocumentWriter"""
+        by_key = {key: (header, items) for key, header, items in chunk}
+
+        for key, row in result['written']:
+            header, items = by_key[key]
+            yield {
+                "file": keyed[key].filename,
+                "success": True,
+                "details": {
+                    "invoice_id": row.id,
+                    "numero_nf": header['numero_nf'],
+                    "chave_acesso": header.get('chave_acesso'),
+                    "valor_total": float(header['valor_total']),
+                    "items_imported": len(items),
+                    "errors": row_errors.get(key, [])
+                }
+            }
+
+        for key in result['skipped']:
+            yield {
+                "file": keyed[key].filename,
+                "success": True,
+                "skipped": True,
+                "message": f"chave de acesso {by_key[key][0]['chave_acesso']} já importada"
+            }
+
+        for key, message in result['errors']:
+            yield {
+                "file": keyed[key].filename,
+                "success": False,
+                "error": f"Erro ao gravar no banco: {message}"
+            }
+
+    @staticmethod
+    def _file_error(file: UploadFile, message: str) -> Dict[str, Any]:
+        return {"file": file.filename, "success": False, "error": message}
+
+    @staticmethod
+    def _file_sha256(stream) -> str:
+        """SHA-256 do upload lido em blocos; o ponteiro volta ao início"""
+        digest = hashlib.sha256()
+        stream.seek(0)
+        for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+        stream.seek(0)
+        return digest.hexdigest()
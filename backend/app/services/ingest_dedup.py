@@ -0,0 +1,87 @@
+"""Deduplicação de reenvios por hash SHA-256 do conteúdo bruto dos arquivos"""
+
+import hashlib
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.models.notas_fiscais import ArquivoImportado
+
+
+def sha256_hex(content: bytes) -> str:
+    """Hash SHA-256 (hex) do conteúdo bruto de um arquivo"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class IngestDedupService:
+    """
+    Consulta e registra os hashes dos arquivos já ingeridos.
+
+    A consulta é feita antes do parsing, em lotes de IN por hash; o registro
+    entra na mesma transação que grava os documentos (via before_commit do
+    BulkDocumentWriter), então um arquivo só é marcado como conhecido se o
+    documento correspondente foi gravado ou já existia.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def known_hashes(self, hashes: Iterable[str]) -> Set[str]:
+        """Subconjunto dos hashes informados que já foram ingeridos"""
+        hashes = list(set(hashes))
+        known: Set[str] = set()
+        batch_size = settings.bulk_write_chunk_size
+
+        for start in range(0, len(hashes), batch_size):
+            known.update(
+                sha256 for (sha256,) in self.db.query(ArquivoImportado.sha256).filter(
+                    ArquivoImportado.sha256.in_(hashes[start:start + batch_size])
+                )
+            )
+
+        return known
+
+    def record(self, arquivos: List[Dict[str, Any]]) -> None:
+        """
+        Registra os arquivos (`sha256`, `nome_arquivo`, `origem`,
+        `documento_tipo`, `documento_id`) sem commit; hashes já registrados
+        são ignorados
+        """
+        if not arquivos:
+            return
+
+        statement = self._insert_ignore()
+        if statement is not None:
+            self.db.execute(statement, arquivos)
+            return
+
+        known = self.known_hashes(arquivo["sha256"] for arquivo in arquivos)
+        pending = {arquivo["sha256"]: arquivo for arquivo in arquivos if arquivo["sha256"] not in known}
+        if pending:
+            self.db.execute(insert(ArquivoImportado), list(pending.values()))
+
+    def _insert_ignore(self):
+        dialect = self.db.get_bind().dialect.name
+        upsert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect)
+        if upsert is None:
+            return None
+        return upsert(ArquivoImportado).on_conflict_do_nothing(index_elements=[ArquivoImportado.sha256])
+
+    @staticmethod
+    def entry(
+        sha256: str,
+        nome_arquivo: Optional[str],
+        origem: str,
+        documento_tipo: Optional[str] = None,
+        documento_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Linha de arquivos_importados para `record`"""
+        return {
+            "sha256": sha256,
+            "nome_arquivo": nome_arquivo[:500] if nome_arquivo else None,
+            "origem": origem,
+            "documento_tipo": documento_tipo,
+            "documento_id": documento_id,
+        }
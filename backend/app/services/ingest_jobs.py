@@ -0,0 +1,413 @@
+"""
+Jobs de ingestão em segundo plano.
+
+A submissão grava o job (e os arquivos enviados, em JOB_STORAGE_DIR/<id>) e
+devolve o id na hora; o processamento roda fora da requisição HTTP:
+
+- JOB_RUNNER=local (padrão): tarefas asyncio no próprio processo da API,
+  limitadas a JOB_MAX_CONCURRENCY. Não precisa de Redis; jobs interrompidos
+  por um restart são reenfileirados na subida da aplicação.
+- JOB_RUNNER=celery: os jobs são enviados para workers Celery (app.worker)
+  pelo broker em REDIS_URL. O diretório de jobs precisa ser compartilhado
+  entre API e workers.
+
+O estado e o progresso ficam na tabela ingest_jobs, então `GET /jobs/{id}`
+responde igual qualquer que seja o runner. Cada execução reserva o job com um
+UPDATE condicional e renova `heartbeat_em` enquanto roda, de modo que um job
+entregue a mais de um processo (vários workers da API, reentrega do Celery)
+executa uma vez só.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.datastructures import UploadFile
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.jobs import IngestJob
+
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUS_PENDING = "pendente"
+JOB_STATUS_RUNNING = "processando"
+JOB_STATUS_DONE = "concluido"
+JOB_STATUS_FAILED = "erro"
+
+# Tarefas do runner local (referência forte até terminarem)
+_local_tasks: Set[asyncio.Task] = set()
+_local_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def job_storage_path(job_id: str) -> str:
+    """Diretório com os arquivos enviados para o job"""
+    return os.path.join(settings.job_storage_dir, job_id)
+
+
+class JobProgress:
+    """
+    Callback de progresso repassado aos serviços de importação.
+
+    Recebe contagens absolutas (`total`, `processados`, `falhas`, `ignorados`)
+    e as grava em ingest_jobs com sessão própria, no máximo uma vez a cada
+    JOB_PROGRESS_INTERVAL_SECONDS, sem interferir na transação do serviço.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], job_id: str):
+        self.session_factory = session_factory
+        self.job_id = job_id
+        self.counts: Dict[str, int] = {}
+        self._last_flush = 0.0
+
+    def __call__(
+        self,
+        total: Optional[int] = None,
+        processados: Optional[int] = None,
+        falhas: Optional[int] = None,
+        ignorados: Optional[int] = None
+    ) -> None:
+        updates = {
+            "total_arquivos": total,
+            "processados": processados,
+            "falhas": falhas,
+            "ignorados": ignorados,
+        }
+        self.counts.update({field: value for field, value in updates.items() if value is not None})
+
+        if time.monotonic() - self._last_flush >= settings.job_progress_interval_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.counts:
+            return
+        db = self.session_factory()
+        try:
+            db.query(IngestJob).filter(IngestJob.id == self.job_id).update(self.counts, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self._last_flush = time.monotonic()
+
+
+ProgressCallback = Callable[..., None]
+JobHandler = Callable[[Session, IngestJob, ProgressCallback], Awaitable[Dict[str, Any]]]
+
+
+async def _run_invoice_zip(db: Session, job: IngestJob, progress: ProgressCallback) -> Dict[str, Any]:
+    from app.services.invoice_processing_service import InvoiceProcessingService, ZipLimits
+
+    params = job.parametros
+    # ZIPs do upload em partes têm limites próprios, já conferidos no complete
+    limits = ZipLimits.for_chunked_upload() if params.get("chunked_upload_id") else None
+    with open(os.path.join(job_storage_path(job.id), "upload.zip"), "rb") as f:
+        return await InvoiceProcessingService(db).process_zip_file(
+            file=UploadFile(file=f, filename=params["filename"]),
+            contract_id=params["contract_id"],
+            uploaded_by=job.criado_por,
+            progress=progress,
+            limits=limits
+        )
+
+
+async def _run_onedrive(db: Session, job: IngestJob, progress: ProgressCallback) -> Dict[str, Any]:
+    from app.services.invoice_processing_service import InvoiceProcessingService
+
+    params = job.parametros
+    return await InvoiceProcessingService(db).process_onedrive_folder(
+        folder_url=params["folder_url"],
+        contract_id=params["contract_id"],
+        uploaded_by=job.criado_por,
+        progress=progress
+    )
+
+
+async def _run_bulk_invoices(db: Session, job: IngestJob, progress: ProgressCallback) -> Dict[str, Any]:
+    from app.services.import_service_simple import SimpleDataImportService
+
+    params = job.parametros
+    directory = job_storage_path(job.id)
+    handles = [open(os.path.join(directory, str(index)), "rb") for index in range(len(params["files"]))]
+    try:
+        files = [UploadFile(file=f, filename=filename) for f, filename in zip(handles, params["files"])]
+        return await SimpleDataImportService(db).import_contract_invoices(
+            params["contract_id"], files, progress=progress
+        )
+    finally:
+        for f in handles:
+            f.close()
+
+
+JOB_HANDLERS: Dict[str, JobHandler] = {
+    "invoice_zip": _run_invoice_zip,
+    "onedrive": _run_onedrive,
+    "bulk_invoices": _run_bulk_invoices,
+}
+
+
+def _claim_job(db: Session, job_id: str) -> bool:
+    """
+    Reserva o job com um UPDATE condicional: pendente, ou em processamento com
+    heartbeat vencido (processo encerrado no meio). Só quem alterou a linha
+    executa, então vários processos podem receber o mesmo job sem duplicar
+    """
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=settings.job_stale_after_seconds)
+    claimed = db.query(IngestJob).filter(
+        IngestJob.id == job_id,
+        or_(
+            IngestJob.status == JOB_STATUS_PENDING,
+            and_(
+                IngestJob.status == JOB_STATUS_RUNNING,
+                or_(IngestJob.heartbeat_em.is_(None), IngestJob.heartbeat_em < stale_before)
+            )
+        )
+    ).update({
+        "status": JOB_STATUS_RUNNING,
+        "started_at": now,
+        "heartbeat_em": now
+    }, synchronize_session=False)
+    db.commit()
+    return bool(claimed)
+
+
+def _touch_job(session_factory: Callable[[], Session], job_id: str) -> None:
+    db = session_factory()
+    try:
+        db.query(IngestJob).filter(
+            IngestJob.id == job_id,
+            IngestJob.status == JOB_STATUS_RUNNING
+        ).update({"heartbeat_em": datetime.now(timezone.utc)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _heartbeat(session_factory: Callable[[], Session], job_id: str) -> None:
+    """Renova heartbeat_em enquanto o job roda, para que não seja retomado por outro processo"""
+    while True:
+        await asyncio.sleep(settings.job_heartbeat_seconds)
+        try:
+            await asyncio.to_thread(_touch_job, session_factory, job_id)
+        except SQLAlchemyError:
+            logger.warning("Não foi possível renovar o heartbeat do job %s", job_id, exc_info=True)
+
+
+async def _execute(db: Session, job_id: str, progress: JobProgress) -> None:
+    """Roda o handler do job já reservado e grava resultado ou erro"""
+    job = db.get(IngestJob, job_id)
+    try:
+        result = await JOB_HANDLERS[job.tipo](db, job, progress)
+    except Exception as e:
+        logger.warning("Job %s (%s) terminou com erro", job_id, job.tipo, exc_info=True)
+        db.rollback()
+        progress.flush()
+        job = db.get(IngestJob, job_id)
+        job.status = JOB_STATUS_FAILED
+        job.erro = str(getattr(e, "detail", None) or e)
+    else:
+        progress.flush()
+        job = db.get(IngestJob, job_id)
+        db.refresh(job)
+        job.status = JOB_STATUS_DONE
+        job.resultado = jsonable_encoder(result)
+
+    job.finished_at = datetime.now(timezone.utc)
+    db.commit()
+    shutil.rmtree(job_storage_path(job_id), ignore_errors=True)
+
+
+async def run_job(job_id: str, session_factory: Optional[Callable[[], Session]] = None) -> None:
+    """
+    Executa um job: reserva (ver `_claim_job`), roda o handler com heartbeat e
+    grava resultado ou erro. Um job já reservado por outro processo é ignorado.
+    """
+    session_factory = session_factory or SessionLocal
+    db = session_factory()
+    heartbeat: Optional[asyncio.Task] = None
+    try:
+        if not _claim_job(db, job_id):
+            return
+        heartbeat = asyncio.get_running_loop().create_task(_heartbeat(session_factory, job_id))
+        await _execute(db, job_id, JobProgress(session_factory, job_id))
+    except Exception as e:
+        # Falha fora do handler (ex.: ao gravar o resultado): registra no job, se o banco permitir
+        logger.exception("Erro ao executar job %s", job_id)
+        db.rollback()
+        try:
+            db.query(IngestJob).filter(
+                IngestJob.id == job_id,
+                IngestJob.status == JOB_STATUS_RUNNING
+            ).update({
+                "status": JOB_STATUS_FAILED,
+                "erro": str(e),
+                "finished_at": datetime.now(timezone.utc)
+            }, synchronize_session=False)
+            db.commit()
+        except SQLAlchemyError:
+            logger.exception("Não foi possível registrar o erro do job %s", job_id)
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+        db.close()
+
+
+async def _run_local(job_id: str, delay: float = 0.0) -> None:
+    global _local_semaphore
+    if delay:
+        await asyncio.sleep(delay)
+    if _local_semaphore is None:
+        _local_semaphore = asyncio.Semaphore(settings.job_max_concurrency)
+    async with _local_semaphore:
+        await run_job(job_id)
+
+
+def dispatch_job(job_id: str, delay: float = 0.0) -> None:
+    """Envia o job para o runner configurado (após `delay` segundos)"""
+    if settings.job_runner == "celery":
+        from app.worker import run_ingest_job
+        run_ingest_job.apply_async((job_id,), countdown=delay or None)
+        return
+
+    task = asyncio.get_running_loop().create_task(_run_local(job_id, delay))
+    _local_tasks.add(task)
+    task.add_done_callback(_local_tasks.discard)
+
+
+def resume_local_jobs() -> None:
+    """
+    Reenfileira no runner local os jobs que um restart deixou pela metade.
+    Todos os processos da API fazem isso na subida; a reserva em `run_job`
+    garante uma única execução. Jobs em processamento com heartbeat recente
+    (talvez em outro processo) são tentados de novo quando ele vencer.
+    """
+    if settings.job_runner != "local":
+        return
+
+    db = SessionLocal()
+    try:
+        jobs = db.query(IngestJob.id, IngestJob.status, IngestJob.heartbeat_em).filter(
+            IngestJob.status.in_([JOB_STATUS_PENDING, JOB_STATUS_RUNNING])
+        ).order_by(IngestJob.created_at).all()
+    except SQLAlchemyError:
+        logger.warning("Não foi possível retomar jobs pendentes", exc_info=True)
+        return
+    finally:
+        db.close()
+
+    now = datetime.now(timezone.utc)
+    for job_id, job_status, heartbeat_em in jobs:
+        delay = 0.0
+        if job_status == JOB_STATUS_RUNNING and heartbeat_em is not None:
+            if heartbeat_em.tzinfo is None:
+                heartbeat_em = heartbeat_em.replace(tzinfo=timezone.utc)
+            stale_at = heartbeat_em + timedelta(seconds=settings.job_stale_after_seconds)
+            delay = max((stale_at - now).total_seconds(), 0.0) + 1.0
+        dispatch_job(job_id, delay)
+
+
+class IngestJobService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_job(
+        self,
+        tipo: str,
+        parametros: Dict[str, Any],
+        criado_por: Optional[int],
+        files: Optional[Dict[str, Any]] = None,
+        commit: bool = True
+    ) -> IngestJob:
+        """
+        Cria o job e grava os arquivos enviados (`nome no diretório -> stream`)
+        no diretório do job; o despacho fica para `submit`. Com `commit=False`
+        o job entra na transação do chamador, que o despacha após o commit.
+        """
+        if tipo not in JOB_HANDLERS:
+            raise ValueError(f"Tipo de job desconhecido: {tipo}")
+
+        job = IngestJob(
+            id=str(uuid.uuid4()),
+            tipo=tipo,
+            status=JOB_STATUS_PENDING,
+            parametros=parametros,
+            criado_por=criado_por
+        )
+
+        if files:
+            directory = job_storage_path(job.id)
+            os.makedirs(directory, exist_ok=True)
+            for name, stream in files.items():
+                with open(os.path.join(directory, name), "wb") as f:
+                    shutil.copyfileobj(stream, f)
+
+        self.db.add(job)
+        if commit:
+            self.db.commit()
+            self.db.refresh(job)
+        else:
+            self.db.flush()
+        return job
+
+    async def submit(
+        self,
+        tipo: str,
+        parametros: Dict[str, Any],
+        criado_por: Optional[int],
+        files: Optional[Dict[str, Any]] = None
+    ) -> IngestJob:
+        """Cria o job (arquivos gravados fora do event loop) e o despacha"""
+        job = await asyncio.to_thread(self.create_job, tipo, parametros, criado_por, files)
+        dispatch_job(job.id)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[IngestJob]:
+        return self.db.query(IngestJob).filter(IngestJob.id == job_id).first()
+
+    def list_jobs(self, criado_por: Optional[int] = None, limit: int = 50) -> List[IngestJob]:
+        query = self.db.query(IngestJob)
+        if criado_por is not None:
+            query = query.filter(IngestJob.criado_por == criado_por)
+        return query.order_by(IngestJob.created_at.desc()).limit(limit).all()
+
+    @staticmethod
+    def to_response(job: IngestJob) -> Dict[str, Any]:
+        """Estado do job com arquivos restantes e vazão (arquivos/s desde o início)"""
+        done = (job.processados or 0) + (job.falhas or 0) + (job.ignorados or 0)
+        restantes = max(job.total_arquivos - done, 0) if job.total_arquivos is not None else None
+
+        throughput = None
+        if job.started_at:
+            started_at = job.started_at if job.started_at.tzinfo else job.started_at.replace(tzinfo=timezone.utc)
+            finished_at = job.finished_at or datetime.now(timezone.utc)
+            if finished_at.tzinfo is None:
+                finished_at = finished_at.replace(tzinfo=timezone.utc)
+            elapsed = (finished_at - started_at).total_seconds()
+            throughput = round(done / elapsed, 2) if elapsed > 0 else None
+
+        return {
+            "id": job.id,
+            "tipo": job.tipo,
+            "status": job.status,
+            "total_arquivos": job.total_arquivos,
+            "processados": job.processados or 0,
+            "falhas": job.falhas or 0,
+            "ignorados": job.ignorados or 0,
+            "restantes": restantes,
+            "arquivos_por_segundo": throughput,
+            "resultado": job.resultado,
+            "erro": job.erro,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
@@ -1,17 +1,50 @@
 import zipfile
 import os
-import tempfile
-import requests
-import xml.etree.ElementTree as ET
-from typing import Dict, List, Any, Optional
-from decimal import Decimal
-from datetime import datetime
-from fastapi import UploadFile
+from typing import Callable, Dict, Iterator, List, Any, NamedTuple, Optional, Tuple
+from fastapi import UploadFile, HTTPException, status
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models.purchases import Invoice, InvoiceItem
 from app.schemas.invoices import InvoiceResponse
-import re
-import io
+from app.services.bulk_writer import BulkDocumentWriter, Document
+from app.services.dashboard_cache import TAG_PURCHASES, invalidate_dashboards
+from app.services.ingest_dedup import IngestDedupService, sha256_hex
+from app.services.nfe_parsing import (
+    DanfeNeedsXml, parse_in_pool, parse_invoice_pdf, parse_invoice_xml
+)
+from app.services.onedrive import OneDriveError, get_folder_fetcher
+
+
+HASH_BLOCK_SIZE = 1024 * 1024
+# Arquivos baixados do OneDrive que entram juntos em deduplicação, parsing e gravação
+ONEDRIVE_BATCH_FILES = 64
+# Membros de ZIP lidos antes de cada consulta de hashes já importados
+ZIP_DEDUP_BATCH_FILES = 64
+
+
+class ZipLimits(NamedTuple):
+    """Limites contra ZIP bombs aplicados antes de descompactar"""
+    max_members: int
+    max_member_mb: int
+    max_uncompressed_mb: int
+
+    @classmethod
+    def for_upload(cls) -> "ZipLimits":
+        """ZIPs enviados em uma requisição (até INVOICE_ZIP_MAX_SIZE_MB)"""
+        return cls(
+            settings.invoice_zip_max_members,
+            settings.invoice_zip_max_member_mb,
+            settings.invoice_zip_max_uncompressed_mb
+        )
+
+    @classmethod
+    def for_chunked_upload(cls) -> "ZipLimits":
+        """ZIPs montados pelo upload em partes (até CHUNKED_UPLOAD_MAX_SIZE_MB)"""
+        return cls(
+            settings.chunked_upload_zip_max_members,
+            settings.invoice_zip_max_member_mb,
+            settings.chunked_upload_zip_max_uncompressed_mb
+        )
 
 
 class InvoiceProcessingService:
@@ -22,334 +55,368 @@ class InvoiceProcessingService:
         self,
         file: UploadFile,
         contract_id: int,
-        uploaded_by: int
+        uploaded_by: int,
+        progress: Optional[Callable[..., None]] = None,
+        limits: Optional[ZipLimits] = None
     ) -> Dict[str, Any]:
         """
         Processa arquivo ZIP contendo múltiplas notas fiscais.
+
+        O ZIP é lido direto do upload em spool (sem copiar para memória nem
+        extrair para disco) e os membros são lidos em lotes e parseados; o pico
+        de memória fica limitado a um lote (ZIP_DEDUP_BATCH_FILES membros).
+
+        Cada membro é descompactado uma única vez: o SHA-256 é calculado sobre
+        os mesmos bytes que vão para o parser e comparado, em lotes, com os
+        arquivos já importados; os conhecidos (e repetidos dentro do ZIP) são
+        pulados e reportados em `skipped`, assim como as NFs cuja chave de
+        acesso já existe.
+
+        PDFs (DANFE) passam pela extração da camada de texto no mesmo pool;
+        os que não permitem extração confiável vão para `needs_xml`.
+
+        `progress` (opcional, usado pelos jobs de ingestão) recebe as contagens
+        total/processados/falhas/ignorados à medida que o ZIP avança.
+        `limits` substitui os limites de ZIP do upload comum (ZipLimits.for_upload).
         """
-        processed_count = 0
-        failed_count = 0
         invoices = []
         errors = []
+        skipped = []
+        needs_xml = []
+        hashes: Dict[str, str] = {}
+        writer = self._invoice_writer('invoice_zip', hashes)
+        pending = []
+
+        def report() -> None:
+            if progress:
+                progress(processados=len(invoices), falhas=len(errors) + len(needs_xml), ignorados=len(skipped))
+
+        def add_document(member_name: str, invoice_data: Optional[Dict[str, Any]]) -> None:
+            nonlocal pending
+            if not invoice_data:
+                errors.append(f"Não foi possível extrair dados de {os.path.basename(member_name)}")
+                return
+
+            pending.append(self._to_document(member_name, invoice_data, contract_id, f"{file.filename}/{member_name}"))
+            if len(pending) >= writer.chunk_size:
+                self._write_documents(writer, pending, invoices, errors, skipped)
+                pending = []
+                report()
 
-        # Criar diretório temporário
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Salvar ZIP temporariamente
-            zip_path = os.path.join(temp_dir, file.filename)
-            content = await file.read()
-
-            with open(zip_path, 'wb') as f:
-                f.write(content)
-
-            # Extrair ZIP
-            try:
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-
-                # Processar cada arquivo extraído
-                for root, dirs, files in os.walk(temp_dir):
-                    for filename in files:
-                        if filename.lower().endswith(('.xml', '.pdf')):
-                            file_path = os.path.join(root, filename)
-
-                            try:
-                                invoice_data = await self._extract_invoice_data(file_path, filename)
-                                if invoice_data:
-                                    # Criar invoice no banco
-                                    invoice = await self._create_invoice(
-                                        invoice_data,
-                                        contract_id,
-                                        file_path
-                                    )
-                                    invoices.append(invoice)
-                                    processed_count += 1
-                                else:
-                                    errors.append(f"Não foi possível extrair dados de {filename}")
-                                    failed_count += 1
-
-                            except Exception as e:
-                                errors.append(f"Erro ao processar {filename}: {str(e)}")
-                                failed_count += 1
-
-            except zipfile.BadZipFile:
-                raise Exception("Arquivo ZIP corrompido ou inválido")
+        try:
+            with zipfile.ZipFile(file.file, 'r') as zip_ref:
+                all_members = self._check_zip_limits(zip_ref, limits)
+                if progress:
+                    progress(total=len(all_members))
+                xml_members = [info for info in all_members if info.filename.lower().endswith('.xml')]
+                pdf_members = [info for info in all_members if info.filename.lower().endswith('.pdf')]
+                seen: set = set()
+
+                # Os XMLs são lidos sob demanda e parseados no pool de processos;
+                # as invoices são gravadas aqui, por um único escritor, em lotes
+                documents = self._new_members(zip_ref, xml_members, hashes, seen, skipped)
+                async for info, invoice_data in parse_in_pool(parse_invoice_xml, documents):
+                    if isinstance(invoice_data, Exception):
+                        errors.append(f"Erro ao processar {os.path.basename(info.filename)}: {str(invoice_data)}")
+                        continue
+                    add_document(info.filename, invoice_data)
+
+                documents = self._new_members(zip_ref, pdf_members, hashes, seen, skipped)
+                async for info, invoice_data in parse_in_pool(parse_invoice_pdf, documents):
+                    if isinstance(invoice_data, DanfeNeedsXml):
+                        needs_xml.append(f"{os.path.basename(info.filename)}: {str(invoice_data)}")
+                        continue
+                    if isinstance(invoice_data, Exception):
+                        errors.append(f"Erro ao processar {os.path.basename(info.filename)}: {str(invoice_data)}")
+                        continue
+                    add_document(info.filename, invoice_data)
+
+                if pending:
+                    self._write_documents(writer, pending, invoices, errors, skipped)
+                report()
+
+        except zipfile.BadZipFile:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Arquivo ZIP corrompido ou inválido"
+            )
 
         return {
-            'processed_count': processed_count,
-            'failed_count': failed_count,
+            'processed_count': len(invoices),
+            'failed_count': len(errors),
+            'skipped_count': len(skipped),
             'invoices': invoices,
-            'errors': errors
+            'errors': errors,
+            'skipped': skipped,
+            'needs_xml_count': len(needs_xml),
+            'needs_xml': needs_xml
         }
 
+    @staticmethod
+    def check_zip_upload(file: UploadFile) -> None:
+        """Valida extensão e tamanho do ZIP enviado sem carregá-lo em memória (o upload fica em spool)"""
+        if not file.filename.lower().endswith('.zip'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Arquivo deve ser do tipo ZIP"
+            )
+
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
+        file.file.seek(0)
+
+        if file_size > settings.invoice_zip_max_size_mb * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Arquivo ZIP muito grande. Máximo permitido: {settings.invoice_zip_max_size_mb}MB"
+            )
+
+    def _new_members(
+        self,
+        zip_ref: zipfile.ZipFile,
+        members: List[zipfile.ZipInfo],
+        hashes: Dict[str, str],
+        seen: set,
+        skipped: List[str]
+    ) -> Iterator[Tuple[zipfile.ZipInfo, bytes]]:
+        """
+        Lê cada membro uma vez e entrega `(membro, conteúdo)` dos que ainda
+        não foram importados nem apareceram antes no ZIP. Os hashes são
+        consultados em lotes de ZIP_DEDUP_BATCH_FILES membros; `hashes`
+        (nome do membro -> hash) é preenchido para o registro após a gravação.
+        """
+        dedup = IngestDedupService(self.db)
+        for start in range(0, len(members), ZIP_DEDUP_BATCH_FILES):
+            batch = [(info, zip_ref.read(info)) for info in members[start:start + ZIP_DEDUP_BATCH_FILES]]
+            for info, content in batch:
+                hashes[info.filename] = sha256_hex(content)
+            known = dedup.known_hashes(hashes[info.filename] for info, _ in batch)
+
+            for info, content in batch:
+                sha256 = hashes[info.filename]
+                if sha256 in known:
+                    skipped.append(f"{os.path.basename(info.filename)}: arquivo já importado")
+                elif sha256 in seen:
+                    skipped.append(f"{os.path.basename(info.filename)}: arquivo repetido no ZIP")
+                else:
+                    seen.add(sha256)
+                    yield info, content
+
+    @staticmethod
+    def _check_zip_limits(zip_ref: zipfile.ZipFile, limits: Optional[ZipLimits] = None) -> List[zipfile.ZipInfo]:
+        """
+        Seleciona os membros XML/PDF e aplica os limites contra ZIP bombs
+        (quantidade de membros, tamanho descompactado por membro e total)
+        antes de descompactar qualquer byte; só lê o diretório central do ZIP
+        """
+        limits = limits or ZipLimits.for_upload()
+        members = [
+            info for info in zip_ref.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith('__MACOSX/')
+            and info.filename.lower().endswith(('.xml', '.pdf'))
+        ]
+
+        if len(members) > limits.max_members:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"ZIP com muitos arquivos ({len(members)}). Máximo permitido: {limits.max_members}"
+            )
+
+        max_member = limits.max_member_mb * 1024 * 1024
+        oversized = next((info for info in members if info.file_size > max_member), None)
+        if oversized:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Arquivo {oversized.filename} excede {limits.max_member_mb}MB descompactado"
+            )
+
+        total_size = sum(info.file_size for info in members)
+        if total_size > limits.max_uncompressed_mb * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Conteúdo descompactado do ZIP excede {limits.max_uncompressed_mb}MB"
+            )
+
+        return members
+
     async def process_onedrive_folder(
         self,
         folder_url: str,
         contract_id: int,
-        uploaded_by: int
+        uploaded_by: int,
+        progress: Optional[Callable[..., None]] = None
     ) -> Dict[str, Any]:
         """
         Processa pasta do OneDrive contendo notas fiscais.
+
+        Os arquivos XML/PDF são baixados em paralelo (app.services.onedrive) e
+        entram no pipeline em lotes à medida que chegam: hash e deduplicação,
+        parsing no pool de processos e gravação em lote, enquanto os próximos
+        downloads continuam.
         """
-        processed_count = 0
-        failed_count = 0
         invoices = []
         errors = []
-
-        try:
-            # Baixar arquivos da pasta do OneDrive
-            downloaded_files = await self._download_onedrive_files(folder_url)
-
-            for file_info in downloaded_files:
-                try:
-                    invoice_data = await self._extract_invoice_data(
-                        file_info['content'],
-                        file_info['filename'],
-                        is_content=True
-                    )
-
-                    if invoice_data:
-                        # Criar invoice no banco
-                        invoice = await self._create_invoice(
-                            invoice_data,
-                            contract_id,
-                            folder_url  # URL original como referência
-                        )
-                        invoices.append(invoice)
-                        processed_count += 1
+        skipped = []
+        needs_xml = []
+        hashes: Dict[str, str] = {}
+        seen: set = set()
+        writer = self._invoice_writer('onedrive', hashes)
+        listed = 0
+
+        def report() -> None:
+            if progress:
+                progress(total=listed, processados=len(invoices), falhas=len(errors) + len(needs_xml), ignorados=len(skipped))
+
+        async def ingest(batch: List[Tuple[str, bytes]]) -> None:
+            for key, content in batch:
+                hashes[key] = sha256_hex(content)
+            known = IngestDedupService(self.db).known_hashes(hashes[key] for key, _ in batch)
+
+            xml_files, pdf_files = [], []
+            for key, content in batch:
+                if hashes[key] in known or hashes[key] in seen:
+                    reason = "arquivo já importado" if hashes[key] in known else "arquivo repetido na pasta"
+                    skipped.append(f"{os.path.basename(key)}: {reason}")
+                    continue
+                seen.add(hashes[key])
+                (xml_files if key.lower().endswith('.xml') else pdf_files).append((key, content))
+
+            documents = []
+            for parse, files in ((parse_invoice_xml, xml_files), (parse_invoice_pdf, pdf_files)):
+                async for key, invoice_data in parse_in_pool(parse, files):
+                    filename = os.path.basename(key)
+                    if isinstance(invoice_data, DanfeNeedsXml):
+                        needs_xml.append(f"{filename}: {str(invoice_data)}")
+                    elif isinstance(invoice_data, Exception):
+                        errors.append(f"Erro ao processar {filename}: {str(invoice_data)}")
+                    elif not invoice_data:
+                        errors.append(f"Não foi possível extrair dados de {filename}")
                     else:
-                        errors.append(f"Não foi possível extrair dados de {file_info['filename']}")
-                        failed_count += 1
+                        # URL original como referência
+                        documents.append(self._to_document(key, invoice_data, contract_id, folder_url))
 
-                except Exception as e:
-                    errors.append(f"Erro ao processar {file_info['filename']}: {str(e)}")
-                    failed_count += 1
+            if documents:
+                self._write_documents(writer, documents, invoices, errors, skipped)
+            report()
 
-        except Exception as e:
+        batch: List[Tuple[str, bytes]] = []
+        try:
+            async with get_folder_fetcher() as fetcher:
+                async for remote, content in fetcher.iter_downloads(folder_url, ('.xml', '.pdf')):
+                    listed += 1
+                    if isinstance(content, Exception):
+                        errors.append(f"Erro ao baixar {remote.name}: {str(content)}")
+                        continue
+
+                    # Chave única por item do drive: nomes iguais em pastas diferentes não colidem
+                    batch.append((f"{remote.id}/{remote.name}", content))
+                    if len(batch) >= min(ONEDRIVE_BATCH_FILES, writer.chunk_size):
+                        await ingest(batch)
+                        batch = []
+
+                if batch:
+                    await ingest(batch)
+
+        except OneDriveError as e:
             raise Exception(f"Erro ao acessar pasta do OneDrive: {str(e)}")
 
+        report()
+
         return {
-            'processed_count': processed_count,
-            'failed_count': failed_count,
+            'processed_count': len(invoices),
+            'failed_count': len(errors),
+            'skipped_count': len(skipped),
             'invoices': invoices,
-            'errors': errors
+            'errors': errors,
+            'skipped': skipped,
+            'needs_xml_count': len(needs_xml),
+            'needs_xml': needs_xml
         }
 
-    async def _extract_invoice_data(
-        self,
-        file_path_or_content: str,
-        filename: str,
-        is_content: bool = False
-    ) -> Optional[Dict[str, Any]]:
+    def _invoice_writer(self, origem: str, hashes: Dict[str, str]) -> BulkDocumentWriter:
         """
-        Extrai dados da nota fiscal de arquivo XML ou PDF.
-        """
-        try:
-            if filename.lower().endswith('.xml'):
-                return await self._extract_from_xml(file_path_or_content, is_content)
-            elif filename.lower().endswith('.pdf'):
-                return await self._extract_from_pdf(file_path_or_content, is_content)
-            else:
-                return None
-
-        except Exception as e:
-            print(f"Erro ao extrair dados de {filename}: {str(e)}")
-            return None
-
-    async def _extract_from_xml(self, file_path_or_content: str, is_content: bool = False) -> Dict[str, Any]:
+        Escritor de invoices com ON CONFLICT em chave_acesso; os hashes dos
+        arquivos gravados ou já existentes (pela chave) são registrados na
+        mesma transação de cada lote, e os dashboards de compras são
+        invalidados depois de cada lote com invoices novas
         """
-        Extrai dados de arquivo XML de NF-e.
-        """
-        try:
-            if is_content:
-                root = ET.fromstring(file_path_or_content)
-            else:
-                tree = ET.parse(file_path_or_content)
-                root = tree.getroot()
-
-            # Namespaces comuns de NF-e
-            ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-
-            # Extrair dados básicos da NF
-            ide_elem = root.find('.//nfe:ide', ns)
-            emit_elem = root.find('.//nfe:emit', ns)
-            total_elem = root.find('.//nfe:total/nfe:ICMSTot', ns)
-
-            if not all([ide_elem, emit_elem, total_elem]):
-                # Tentar sem namespace (alguns XMLs não usam)
-                ide_elem = root.find('.//ide')
-                emit_elem = root.find('.//emit')
-                total_elem = root.find('.//total/ICMSTot')
-
-            numero_nf = ide_elem.find('nNF').text if ide_elem.find('nNF') is not None else None
-            data_emissao_str = ide_elem.find('dhEmi').text if ide_elem.find('dhEmi') is not None else None
-
-            # Parse da data
-            data_emissao = None
-            if data_emissao_str:
-                try:
-                    data_emissao = datetime.fromisoformat(data_emissao_str.replace('Z', '+00:00'))
-                except:
-                    # Tentar outros formatos de data
-                    data_emissao = datetime.now()
-
-            fornecedor = None
-            if emit_elem.find('xNome') is not None:
-                fornecedor = emit_elem.find('xNome').text
-
-            valor_total = Decimal('0')
-            if total_elem.find('vNF') is not None:
-                valor_total = Decimal(total_elem.find('vNF').text)
-
-            # Extrair itens
-            items = []
-            det_elems = root.findall('.//nfe:det', ns) or root.findall('.//det')
-
-            for det in det_elems:
-                prod = det.find('.//nfe:prod', ns) or det.find('.//prod')
-                if prod is not None:
-                    item_data = {
-                        'descricao': prod.find('xProd').text if prod.find('xProd') is not None else 'Item não identificado',
-                        'quantidade': Decimal(prod.find('qCom').text) if prod.find('qCom') is not None else None,
-                        'valor_unitario': Decimal(prod.find('vUnCom').text) if prod.find('vUnCom') is not None else None,
-                        'valor_total': Decimal(prod.find('vProd').text) if prod.find('vProd') is not None else Decimal('0'),
-                        'unidade': prod.find('uCom').text if prod.find('uCom') is not None else None,
-                        'centro_custo': 'Não Classificado'  # Will be classified later
-                    }
-                    items.append(item_data)
-
-            return {
-                'numero_nf': numero_nf,
-                'fornecedor': fornecedor,
-                'valor_total': valor_total,
-                'data_emissao': data_emissao or datetime.now(),
-                'items': items
-            }
-
-        except Exception as e:
-            print(f"Erro ao processar XML: {str(e)}")
-            return None
-
-    async def _extract_from_pdf(self, file_path_or_content: str, is_content: bool = False) -> Dict[str, Any]:
-        """
-        Extrai dados de arquivo PDF de nota fiscal.
-        Por enquanto, implementação básica usando regex.
-        """
-        try:
-            # Esta é uma implementação simplificada
-            # Em produção, seria necessário usar uma biblioteca como PyPDF2 ou pdfplumber
-
-            # Por enquanto, retornar dados mock para PDFs
-            return {
-                'numero_nf': f"PDF-{datetime.now().strftime('%Y%m%d%H%M%S')}",
-                'fornecedor': 'Fornecedor PDF',
-                'valor_total': Decimal('1000.00'),
-                'data_emissao': datetime.now(),
-                'items': [{
-                    'descricao': 'Item extraído de PDF',
-                    'quantidade': Decimal('1'),
-                    'valor_unitario': Decimal('1000.00'),
-                    'valor_total': Decimal('1000.00'),
-                    'unidade': 'UN',
-                    'centro_custo': 'Não Classificado'
-                }]
-            }
+        dedup = IngestDedupService(self.db)
 
-        except Exception as e:
-            print(f"Erro ao processar PDF: {str(e)}")
-            return None
+        def record_hashes(result: Dict[str, List]) -> None:
+            dedup.record(
+                [dedup.entry(hashes[key], key, origem, 'invoice', row.id) for key, row in result['written'] if key in hashes]
+                + [dedup.entry(hashes[key], key, origem) for key in result['skipped'] if key in hashes]
+            )
 
-    async def _download_onedrive_files(self, folder_url: str) -> List[Dict[str, Any]]:
-        """
-        Baixa arquivos de uma pasta do OneDrive.
-        Esta é uma implementação simplificada.
-        """
-        try:
-            # Esta implementação seria específica para a API do OneDrive
-            # Por enquanto, retornamos dados mock
-
-            # Em produção, seria necessário:
-            # 1. Autenticar com Microsoft Graph API
-            # 2. Extrair share token da URL
-            # 3. Listar arquivos da pasta
-            # 4. Baixar cada arquivo
-
-            # Mock data para demonstração
-            return [
-                {
-                    'filename': 'mock_nf_001.xml',
-                    'content': '''<?xml version="1.0"?>
-                    <NFe>
-                        <infNFe>
-                            <ide><nNF>12345</nNF><dhEmi>2024-01-15T10:00:00</dhEmi></ide>
-                            <emit><xNome>Fornecedor Teste</xNome></emit>
-                            <total><ICMSTot><vNF>2500.00</vNF></ICMSTot></total>
-                            <det><prod><xProd>Produto Teste</xProd><qCom>10</qCom><vUnCom>250.00</vUnCom><vProd>2500.00</vProd><uCom>UN</uCom></prod></det>
-                        </infNFe>
-                    </NFe>'''
-                }
-            ]
-
-        except Exception as e:
-            raise Exception(f"Erro ao baixar arquivos do OneDrive: {str(e)}")
-
-    async def _create_invoice(
+        return BulkDocumentWriter(
+            self.db,
+            Invoice,
+            InvoiceItem,
+            'invoice_id',
+            returning=(Invoice.id, Invoice.created_at),
+            before_commit=record_hashes,
+            after_commit=lambda result: invalidate_dashboards(TAG_PURCHASES),
+            conflict_column=Invoice.chave_acesso
+        )
+
+    def _to_document(
         self,
+        key: str,
         invoice_data: Dict[str, Any],
         contract_id: int,
         arquivo_original: str
-    ) -> InvoiceResponse:
-        """
-        Cria uma nova invoice no banco de dados.
-        """
-        try:
-            # Criar invoice
-            invoice = Invoice(
-                contract_id=contract_id,
-                numero_nf=invoice_data['numero_nf'],
-                fornecedor=invoice_data['fornecedor'],
-                valor_total=invoice_data['valor_total'],
-                data_emissao=invoice_data['data_emissao'],
-                arquivo_original=arquivo_original
-            )
-
-            self.db.add(invoice)
-            self.db.flush()  # Para obter o ID da invoice
-
-            # Criar itens
-            for item_data in invoice_data.get('items', []):
-                invoice_item = InvoiceItem(
-                    invoice_id=invoice.id,
-                    descricao=item_data['descricao'],
-                    centro_custo=self._classify_cost_center(item_data['descricao']),
-                    unidade=item_data.get('unidade'),
-                    quantidade=item_data.get('quantidade'),
-                    valor_unitario=item_data.get('valor_unitario'),
-                    valor_total=item_data['valor_total']
-                )
-                self.db.add(invoice_item)
-
-            self.db.commit()
-            self.db.refresh(invoice)
-
-            return InvoiceResponse(
-                id=invoice.id,
-                contract_id=invoice.contract_id,
-                purchase_order_id=invoice.purchase_order_id,
-                numero_nf=invoice.numero_nf,
-                fornecedor=invoice.fornecedor,
-                valor_total=invoice.valor_total,
-                data_emissao=invoice.data_emissao,
-                data_vencimento=invoice.data_vencimento,
-                data_pagamento=invoice.data_pagamento,
-                arquivo_original=invoice.arquivo_original,
-                observacoes=invoice.observacoes,
-                created_at=invoice.created_at,
-                items_count=len(invoice.items)
-            )
+    ) -> Document:
+        """Converte os dados extraídos em (chave, cabeçalho, itens) para o BulkDocumentWriter"""
+        header = {
+            'contract_id': contract_id,
+            'numero_nf': invoice_data['numero_nf'],
+            'chave_acesso': invoice_data.get('chave_acesso'),
+            'fornecedor': invoice_data['fornecedor'],
+            'valor_total': invoice_data['valor_total'],
+            'data_emissao': invoice_data['data_emissao'],
+            'arquivo_original': arquivo_original
+        }
+        items = [
+            {
+                'descricao': item_data['descricao'],
+                'centro_custo': self._classify_cost_center(item_data['descricao']),
+                'unidade': item_data.get('unidade'),
+                'quantidade': item_data.get('quantidade'),
+                'valor_unitario': item_data.get('valor_unitario'),
+                'valor_total': item_data['valor_total']
+            }
+            for item_data in invoice_data.get('items', [])
+        ]
+        return key, header, items
 
-        except Exception as e:
-            self.db.rollback()
-            raise Exception(f"Erro ao criar invoice no banco: {str(e)}")
+    def _write_documents(
+        self,
+        writer: BulkDocumentWriter,
+        documents: List[Document],
+        invoices: List[InvoiceResponse],
+        errors: List[str],
+        skipped: List[str]
+    ) -> None:
+        """Grava um lote de invoices (uma transação) e acumula respostas, erros e ignoradas"""
+        result = writer.write_chunk(documents)
+        by_key = {key: (header, items) for key, header, items in documents}
+
+        for key, row in result['written']:
+            header, items = by_key[key]
+            invoices.append(InvoiceResponse(
+                id=row.id,
+                created_at=row.created_at,
+                items_count=len(items),
+                **header
+            ))
+
+        for key in result['skipped']:
+            header, _ = by_key[key]
+            skipped.append(f"{os.path.basename(key)}: chave de acesso {header['chave_acesso']} já importada")
+
+        for key, message in result['errors']:
+            errors.append(f"Erro ao gravar {os.path.basename(key)} no banco: {message}")
 
     def _classify_cost_center(self, description: str) -> str:
         """
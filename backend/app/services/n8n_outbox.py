@@ -0,0 +1,329 @@
+"""
+Envio dos webhooks do n8n por outbox.
+
+O endpoint de processamento de pastas só grava o ProcessamentoLog e a entrada
+em webhook_outbox (uma transação para todo o lote) e responde na hora. O
+N8nDispatcher, iniciado com a aplicação, drena a fila em segundo plano:
+
+- um único httpx.AsyncClient (keep-alive) com no máximo N8N_MAX_CONCURRENCY
+  chamadas em andamento;
+- novas tentativas com backoff exponencial em erros de rede, timeout, 429 e
+  5xx, até N8N_MAX_ATTEMPTS; outros 4xx encerram a entrada como erro;
+- o resultado de cada envio atualiza o ProcessamentoLog correspondente.
+
+As entradas são reservadas com um UPDATE condicional (status + horário), então
+vários processos da API podem drenar a mesma fila sem envio duplicado; uma
+reserva abandonada (processo encerrado no meio do envio) volta a ficar
+disponível quando `proxima_tentativa_em` vence. Cada rodada reserva só o que
+vai enviar de imediato e o envio tem tempo total limitado, então nenhum envio
+vivo sobrevive à própria reserva; o resultado só é gravado se a reserva
+(status + número da tentativa) ainda for a do envio.
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import httpx
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.notas_fiscais import ProcessamentoLog, WebhookOutbox
+from app.models.users import User
+
+
+OUTBOX_PENDING = "pendente"
+OUTBOX_SENDING = "enviando"
+OUTBOX_SENT = "enviado"
+OUTBOX_FAILED = "erro"
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def webhook_url(folder_name: str) -> str:
+    return settings.n8n_webhook_url.format(nome_pasta=quote(folder_name, safe=""))
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class N8nOutboxService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def enqueue_folders(self, folder_names: List[str], user: User) -> List[Tuple[ProcessamentoLog, WebhookOutbox]]:
+        """Cria log e entrada na fila para cada pasta (nomes repetidos entram uma vez), em um único commit"""
+        now = _now()
+        requested_at = datetime.now()
+        logs = [
+            ProcessamentoLog(
+                pasta_nome=folder_name,
+                webhook_chamado_em=requested_at,
+                status="iniciado",
+                mensagem="Webhook n8n aguardando envio"
+            )
+            for folder_name in dict.fromkeys(folder_names)
+        ]
+        self.db.add_all(logs)
+        # Ids dos logs no payload, para o n8n devolvê-los em POST /nf/ingest-batch
+        self.db.flush()
+
+        entries = []
+        for processing_log in logs:
+            folder_name = processing_log.pasta_nome
+            entry = WebhookOutbox(
+                processamento_log=processing_log,
+                url=webhook_url(folder_name),
+                payload={
+                    "nome_pasta": folder_name,
+                    "processamento_log_id": processing_log.id,
+                    "user_id": user.id,
+                    "user_name": user.full_name,
+                    "timestamp": requested_at.isoformat()
+                },
+                status=OUTBOX_PENDING,
+                tentativas=0,
+                proxima_tentativa_em=now
+            )
+            self.db.add(entry)
+            entries.append((processing_log, entry))
+
+        self.db.commit()
+        for processing_log, entry in entries:
+            self.db.refresh(processing_log)
+            self.db.refresh(entry)
+        return entries
+
+    def claim_due(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        Reserva até `limit` entradas vencidas (pendentes ou com reserva expirada)
+        e devolve os dados para o envio; a reserva dura o timeout do envio com
+        folga, e o número da tentativa identifica a reserva em `record_result`
+        """
+        now = _now()
+        lease_until = now + timedelta(seconds=settings.n8n_timeout_seconds * 2 + 30)
+        due = self.db.query(WebhookOutbox.id, WebhookOutbox.url, WebhookOutbox.payload, WebhookOutbox.tentativas).filter(
+            WebhookOutbox.status.in_([OUTBOX_PENDING, OUTBOX_SENDING]),
+            WebhookOutbox.proxima_tentativa_em <= now
+        ).order_by(WebhookOutbox.proxima_tentativa_em).limit(limit).all()
+
+        claimed = []
+        for entry_id, url, payload, tentativas in due:
+            updated = self.db.query(WebhookOutbox).filter(
+                WebhookOutbox.id == entry_id,
+                WebhookOutbox.status.in_([OUTBOX_PENDING, OUTBOX_SENDING]),
+                WebhookOutbox.proxima_tentativa_em <= now
+            ).update({
+                "status": OUTBOX_SENDING,
+                "tentativas": tentativas + 1,
+                "proxima_tentativa_em": lease_until
+            }, synchronize_session=False)
+            if updated:
+                claimed.append({"id": entry_id, "url": url, "payload": payload, "tentativa": tentativas + 1})
+
+        self.db.commit()
+        return claimed
+
+    def seconds_until_next(self) -> Optional[float]:
+        """Tempo até a próxima entrada vencer (nova tentativa ou reserva expirada); None com a fila vazia"""
+        next_at = self.db.query(func.min(WebhookOutbox.proxima_tentativa_em)).filter(
+            WebhookOutbox.status.in_([OUTBOX_PENDING, OUTBOX_SENDING])
+        ).scalar()
+        if next_at is None:
+            return None
+        if next_at.tzinfo is None:
+            next_at = next_at.replace(tzinfo=timezone.utc)
+        return max((next_at - _now()).total_seconds(), 0.0)
+
+    def record_result(
+        self,
+        entry_id: int,
+        attempt: int,
+        status_code: Optional[int] = None,
+        error: Optional[str] = None,
+        retryable: bool = False
+    ) -> bool:
+        """
+        Grava o resultado do envio na fila e no ProcessamentoLog (sem sobrescrever
+        status vindos do n8n). O UPDATE só vale se a entrada ainda estiver
+        reservada para esta tentativa; um resultado de reserva já vencida e
+        tomada por outro processo é descartado (devolve False).
+        """
+        now = _now()
+        processamento_log_id = self.db.query(WebhookOutbox.processamento_log_id).filter(
+            WebhookOutbox.id == entry_id
+        ).scalar()
+        log_query = self.db.query(ProcessamentoLog).filter(
+            ProcessamentoLog.id == processamento_log_id,
+            ProcessamentoLog.status == "iniciado"
+        )
+
+        if error is None:
+            values = {"status": OUTBOX_SENT, "enviado_em": now, "ultimo_erro": None}
+            log_values = {
+                "status": "webhook_enviado",
+                "mensagem": f"Webhook enviado com sucesso. Status: {status_code}"
+            }
+
+        elif retryable and attempt < settings.n8n_max_attempts:
+            delay = settings.n8n_retry_backoff_seconds * (2 ** (attempt - 1)) * (1 + random.random() / 2)
+            values = {"status": OUTBOX_PENDING, "proxima_tentativa_em": now + timedelta(seconds=delay), "ultimo_erro": error}
+            log_values = {
+                "mensagem": f"Tentativa {attempt} de envio ao n8n falhou ({error}); nova tentativa em {delay:.0f}s"
+            }
+
+        else:
+            values = {"status": OUTBOX_FAILED, "ultimo_erro": error}
+            log_values = {
+                "status": "erro",
+                "mensagem": "Falha no envio do webhook n8n",
+                "detalhes_erro": f"{error} (após {attempt} tentativa(s))"
+            }
+
+        values["resposta_status"] = status_code
+        updated = self.db.query(WebhookOutbox).filter(
+            WebhookOutbox.id == entry_id,
+            WebhookOutbox.status == OUTBOX_SENDING,
+            WebhookOutbox.tentativas == attempt
+        ).update(values, synchronize_session=False)
+        if not updated:
+            self.db.rollback()
+            return False
+
+        log_query.update(log_values, synchronize_session=False)
+        self.db.commit()
+        return True
+
+
+class N8nDispatcher:
+    """Drena webhook_outbox em segundo plano com um cliente HTTP compartilhado"""
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], Session]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.session_factory = session_factory or SessionLocal
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def _with_session(self, method: str, *args, **kwargs) -> Any:
+        db = self.session_factory()
+        try:
+            return getattr(N8nOutboxService(db), method)(*args, **kwargs)
+        finally:
+            db.close()
+
+    async def _send(self, entry: Dict[str, Any], semaphore: asyncio.Semaphore) -> None:
+        status_code, error, retryable = None, None, False
+        async with semaphore:
+            try:
+                # Limite do envio inteiro (não só de cada operação do httpx), dentro da reserva
+                response = await asyncio.wait_for(
+                    self.client.post(entry["url"], json=entry["payload"]),
+                    timeout=settings.n8n_timeout_seconds
+                )
+                status_code = response.status_code
+                if response.is_error:
+                    error = f"n8n respondeu {status_code}"
+                    retryable = status_code in RETRY_STATUS
+            except (httpx.TimeoutException, asyncio.TimeoutError):
+                error, retryable = "Timeout ao chamar webhook n8n", True
+            except httpx.RequestError as e:
+                error, retryable = f"Erro de conexão: {str(e)}", True
+            except Exception as e:
+                error = f"Erro inesperado: {str(e)}"
+
+        await asyncio.to_thread(
+            self._with_session, "record_result", entry["id"], entry["tentativa"], status_code, error, retryable
+        )
+
+    async def drain(self) -> int:
+        """
+        Envia tudo o que estiver vencido na fila; devolve quantas entradas foram
+        tentadas. Cada rodada reserva no máximo N8N_MAX_CONCURRENCY entradas,
+        que saem todas de uma vez: nenhuma espera por vaga com a reserva
+        correndo, então o envio termina antes de a reserva vencer.
+        """
+        semaphore = asyncio.Semaphore(settings.n8n_max_concurrency)
+        attempted = 0
+        while True:
+            claimed = await asyncio.to_thread(self._with_session, "claim_due", settings.n8n_max_concurrency)
+            if not claimed:
+                return attempted
+            await asyncio.gather(*(self._send(entry, semaphore) for entry in claimed))
+            attempted += len(claimed)
+
+    async def _run(self) -> None:
+        while True:
+            timeout = settings.n8n_poll_interval_seconds
+            try:
+                await self.drain()
+                # Acorda a tempo da próxima nova tentativa agendada
+                next_in = await asyncio.to_thread(self._with_session, "seconds_until_next")
+                if next_in is not None:
+                    timeout = min(timeout, next_in)
+            except Exception as e:
+                print(f"Erro ao enviar webhooks do n8n: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def wake(self) -> None:
+        """Antecipa a próxima drenagem (chamado após enfileirar)"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        self.client = httpx.AsyncClient(
+            timeout=settings.n8n_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.n8n_max_concurrency,
+                max_keepalive_connections=settings.n8n_max_concurrency
+            ),
+            transport=self.transport
+        )
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+_dispatcher: Optional[N8nDispatcher] = None
+
+
+async def start_n8n_dispatcher() -> None:
+    global _dispatcher
+    if settings.n8n_dispatcher_enabled and _dispatcher is None:
+        _dispatcher = N8nDispatcher()
+        await _dispatcher.start()
+
+
+async def stop_n8n_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.stop()
+        _dispatcher = None
+
+
+def wake_n8n_dispatcher() -> None:
+    """Sem dispatcher neste processo, a entrada espera a varredura periódica de outro"""
+    if _dispatcher is not None:
+        _dispatcher.wake()
@@ -0,0 +1,137 @@
+"""Exportação em streaming das notas fiscais de um contrato (NDJSON e CSV)"""
+
+import csv
+import io
+import json
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterator, Optional
+from decimal import Decimal
+from datetime import date, datetime
+
+from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem
+from app.models.cost_centers import CostCenter
+
+
+NF_COLUMNS = [
+    ("nf_id", NotaFiscal.id),
+    ("numero", NotaFiscal.numero),
+    ("serie", NotaFiscal.serie),
+    ("chave_acesso", NotaFiscal.chave_acesso),
+    ("fornecedor", NotaFiscal.nome_fornecedor),
+    ("cnpj_fornecedor", NotaFiscal.cnpj_fornecedor),
+    ("nf_valor_total", NotaFiscal.valor_total),
+    ("valor_produtos", NotaFiscal.valor_produtos),
+    ("valor_impostos", NotaFiscal.valor_impostos),
+    ("valor_frete", NotaFiscal.valor_frete),
+    ("data_emissao", NotaFiscal.data_emissao),
+    ("data_entrada", NotaFiscal.data_entrada),
+    ("status_processamento", NotaFiscal.status_processamento),
+    ("pasta_origem", NotaFiscal.pasta_origem),
+    ("subpasta", NotaFiscal.subpasta),
+]
+
+ITEM_COLUMNS = [
+    ("item_id", NotaFiscalItem.id),
+    ("numero_item", NotaFiscalItem.numero_item),
+    ("codigo_produto", NotaFiscalItem.codigo_produto),
+    ("descricao", NotaFiscalItem.descricao),
+    ("ncm", NotaFiscalItem.ncm),
+    ("quantidade", NotaFiscalItem.quantidade),
+    ("unidade", NotaFiscalItem.unidade),
+    ("valor_unitario", NotaFiscalItem.valor_unitario),
+    ("item_valor_total", NotaFiscalItem.valor_total),
+    ("centro_custo_id", NotaFiscalItem.centro_custo_id),
+    ("centro_custo", CostCenter.nome),
+    ("item_orcamento_id", NotaFiscalItem.item_orcamento_id),
+    ("status_integracao", NotaFiscalItem.status_integracao),
+]
+
+CSV_HEADER = [name for name, _ in NF_COLUMNS + ITEM_COLUMNS]
+
+# Nomes dos campos dentro do objeto de item no NDJSON (sem o prefixo "item_")
+ITEM_JSON_NAMES = {"item_id": "id", "item_valor_total": "valor_total"}
+NF_JSON_NAMES = {"nf_id": "id", "nf_valor_total": "valor_total"}
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d")
+    return value
+
+
+class NFExportService:
+    """
+    Percorre NFs e itens de um contrato com um único SELECT (NF ⟕ itens ⟕
+    centro de custo) lido via cursor do servidor (`yield_per`). As linhas são
+    emitidas à medida que chegam, então a memória não cresce com o contrato.
+    """
+
+    def __init__(self, db: Session, batch_size: int = 1000):
+        self.db = db
+        self.batch_size = batch_size
+
+    def iter_rows(self, contract_id: int) -> Iterator[Dict[str, Any]]:
+        """Uma linha plana por item (NFs sem itens geram uma linha com os campos de item vazios)"""
+        columns = NF_COLUMNS + ITEM_COLUMNS
+        query = self.db.query(
+            *[column.label(name) for name, column in columns]
+        ).select_from(NotaFiscal).outerjoin(
+            NotaFiscalItem, NotaFiscalItem.nota_id == NotaFiscal.id
+        ).outerjoin(
+            CostCenter, CostCenter.id == NotaFiscalItem.centro_custo_id
+        ).filter(
+            NotaFiscal.contrato_id == contract_id
+        ).order_by(
+            NotaFiscal.id, NotaFiscalItem.numero_item, NotaFiscalItem.id
+        ).yield_per(self.batch_size)
+
+        for row in query:
+            yield row._asdict()
+
+    def iter_ndjson(self, contract_id: int) -> Iterator[str]:
+        """Um objeto JSON por NF, com os itens aninhados; as linhas chegam ordenadas por NF"""
+        current: Optional[Dict[str, Any]] = None
+
+        for row in self.iter_rows(contract_id):
+            if current is None or current["id"] != row["nf_id"]:
+                if current is not None:
+                    yield json.dumps(current, ensure_ascii=False) + "\n"
+                current = {
+                    NF_JSON_NAMES.get(name, name): _to_json_value(row[name])
+                    for name, _ in NF_COLUMNS
+                }
+                current["items"] = []
+
+            if row["item_id"] is not None:
+                current["items"].append({
+                    ITEM_JSON_NAMES.get(name, name): _to_json_value(row[name])
+                    for name, _ in ITEM_COLUMNS
+                })
+
+        if current is not None:
+            yield json.dumps(current, ensure_ascii=False) + "\n"
+
+    def iter_csv(self, contract_id: int) -> Iterator[str]:
+        """CSV com cabeçalho e uma linha por item; cada linha é enviada assim que escrita"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush() -> str:
+            data = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return data
+
+        writer.writerow(CSV_HEADER)
+        yield flush()
+
+        for row in self.iter_rows(contract_id):
+            writer.writerow([
+                "" if row[name] is None else _to_json_value(row[name])
+                for name in CSV_HEADER
+            ])
+            yield flush()
@@ -0,0 +1,149 @@
+"""Motor de KPIs das notas fiscais com cache de curta duração"""
+
+import threading
+import time
+from sqlalchemy.orm import Session
+from sqlalchemy import func, extract, case
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem
+from app.models.cost_centers import CostCenter
+from app.services.dashboard_cache import TAG_NF, invalidate_dashboards
+
+
+MONTH_NAMES = {
+    1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun",
+    7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"
+}
+
+# Snapshot em memória do processo; a geração muda a cada invalidação para
+# descartar cálculos que começaram antes de uma escrita
+_lock = threading.Lock()
+_snapshot: Optional[Dict[str, Any]] = None
+_expires_at = 0.0
+_generation = 0
+
+
+def invalidate_nf_kpis() -> None:
+    """Descarta o snapshot de KPIs e os dashboards que leem NFs; chamado pelas escritas de NF"""
+    global _snapshot, _generation
+    with _lock:
+        _snapshot = None
+        _generation += 1
+    invalidate_dashboards(TAG_NF)
+
+
+class NFKpiEngine:
+    """
+    Calcula todos os agregados de NF em uma varredura com agregação condicional,
+    mais a distribuição por status, a série mensal e a quebra por centro de custo.
+    O resultado fica em cache por `settings.nf_kpi_cache_ttl_seconds`.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Retorna o snapshot de KPIs, recalculando se expirado ou invalidado"""
+        global _snapshot, _expires_at
+
+        with _lock:
+            if _snapshot is not None and time.monotonic() < _expires_at:
+                return _snapshot
+            generation = _generation
+
+        snapshot = self._compute()
+
+        with _lock:
+            if generation == _generation:
+                _snapshot = snapshot
+                _expires_at = time.monotonic() + settings.nf_kpi_cache_ttl_seconds
+
+        return snapshot
+
+    def _compute(self) -> Dict[str, Any]:
+        validado = NotaFiscal.status_processamento == 'validado'
+        processado = NotaFiscal.status_processamento == 'processado'
+        erro = NotaFiscal.status_processamento == 'erro'
+
+        (total_nfs, nfs_validadas, nfs_pendentes, nfs_erro,
+         valor_total, valor_validado, valor_pendente,
+         contratos_com_nfs, nfs_sem_contrato, fornecedores_unicos) = self.db.query(
+            func.count(NotaFiscal.id),
+            func.sum(case((validado, 1), else_=0)),
+            func.sum(case((processado, 1), else_=0)),
+            func.sum(case((erro, 1), else_=0)),
+            func.sum(NotaFiscal.valor_total),
+            func.sum(case((validado, NotaFiscal.valor_total), else_=0)),
+            func.sum(case((processado, NotaFiscal.valor_total), else_=0)),
+            func.count(func.distinct(NotaFiscal.contrato_id)),
+            func.sum(case((NotaFiscal.contrato_id.is_(None), 1), else_=0)),
+            func.count(func.distinct(NotaFiscal.cnpj_fornecedor))
+        ).one()
+
+        # Distribuição completa por status (inclui status fora dos três conhecidos)
+        status_distribution = dict(
+            self.db.query(
+                NotaFiscal.status_processamento,
+                func.count(NotaFiscal.id)
+            ).group_by(NotaFiscal.status_processamento).all()
+        )
+
+        # Estatísticas mensais dos últimos 12 meses
+        twelve_months_ago = datetime.now() - timedelta(days=365)
+        month = extract('month', NotaFiscal.data_emissao)
+        year = extract('year', NotaFiscal.data_emissao)
+
+        monthly_stats = self.db.query(
+            month,
+            year,
+            func.count(NotaFiscal.id),
+            func.sum(NotaFiscal.valor_total)
+        ).filter(
+            NotaFiscal.data_emissao >= twelve_months_ago
+        ).group_by(month, year).order_by(year.desc(), month.desc()).all()
+
+        # Estatísticas por centro de custo (NFs validadas)
+        centros_custo_stats = self.db.query(
+            CostCenter.nome,
+            func.count(NotaFiscalItem.id),
+            func.sum(NotaFiscalItem.valor_total)
+        ).join(
+            NotaFiscalItem, CostCenter.id == NotaFiscalItem.centro_custo_id
+        ).join(
+            NotaFiscal, NotaFiscalItem.nota_id == NotaFiscal.id
+        ).filter(validado).group_by(CostCenter.nome).all()
+
+        return {
+            "total_nfs": total_nfs or 0,
+            "nfs_validadas": nfs_validadas or 0,
+            "nfs_pendentes": nfs_pendentes or 0,
+            "nfs_erro": nfs_erro or 0,
+            "valor_total": float(valor_total or 0),
+            "valor_validado": float(valor_validado or 0),
+            "valor_pendente": float(valor_pendente or 0),
+            "contratos_com_nfs": contratos_com_nfs or 0,
+            "nfs_sem_contrato": nfs_sem_contrato or 0,
+            "fornecedores_unicos": fornecedores_unicos or 0,
+            "status_distribution": status_distribution,
+            "monthly_stats": [
+                {
+                    "month": MONTH_NAMES.get(int(m), f"Mês {m}"),
+                    "year": int(y),
+                    "count": count,
+                    "value": float(value) if value else 0
+                }
+                for m, y, count, value in monthly_stats
+            ],
+            "centros_custo": [
+                {
+                    "nome": nome,
+                    "total_itens": total_itens,
+                    "valor_total": float(valor or 0)
+                }
+                for nome, total_itens, valor in centros_custo_stats
+            ],
+            "generated_at": datetime.now().isoformat()
+        }
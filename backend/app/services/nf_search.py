@@ -0,0 +1,121 @@
+"""Busca textual ranqueada sobre fornecedores e itens das notas fiscais"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func, literal, union_all
+from typing import Any, Dict, List, Optional
+
+from app.core.text_search import contains, rank
+from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem
+from app.models.contracts import Contract
+
+
+class NFSearchService:
+    """
+    Procura o termo no nome do fornecedor e na descrição dos itens (sem acento,
+    sem caixa, pelos índices trigram) e ranqueia as NFs pela melhor ocorrência.
+    """
+
+    MAX_ITENS_POR_NF = 5
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def search(
+        self,
+        term: str,
+        limit: int = 20,
+        contract_id: Optional[int] = None,
+        status_filter: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        nf_filters = []
+        if contract_id:
+            nf_filters.append(NotaFiscal.contrato_id == contract_id)
+        if status_filter:
+            nf_filters.append(NotaFiscal.status_processamento == status_filter)
+
+        header_hits = self.db.query(
+            NotaFiscal.id.label('nota_id'),
+            rank(NotaFiscal.nome_fornecedor, term).label('score'),
+            literal(1).label('no_fornecedor'),
+            literal(0).label('nos_itens')
+        ).filter(contains(NotaFiscal.nome_fornecedor, term), *nf_filters)
+
+        item_hits = self.db.query(
+            NotaFiscalItem.nota_id.label('nota_id'),
+            rank(NotaFiscalItem.descricao, term).label('score'),
+            literal(0).label('no_fornecedor'),
+            literal(1).label('nos_itens')
+        ).filter(contains(NotaFiscalItem.descricao, term))
+        if nf_filters:
+            item_hits = item_hits.join(NotaFiscal, NotaFiscal.id == NotaFiscalItem.nota_id).filter(*nf_filters)
+
+        hits = union_all(header_hits.statement, item_hits.statement).subquery()
+
+        # Uma linha por NF com a melhor relevância entre cabeçalho e itens
+        ranked = self.db.query(
+            hits.c.nota_id,
+            func.max(hits.c.score).label('score'),
+            func.max(hits.c.no_fornecedor).label('no_fornecedor'),
+            func.max(hits.c.nos_itens).label('nos_itens')
+        ).group_by(hits.c.nota_id).order_by(
+            func.max(hits.c.score).desc(), hits.c.nota_id.desc()
+        ).limit(limit).all()
+
+        if not ranked:
+            return []
+
+        nota_ids = [row.nota_id for row in ranked]
+        nfs = {
+            nf.id: (nf, contrato_nome)
+            for nf, contrato_nome in self.db.query(NotaFiscal, Contract.nome_projeto).outerjoin(
+                Contract, Contract.id == NotaFiscal.contrato_id
+            ).filter(NotaFiscal.id.in_(nota_ids)).all()
+        }
+
+        item_score = rank(NotaFiscalItem.descricao, term)
+        itens_por_nf: Dict[int, List[Dict[str, Any]]] = {}
+        for item_id, nota_id, numero_item, descricao, score in self.db.query(
+            NotaFiscalItem.id,
+            NotaFiscalItem.nota_id,
+            NotaFiscalItem.numero_item,
+            NotaFiscalItem.descricao,
+            item_score
+        ).filter(
+            NotaFiscalItem.nota_id.in_(nota_ids),
+            contains(NotaFiscalItem.descricao, term)
+        ).order_by(item_score.desc(), NotaFiscalItem.numero_item).all():
+            itens = itens_por_nf.setdefault(nota_id, [])
+            if len(itens) < self.MAX_ITENS_POR_NF:
+                itens.append({
+                    "id": item_id,
+                    "numero_item": numero_item,
+                    "descricao": descricao,
+                    "score": round(float(score or 0), 4)
+                })
+
+        results = []
+        for row in ranked:
+            nf, contrato_nome = nfs[row.nota_id]
+            matched_on = []
+            if row.no_fornecedor:
+                matched_on.append("fornecedor")
+            if row.nos_itens:
+                matched_on.append("itens")
+
+            results.append({
+                "id": nf.id,
+                "numero": nf.numero,
+                "serie": nf.serie,
+                "fornecedor": nf.nome_fornecedor,
+                "cnpj_fornecedor": nf.cnpj_fornecedor,
+                "valor_total": float(nf.valor_total) if nf.valor_total else 0,
+                "data_emissao": nf.data_emissao.strftime("%Y-%m-%d") if nf.data_emissao else None,
+                "status_processamento": nf.status_processamento,
+                "contrato_id": nf.contrato_id,
+                "contrato_nome": contrato_nome,
+                "score": round(float(row.score or 0), 4),
+                "matched_on": matched_on,
+                "itens": itens_por_nf.get(nf.id, [])
+            })
+
+        return results
@@ -1,18 +1,27 @@
 """Serviço de negócio para Notas Fiscais"""
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract, and_
-from typing import List, Optional, Dict, Any
+from sqlalchemy import func, and_, case, tuple_
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import datetime
 from fastapi import HTTPException, status
+from pydantic import ValidationError
 
 from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem, ProcessamentoLog
 from app.models.contracts import Contract
 from app.models.purchases import PurchaseOrder
-from app.models.cost_centers import CostCenter
+from app.core.config import settings
+from app.core.pagination import paginate_keyset
+from app.core.text_search import contains
+from app.services.contract_ledger import ContractLedgerService
+from app.services.nf_kpis import NFKpiEngine, invalidate_nf_kpis
+from app.services.cost_center_classifier import CostCenterClassifier
+from app.services.bulk_writer import BulkDocumentWriter
 from app.schemas.notas_fiscais import (
     NotaFiscalCreate,
+    NotaFiscalIngest,
     NotaFiscalUpdate,
     NotaFiscalItemCreate,
     NotaFiscalItemUpdate,
@@ -20,9 +29,56 @@ from app.schemas.notas_fiscais import (
 )
 
 
+# Campos do cabeçalho vindos do n8n que o upsert de /nf/ingest-batch sobrescreve
+NF_INGEST_UPDATE_COLUMNS = (
+    "numero", "serie", "cnpj_fornecedor", "nome_fornecedor", "valor_total", "valor_produtos",
+    "valor_impostos", "valor_frete", "data_emissao", "data_entrada", "pasta_origem", "subpasta",
+    "processed_by_n8n_at"
+)
+
+# Colunas de item definidas pelo sistema ou pelo usuário, preservadas quando o n8n reenvia a NF
+NF_ITEM_KEPT_COLUMNS = (
+    "centro_custo_id", "item_orcamento_id", "score_classificacao", "fonte_classificacao",
+    "status_integracao", "integrado_em"
+)
+
+
+def merge_reingested_item(previous: Any, item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Item reenviado pelo n8n (mesmo numero_item): os dados do produto vêm do
+    payload; classificação e integração do item antigo são mantidas se ele
+    foi classificado manualmente, já foi integrado ou o payload não traz
+    centro de custo
+    """
+    owned = previous["fonte_classificacao"] == "manual" or previous["status_integracao"] != "pendente"
+    if owned or item.get("centro_custo_id") is None:
+        return {**item, **{column: previous[column] for column in NF_ITEM_KEPT_COLUMNS}}
+    return item
+
+
+async def iter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Um objeto por linha de um corpo NDJSON lido em stream; linhas inválidas viram ValueError"""
+    buffer = b""
+    async for data in stream:
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield ValueError(f"JSON inválido: {str(e)}")
+    if buffer.strip():
+        try:
+            yield json.loads(buffer)
+        except ValueError as e:
+            yield ValueError(f"JSON inválido: {str(e)}")
+
+
 class NotaFiscalService:
     def __init__(self, db: Session):
         self.db = db
+        self.ledger = ContractLedgerService(db)
 
     # === NOTAS FISCAIS ===
 
@@ -33,9 +89,19 @@ class NotaFiscalService:
         status_filter: Optional[str] = None,
         supplier: Optional[str] = None,
         contract_id: Optional[int] = None,
-        pasta_origem: Optional[str] = None
-    ) -> tuple[List[NotaFiscal], int]:
-        """Lista notas fiscais com filtros e paginação"""
+        pasta_origem: Optional[str] = None,
+        after: Optional[str] = None,
+        use_cursor: bool = False,
+        include_total: bool = True
+    ) -> tuple[List[tuple[NotaFiscal, Optional[str], int]], Optional[int], Optional[str]]:
+        """
+        Lista notas fiscais com filtros e paginação
+        Retorna tuplas (nf, nome do contrato, quantidade de itens) sem carregar os itens,
+        o total e o cursor da próxima página.
+
+        Com `use_cursor` (ou `after` informado) a paginação é keyset sobre
+        (data_emissao, id) e o total só é contado se `include_total`.
+        """
         query = self.db.query(NotaFiscal)
 
         # Aplicar filtros
@@ -43,7 +109,7 @@ class NotaFiscalService:
             query = query.filter(NotaFiscal.status_processamento.ilike(f"%{status_filter}%"))
 
         if supplier:
-            query = query.filter(NotaFiscal.nome_fornecedor.ilike(f"%{supplier}%"))
+            query = query.filter(contains(NotaFiscal.nome_fornecedor, supplier))
 
         if contract_id:
             query = query.filter(NotaFiscal.contrato_id == contract_id)
@@ -51,10 +117,46 @@ class NotaFiscalService:
         if pasta_origem:
             query = query.filter(NotaFiscal.pasta_origem == pasta_origem)
 
-        total = query.count()
-        nfs = query.offset(skip).limit(limit).all()
+        cursor_mode = use_cursor or after is not None
+        total = query.count() if include_total or not cursor_mode else None
+
+        page_query = query.outerjoin(
+            Contract, Contract.id == NotaFiscal.contrato_id
+        ).add_columns(Contract.nome_projeto)
+
+        next_cursor = None
+        if cursor_mode:
+            page, next_cursor = paginate_keyset(
+                page_query,
+                NotaFiscal.data_emissao,
+                NotaFiscal.id,
+                limit,
+                after=after,
+                cursor_key=lambda row: (row[0].data_emissao, row[0].id)
+            )
+        else:
+            page = page_query.offset(skip).limit(limit).all()
+
+        return self._with_itens_count(page), total, next_cursor
+
+    def _with_itens_count(self, page) -> List[tuple[NotaFiscal, Optional[str], int]]:
+        """
+        Completa uma página de (nf, nome do contrato) com a contagem de itens
+        via uma única consulta agrupada, sem carregar os itens
+        """
+        nf_ids = [nf.id for nf, _ in page]
+        itens_count = {}
+        if nf_ids:
+            itens_count = dict(
+                self.db.query(
+                    NotaFiscalItem.nota_id,
+                    func.count(NotaFiscalItem.id)
+                ).filter(
+                    NotaFiscalItem.nota_id.in_(nf_ids)
+                ).group_by(NotaFiscalItem.nota_id).all()
+            )
 
-        return nfs, total
+        return [(nf, contrato_nome, itens_count.get(nf.id, 0)) for nf, contrato_nome in page]
 
     def get_nota_fiscal(self, nf_id: int) -> Optional[NotaFiscal]:
         """Busca uma nota fiscal específica com itens"""
@@ -64,13 +166,20 @@ class NotaFiscalService:
         self,
         folder_name: str,
         skip: int = 0,
-        limit: int = 10
-    ) -> tuple[List[NotaFiscal], int]:
+        limit: int = 10,
+        after: Optional[str] = None,
+        use_cursor: bool = False,
+        include_total: bool = True
+    ) -> tuple[List[tuple[NotaFiscal, Optional[str], int]], Optional[int], Optional[str]]:
         """Lista notas fiscais por pasta de origem"""
-        query = self.db.query(NotaFiscal).filter(NotaFiscal.pasta_origem == folder_name)
-        total = query.count()
-        nfs = query.offset(skip).limit(limit).all()
-        return nfs, total
+        return self.get_notas_fiscais(
+            skip=skip,
+            limit=limit,
+            pasta_origem=folder_name,
+            after=after,
+            use_cursor=use_cursor,
+            include_total=include_total
+        )
 
     def create_nota_fiscal(self, nf_data: NotaFiscalCreate) -> NotaFiscal:
         """Cria uma nova nota fiscal com itens"""
@@ -88,39 +197,269 @@ class NotaFiscalService:
                 detail=f"Nota fiscal {nf_data.numero}/{nf_data.serie} já existe"
             )
 
+        if nf_data.chave_acesso and self.db.query(NotaFiscal.id).filter(
+            NotaFiscal.chave_acesso == nf_data.chave_acesso
+        ).first():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Nota fiscal com chave de acesso {nf_data.chave_acesso} já existe"
+            )
+
         # Criar nota fiscal
         nf_dict = nf_data.dict(exclude={'itens'})
         nf = NotaFiscal(**nf_dict)
 
         self.db.add(nf)
-        self.db.commit()
-        self.db.refresh(nf)
+        self.db.flush()
 
         # Criar itens se fornecidos
-        if nf_data.itens:
-            for item_data in nf_data.itens:
-                item_dict = item_data.dict()
-                item_dict['nota_fiscal_id'] = nf.id
-                item = NotaFiscalItem(**item_dict)
-                self.db.add(item)
+        for item_data in nf_data.itens or []:
+            item_dict = item_data.dict()
+            item_dict['nota_id'] = nf.id
+            self.db.add(NotaFiscalItem(**item_dict))
 
-            self.db.commit()
-            self.db.refresh(nf)
+        # Nota, itens e agregado do contrato na mesma transação
+        self.ledger.refresh_contracts(nf.contrato_id)
+        self.db.commit()
+        invalidate_nf_kpis()
+        self.db.refresh(nf)
 
         return nf
 
+    def create_notas_fiscais_bulk(self, nfs_data: List[NotaFiscalCreate]) -> Dict[str, Any]:
+        """
+        Cria várias notas fiscais com itens pelo BulkDocumentWriter: blocos de
+        NFs por transação, cabeçalhos com RETURNING e itens em executemany.
+        NFs com chave de acesso usam INSERT ... ON CONFLICT (chave_acesso) DO
+        NOTHING e, se já existirem, voltam em `skipped`; as sem chave são
+        checadas por número/série. Falhas no banco são reportadas
+        individualmente sem abortar as demais.
+        """
+        errors: List[Dict[str, Any]] = []
+        documents = []
+        seen = set()
+
+        existing = set()
+        pairs = list({(nf_data.numero, nf_data.serie) for nf_data in nfs_data if not nf_data.chave_acesso})
+        for start in range(0, len(pairs), settings.bulk_write_chunk_size):
+            existing.update(
+                self.db.query(NotaFiscal.numero, NotaFiscal.serie).filter(
+                    tuple_(NotaFiscal.numero, NotaFiscal.serie).in_(pairs[start:start + settings.bulk_write_chunk_size])
+                ).all()
+            )
+
+        for index, nf_data in enumerate(nfs_data):
+            if not nf_data.chave_acesso:
+                pair = (nf_data.numero, nf_data.serie)
+                if pair in existing or pair in seen:
+                    errors.append({"index": index, "numero": nf_data.numero, "serie": nf_data.serie, "erro": "Nota fiscal já existe"})
+                    continue
+                seen.add(pair)
+
+            documents.append((
+                index,
+                nf_data.model_dump(exclude={'itens'}),
+                [item_data.model_dump() for item_data in nf_data.itens or []]
+            ))
+
+        contract_by_index = {index: header.get('contrato_id') for index, header, _ in documents}
+
+        def refresh_ledger(chunk_result: Dict[str, List]) -> None:
+            # Agregado dos contratos gravado na mesma transação de cada bloco
+            self.ledger.refresh_contracts(*{contract_by_index[index] for index, _ in chunk_result["written"]})
+
+        writer = BulkDocumentWriter(
+            self.db, NotaFiscal, NotaFiscalItem, 'nota_id',
+            before_commit=refresh_ledger, conflict_column=NotaFiscal.chave_acesso
+        )
+        result = writer.write(documents)
+        if result["written"]:
+            invalidate_nf_kpis()
+
+        for index, message in result["errors"]:
+            errors.append({"index": index, "numero": nfs_data[index].numero, "serie": nfs_data[index].serie, "erro": message})
+
+        return {
+            "created": [{"index": index, "id": row.id} for index, row in result["written"]],
+            "skipped": [
+                {"index": index, "numero": nfs_data[index].numero, "serie": nfs_data[index].serie, "chave_acesso": nfs_data[index].chave_acesso}
+                for index in sorted(result["skipped"])
+            ],
+            "errors": sorted(errors, key=lambda error: error["index"])
+        }
+
+    async def ingest_batch(
+        self,
+        records: AsyncIterator[Any],
+        processamento_log_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Ingestão em lote das NFs enviadas pelo n8n (POST /nf/ingest-batch).
+
+        Cada registro é validado com NotaFiscalIngest e gravado em blocos pelo
+        BulkDocumentWriter com INSERT ... ON CONFLICT (chave_acesso) DO UPDATE:
+        NFs novas são criadas; existentes têm cabeçalho atualizado e itens
+        substituídos, exceto as já validadas, que voltam em `ignoradas`.
+        Contrato e ordem de compra de NFs existentes são preservados, assim
+        como a classificação e a integração dos itens (merge_reingested_item).
+
+        Acima de NF_INGEST_MAX_BATCH registros a leitura para: o que já foi
+        gravado fica, a resposta vem com `limite_excedido` e os seguintes
+        devem ser reenviados. Os contadores do ProcessamentoLog são atualizados
+        uma vez no fim, mesmo se a ingestão for interrompida.
+        """
+        now = datetime.now()
+        errors: List[Dict[str, Any]] = []
+        ignored: List[Dict[str, Any]] = []
+        chaves: Dict[int, str] = {}
+        folder_by_index: Dict[int, str] = {}
+        received_by_folder: Dict[str, int] = {}
+        written_by_folder: Dict[str, int] = {}
+        totals = {"criadas": 0, "atualizadas": 0}
+        received = 0
+        limit_exceeded = False
+
+        def refresh_ledger(chunk_result: Dict[str, List]) -> None:
+            # Contrato vem do RETURNING: em NFs atualizadas é o já vinculado
+            self.ledger.refresh_contracts(*{row.contrato_id for _, row in chunk_result["written"]})
+
+        writer = BulkDocumentWriter(
+            self.db, NotaFiscal, NotaFiscalItem, 'nota_id',
+            returning=[NotaFiscal.id, NotaFiscal.contrato_id],
+            before_commit=refresh_ledger,
+            conflict_column=NotaFiscal.chave_acesso,
+            conflict_update=lambda excluded: {
+                **{column: excluded[column] for column in NF_INGEST_UPDATE_COLUMNS},
+                "status_processamento": "processado",
+                "updated_at": func.now()
+            },
+            conflict_update_where=NotaFiscal.status_processamento != "validado",
+            item_match=("numero_item",),
+            item_merge=merge_reingested_item
+        )
+
+        def write(chunk: List[tuple]) -> None:
+            result = writer.write_chunk(chunk)
+            updated = set(result["updated"])
+            totals["atualizadas"] += len(updated)
+            totals["criadas"] += len(result["written"]) - len(updated)
+            for index, _ in result["written"]:
+                written_by_folder[folder_by_index[index]] = written_by_folder.get(folder_by_index[index], 0) + 1
+            for index in result["skipped"]:
+                ignored.append({"index": index, "chave_acesso": chaves[index], "motivo": "NF já validada"})
+            for index, message in result["errors"]:
+                errors.append({"index": index, "chave_acesso": chaves[index], "erro": message})
+
+        chunk: List[tuple] = []
+        seen: set = set()
+        try:
+            async for record in records:
+                if received >= settings.nf_ingest_max_batch:
+                    limit_exceeded = True
+                    errors.append({"index": received, "erro": (
+                        f"Lote excede {settings.nf_ingest_max_batch} NFs por chamada; "
+                        "este registro e os seguintes não foram lidos"
+                    )})
+                    break
+                index = received
+                received += 1
+
+                if isinstance(record, Exception):
+                    errors.append({"index": index, "erro": str(record)})
+                    continue
+                try:
+                    nf_data = NotaFiscalIngest.model_validate(record)
+                except ValidationError as e:
+                    errors.append({"index": index, "erro": "; ".join(
+                        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+                    )})
+                    continue
+
+                folder = nf_data.pasta_origem
+                received_by_folder[folder] = received_by_folder.get(folder, 0) + 1
+                if nf_data.chave_acesso in seen:
+                    ignored.append({"index": index, "chave_acesso": nf_data.chave_acesso, "motivo": "chave repetida no lote"})
+                    continue
+                seen.add(nf_data.chave_acesso)
+                chaves[index] = nf_data.chave_acesso
+                folder_by_index[index] = folder
+
+                chunk.append((
+                    index,
+                    {**nf_data.model_dump(exclude={'itens'}), "processed_by_n8n_at": now},
+                    [item_data.model_dump() for item_data in nf_data.itens or []]
+                ))
+                if len(chunk) >= writer.chunk_size:
+                    write(chunk)
+                    chunk = []
+
+            if chunk:
+                write(chunk)
+        finally:
+            # Blocos já confirmados contam no log mesmo se a ingestão parar no meio
+            if totals["criadas"] or totals["atualizadas"]:
+                invalidate_nf_kpis()
+            log_ids = self._count_ingested(processamento_log_id, received_by_folder, written_by_folder)
+
+        return {
+            "recebidas": received,
+            **totals,
+            "ignoradas": sorted(ignored, key=lambda entry: entry["index"]),
+            "erros": sorted(errors, key=lambda error: error["index"]),
+            "processamento_log_ids": log_ids,
+            "limite_excedido": limit_exceeded
+        }
+
+    def _count_ingested(
+        self,
+        processamento_log_id: Optional[int],
+        received_by_folder: Dict[str, int],
+        written_by_folder: Dict[str, int]
+    ) -> List[int]:
+        """
+        Soma as NFs recebidas (quantidade_arquivos) e gravadas (quantidade_nfs)
+        no log informado ou, sem ele, no log mais recente de cada pasta
+        """
+        if processamento_log_id is not None:
+            targets = {processamento_log_id: (sum(received_by_folder.values()), sum(written_by_folder.values()))}
+        else:
+            latest = dict(
+                self.db.query(ProcessamentoLog.pasta_nome, func.max(ProcessamentoLog.id)).filter(
+                    ProcessamentoLog.pasta_nome.in_(list(received_by_folder))
+                ).group_by(ProcessamentoLog.pasta_nome).all()
+            ) if received_by_folder else {}
+            targets = {
+                log_id: (received_by_folder[folder], written_by_folder.get(folder, 0))
+                for folder, log_id in latest.items()
+            }
+
+        updated = []
+        for log_id, (arquivos, nfs) in targets.items():
+            if self.db.query(ProcessamentoLog).filter(ProcessamentoLog.id == log_id).update({
+                "quantidade_arquivos": func.coalesce(ProcessamentoLog.quantidade_arquivos, 0) + arquivos,
+                "quantidade_nfs": func.coalesce(ProcessamentoLog.quantidade_nfs, 0) + nfs,
+                "updated_at": func.now()
+            }, synchronize_session=False):
+                updated.append(log_id)
+        self.db.commit()
+        return sorted(updated)
+
     def update_nota_fiscal(self, nf_id: int, nf_data: NotaFiscalUpdate) -> Optional[NotaFiscal]:
         """Atualiza uma nota fiscal existente"""
         nf = self.db.query(NotaFiscal).filter(NotaFiscal.id == nf_id).first()
         if not nf:
             return None
 
+        contrato_anterior = nf.contrato_id
+
         # Atualizar campos fornecidos
         for field, value in nf_data.dict(exclude_unset=True).items():
             setattr(nf, field, value)
 
         nf.updated_at = datetime.now()
+        self.ledger.refresh_contracts(contrato_anterior, nf.contrato_id)
         self.db.commit()
+        invalidate_nf_kpis()
         self.db.refresh(nf)
 
         return nf
@@ -131,8 +470,11 @@ class NotaFiscalService:
         if not nf:
             return False
 
+        contrato_id = nf.contrato_id
         self.db.delete(nf)
+        self.ledger.refresh_contracts(contrato_id)
         self.db.commit()
+        invalidate_nf_kpis()
         return True
 
     # === ITENS DE NOTA FISCAL ===
@@ -156,7 +498,9 @@ class NotaFiscalService:
             setattr(item, field, value)
 
         item.updated_at = datetime.now()
+        self.ledger.refresh_contracts(item.nota_fiscal.contrato_id)
         self.db.commit()
+        invalidate_nf_kpis()
         self.db.refresh(item)
 
         return item
@@ -179,73 +523,104 @@ class NotaFiscalService:
         item.updated_at = datetime.now()
 
         # Atualizar nota fiscal com contrato
-        if item.nota_fiscal.contrato_id != contrato_id:
+        contrato_anterior = item.nota_fiscal.contrato_id
+        if contrato_anterior != contrato_id:
             item.nota_fiscal.contrato_id = contrato_id
             item.nota_fiscal.updated_at = datetime.now()
 
+        self.ledger.refresh_contracts(contrato_anterior, contrato_id)
         self.db.commit()
+        invalidate_nf_kpis()
         return True
 
-    # === ESTATÍSTICAS ===
-
-    def get_statistics(self) -> Dict[str, Any]:
-        """Calcula estatísticas das notas fiscais"""
-
-        # Estatísticas básicas
-        total_nfs = self.db.query(NotaFiscal).count()
-
-        # Distribuição por status
-        status_counts = self.db.query(
-            NotaFiscal.status_processamento,
-            func.count(NotaFiscal.id).label('count')
-        ).group_by(NotaFiscal.status_processamento).all()
-
-        status_distribution = {status: count for status, count in status_counts}
-
-        # Valor total
-        total_value_result = self.db.query(func.sum(NotaFiscal.valor_total)).scalar()
-        total_value = float(total_value_result) if total_value_result else 0
-
-        # Estatísticas mensais dos últimos 12 meses
-        twelve_months_ago = datetime.now() - timedelta(days=365)
+    def validate_notas_fiscais_batch(
+        self,
+        nf_ids: Optional[List[int]] = None,
+        pasta_origem: Optional[str] = None,
+        contrato_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Valida várias NFs em uma transação com dois UPDATEs em lote
+        (notas_fiscais e nf_itens), como o validate individual faz por NF.
+        Retorna o resultado de cada NF: validada, ja_validada ou nao_encontrada.
+        """
+        query = self.db.query(
+            NotaFiscal.id, NotaFiscal.status_processamento, NotaFiscal.contrato_id
+        )
+        if nf_ids:
+            query = query.filter(NotaFiscal.id.in_(nf_ids))
+        if pasta_origem:
+            query = query.filter(NotaFiscal.pasta_origem == pasta_origem)
+        if contrato_id:
+            query = query.filter(NotaFiscal.contrato_id == contrato_id)
+
+        targets = {nf_id: (status_nf, contrato) for nf_id, status_nf, contrato in query.all()}
+        to_validate = [nf_id for nf_id, (status_nf, _) in targets.items() if status_nf != 'validado']
+        with_contract = [nf_id for nf_id in to_validate if targets[nf_id][1]]
+
+        # Itens pendentes por NF, para informar quantos serão integrados
+        pending_items = dict(
+            self.db.query(NotaFiscalItem.nota_id, func.count(NotaFiscalItem.id)).filter(
+                NotaFiscalItem.nota_id.in_(with_contract),
+                NotaFiscalItem.status_integracao == 'pendente'
+            ).group_by(NotaFiscalItem.nota_id).all()
+        ) if with_contract else {}
+
+        now = datetime.now()
+        if to_validate:
+            self.db.query(NotaFiscal).filter(
+                NotaFiscal.id.in_(to_validate)
+            ).update({
+                NotaFiscal.status_processamento: 'validado',
+                NotaFiscal.updated_at: now
+            }, synchronize_session=False)
+
+        if pending_items:
+            self.db.query(NotaFiscalItem).filter(
+                NotaFiscalItem.nota_id.in_(list(pending_items)),
+                NotaFiscalItem.status_integracao == 'pendente'
+            ).update({
+                NotaFiscalItem.status_integracao: 'integrado',
+                NotaFiscalItem.integrado_em: now,
+                NotaFiscalItem.updated_at: now
+            }, synchronize_session=False)
+
+        if to_validate:
+            self.ledger.refresh_contracts(*{targets[nf_id][1] for nf_id in to_validate})
+            self.db.commit()
+            invalidate_nf_kpis()
+
+        requested = nf_ids if nf_ids else sorted(targets)
+        results = []
+        for nf_id in dict.fromkeys(requested):
+            if nf_id not in targets:
+                results.append({"nf_id": nf_id, "resultado": "nao_encontrada", "contrato_id": None, "itens_integrados": 0})
+                continue
+
+            status_nf, contrato = targets[nf_id]
+            results.append({
+                "nf_id": nf_id,
+                "resultado": "ja_validada" if status_nf == 'validado' else "validada",
+                "contrato_id": contrato,
+                "itens_integrados": pending_items.get(nf_id, 0)
+            })
 
-        monthly_stats = self.db.query(
-            extract('month', NotaFiscal.data_emissao).label('month'),
-            extract('year', NotaFiscal.data_emissao).label('year'),
-            func.count(NotaFiscal.id).label('count'),
-            func.sum(NotaFiscal.valor_total).label('value')
-        ).filter(
-            NotaFiscal.data_emissao >= twelve_months_ago
-        ).group_by(
-            extract('month', NotaFiscal.data_emissao),
-            extract('year', NotaFiscal.data_emissao)
-        ).order_by(
-            extract('year', NotaFiscal.data_emissao).desc(),
-            extract('month', NotaFiscal.data_emissao).desc()
-        ).all()
+        return results
 
-        # Converter nomes dos meses
-        month_names = {
-            1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun",
-            7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"
-        }
+    # === ESTATÍSTICAS ===
 
-        monthly_data = []
-        for month, year, count, value in monthly_stats:
-            monthly_data.append({
-                "month": month_names.get(int(month), f"Mês {month}"),
-                "year": int(year),
-                "count": count,
-                "value": float(value) if value else 0
-            })
+    def get_statistics(self) -> Dict[str, Any]:
+        """Calcula estatísticas das notas fiscais (servidas pelo motor de KPIs)"""
+        kpis = NFKpiEngine(self.db).get_snapshot()
+        status_distribution = kpis["status_distribution"]
 
         return {
-            "total_nfs": total_nfs,
+            "total_nfs": kpis["total_nfs"],
             "pending_validation": status_distribution.get("processado", 0),
             "validated": status_distribution.get("validado", 0),
             "rejected": status_distribution.get("erro", 0),
-            "total_value": total_value,
-            "monthly_stats": monthly_data,
+            "total_value": kpis["valor_total"],
+            "monthly_stats": kpis["monthly_stats"],
             "status_distribution": status_distribution
         }
 
@@ -256,7 +631,12 @@ class NotaFiscalService:
         ).all()
 
     def calculate_contract_realized_value(self, contract_id: int) -> Decimal:
-        """Calcula o valor realizado de um contrato baseado nas NFs integradas"""
+        """Valor realizado de um contrato (NFs validadas), lido do agregado por contrato"""
+        resumo = self.ledger.get(contract_id)
+        if resumo is not None:
+            return Decimal(resumo.valor_realizado)
+
+        # Contrato sem linha no agregado: calcular direto (contrato sem NFs ou agregado não reconstruído)
         result = self.db.query(func.sum(NotaFiscal.valor_total)).filter(
             and_(
                 NotaFiscal.contrato_id == contract_id,
@@ -266,6 +646,29 @@ class NotaFiscalService:
 
         return Decimal(result) if result else Decimal('0.00')
 
+    def get_contracts_realized_values(self, contract_ids: List[int]) -> Dict[int, Decimal]:
+        """Valor realizado de vários contratos com uma única leitura do agregado"""
+        valores = {
+            contract_id: Decimal(resumo.valor_realizado)
+            for contract_id, resumo in self.ledger.get_many(contract_ids).items()
+        }
+
+        # Contratos sem linha no agregado: uma soma agrupada para todos
+        faltantes = [contract_id for contract_id in contract_ids if contract_id not in valores]
+        if faltantes:
+            rows = self.db.query(
+                NotaFiscal.contrato_id,
+                func.sum(NotaFiscal.valor_total)
+            ).filter(
+                and_(
+                    NotaFiscal.contrato_id.in_(faltantes),
+                    NotaFiscal.status_processamento == 'validado'
+                )
+            ).group_by(NotaFiscal.contrato_id).all()
+            valores.update({contract_id: Decimal(total or 0) for contract_id, total in rows})
+
+        return {contract_id: valores.get(contract_id, Decimal('0.00')) for contract_id in contract_ids}
+
     # === PROCESSAMENTO LOGS ===
 
     def create_processing_log(self, log_data: ProcessamentoLogCreate) -> ProcessamentoLog:
@@ -280,20 +683,30 @@ class NotaFiscalService:
         self,
         skip: int = 0,
         limit: int = 10,
-        pasta_nome: Optional[str] = None
-    ) -> tuple[List[ProcessamentoLog], int]:
-        """Lista logs de processamento com filtros"""
+        pasta_nome: Optional[str] = None,
+        after: Optional[str] = None,
+        use_cursor: bool = False,
+        include_total: bool = True
+    ) -> tuple[List[ProcessamentoLog], Optional[int], Optional[str]]:
+        """Lista logs de processamento com filtros (offset ou keyset sobre created_at, id)"""
         query = self.db.query(ProcessamentoLog)
 
         if pasta_nome:
             query = query.filter(ProcessamentoLog.pasta_nome == pasta_nome)
 
-        query = query.order_by(ProcessamentoLog.created_at.desc())
+        cursor_mode = use_cursor or after is not None
+        total = query.count() if include_total or not cursor_mode else None
+
+        if cursor_mode:
+            logs, next_cursor = paginate_keyset(
+                query, ProcessamentoLog.created_at, ProcessamentoLog.id, limit, after=after
+            )
+            return logs, total, next_cursor
 
-        total = query.count()
+        query = query.order_by(ProcessamentoLog.created_at.desc())
         logs = query.offset(skip).limit(limit).all()
 
-        return logs, total
+        return logs, total, None
 
     def update_processing_log(
         self,
@@ -329,156 +742,88 @@ class NotaFiscalService:
 
     def classify_item_cost_center(self, item_id: int, description: str) -> Optional[int]:
         """Classifica automaticamente um item em centro de custo baseado na descrição"""
-        # Lógica simples de classificação por palavras-chave
-        cost_center_keywords = {
-            "materia_prima": ["cimento", "concreto", "areia", "brita", "cal", "gesso"],
-            "mao_de_obra": ["servico", "mao", "obra", "trabalhador", "pedreiro"],
-            "equipamento": ["equipamento", "ferramenta", "maquina", "betoneira"],
-            "transporte": ["frete", "transporte", "entrega", "logistica"]
-        }
-
-        description_lower = description.lower()
-        best_match = None
-        best_score = 0
-
-        for center_code, keywords in cost_center_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in description_lower)
-            if score > best_score:
-                best_score = score
-                best_match = center_code
-
-        if best_match and best_score > 0:
-            # Buscar centro de custo no banco
-            center = self.db.query(CostCenter).filter(
-                CostCenter.codigo == best_match
-            ).first()
-
-            if center:
-                # Atualizar item com classificação
-                item = self.db.query(NotaFiscalItem).filter(
-                    NotaFiscalItem.id == item_id
-                ).first()
-
-                if item:
-                    item.centro_custo_id = center.id
-                    item.score_classificacao = Decimal(str(min(95, best_score * 20)))
-                    item.fonte_classificacao = 'ai'
-                    item.updated_at = datetime.now()
-                    self.db.commit()
-                    return center.id
-
-        return None
+        result = CostCenterClassifier(self.db).classify_items(item_ids=[item_id], overwrite_manual=True)
+        return result["results"][0]["centro_custo_id"] if result["results"] else None
 
     # === KPIS AGREGADOS ===
 
     def calculate_global_kpis(self) -> Dict[str, Any]:
-        """Calcula KPIs globais baseados em todas as NFs e contratos"""
-
-        # Total de NFs por status
-        total_nfs = self.db.query(NotaFiscal).count()
-        nfs_validadas = self.db.query(NotaFiscal).filter(
-            NotaFiscal.status_processamento == 'validado'
-        ).count()
-        nfs_pendentes = self.db.query(NotaFiscal).filter(
-            NotaFiscal.status_processamento == 'processado'
-        ).count()
-        nfs_erro = self.db.query(NotaFiscal).filter(
-            NotaFiscal.status_processamento == 'erro'
-        ).count()
-
-        # Valor total das NFs validadas
-        total_valor_validado = self.db.query(func.sum(NotaFiscal.valor_total)).filter(
-            NotaFiscal.status_processamento == 'validado'
-        ).scalar() or 0
-
-        # Valor total pendente de validação
-        total_valor_pendente = self.db.query(func.sum(NotaFiscal.valor_total)).filter(
-            NotaFiscal.status_processamento == 'processado'
-        ).scalar() or 0
-
-        # Contratos com NFs
-        contratos_com_nfs = self.db.query(NotaFiscal.contrato_id).filter(
-            NotaFiscal.contrato_id.isnot(None)
-        ).distinct().count()
-
-        # NFs não classificadas por contrato
-        nfs_sem_contrato = self.db.query(NotaFiscal).filter(
-            NotaFiscal.contrato_id.is_(None)
-        ).count()
-
-        # Fornecedores únicos
-        fornecedores_unicos = self.db.query(NotaFiscal.cnpj_fornecedor).distinct().count()
-
-        # Valor médio por NF
-        valor_medio_nf = float(total_valor_validado) / nfs_validadas if nfs_validadas > 0 else 0
-
-        # Estatísticas por centro de custo
-        centros_custo_stats = self.db.query(
-            CostCenter.nome,
-            func.count(NotaFiscalItem.id).label('total_itens'),
-            func.sum(NotaFiscalItem.valor_total).label('valor_total')
-        ).join(
-            NotaFiscalItem, CostCenter.id == NotaFiscalItem.centro_custo_id
-        ).join(
-            NotaFiscal, NotaFiscalItem.nota_fiscal_id == NotaFiscal.id
-        ).filter(
-            NotaFiscal.status_processamento == 'validado'
-        ).group_by(CostCenter.nome).all()
-
-        centros_custo_data = []
-        for nome, total_itens, valor_total in centros_custo_stats:
-            centros_custo_data.append({
-                "nome": nome,
-                "total_itens": total_itens,
-                "valor_total": float(valor_total or 0)
-            })
+        """Calcula KPIs globais baseados em todas as NFs e contratos (servidos pelo motor de KPIs)"""
+        kpis = NFKpiEngine(self.db).get_snapshot()
+
+        total_nfs = kpis["total_nfs"]
+        nfs_validadas = kpis["nfs_validadas"]
 
         return {
             "resumo_nfs": {
                 "total": total_nfs,
                 "validadas": nfs_validadas,
-                "pendentes": nfs_pendentes,
-                "com_erro": nfs_erro,
+                "pendentes": kpis["nfs_pendentes"],
+                "com_erro": kpis["nfs_erro"],
                 "taxa_validacao": (nfs_validadas / total_nfs * 100) if total_nfs > 0 else 0
             },
             "valores": {
-                "total_validado": float(total_valor_validado),
-                "total_pendente": float(total_valor_pendente),
-                "valor_medio_nf": valor_medio_nf
+                "total_validado": kpis["valor_validado"],
+                "total_pendente": kpis["valor_pendente"],
+                "valor_medio_nf": kpis["valor_validado"] / nfs_validadas if nfs_validadas > 0 else 0
             },
             "contratos": {
-                "contratos_com_nfs": contratos_com_nfs,
-                "nfs_sem_contrato": nfs_sem_contrato
+                "contratos_com_nfs": kpis["contratos_com_nfs"],
+                "nfs_sem_contrato": kpis["nfs_sem_contrato"]
             },
             "fornecedores": {
-                "fornecedores_unicos": fornecedores_unicos
+                "fornecedores_unicos": kpis["fornecedores_unicos"]
             },
-            "centros_custo": centros_custo_data,
-            "generated_at": datetime.now().isoformat()
+            "centros_custo": kpis["centros_custo"],
+            "generated_at": kpis["generated_at"]
         }
 
-    def get_contracts_summary_with_nfs(self) -> List[Dict[str, Any]]:
-        """Retorna sumário de todos os contratos com informações das NFs"""
+    def get_contracts_summary_with_nfs(
+        self,
+        skip: int = 0,
+        limit: Optional[int] = None,
+        status_filter: Optional[str] = None,
+        cliente: Optional[str] = None,
+        only_with_nfs: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Retorna sumário dos contratos com informações das NFs
+        Uma única consulta: agregação condicional das NFs por contrato unida aos contratos
+        """
+        validado = NotaFiscal.status_processamento == 'validado'
+
+        nf_totais = self.db.query(
+            NotaFiscal.contrato_id.label('contrato_id'),
+            func.count(NotaFiscal.id).label('total_nfs'),
+            func.sum(case((validado, 1), else_=0)).label('nfs_validadas'),
+            func.sum(case((validado, NotaFiscal.valor_total), else_=0)).label('valor_realizado')
+        ).filter(
+            NotaFiscal.contrato_id.isnot(None)
+        ).group_by(NotaFiscal.contrato_id).subquery()
 
-        contracts = self.db.query(Contract).all()
-        contracts_summary = []
+        query = self.db.query(
+            Contract,
+            func.coalesce(nf_totais.c.total_nfs, 0),
+            func.coalesce(nf_totais.c.nfs_validadas, 0),
+            func.coalesce(nf_totais.c.valor_realizado, 0)
+        ).outerjoin(nf_totais, nf_totais.c.contrato_id == Contract.id)
 
-        for contract in contracts:
-            # Buscar NFs do contrato
-            nfs_count = self.db.query(NotaFiscal).filter(
-                NotaFiscal.contrato_id == contract.id
-            ).count()
+        if status_filter:
+            query = query.filter(Contract.status == status_filter)
 
-            nfs_validadas = self.db.query(NotaFiscal).filter(
-                and_(
-                    NotaFiscal.contrato_id == contract.id,
-                    NotaFiscal.status_processamento == 'validado'
-                )
-            ).count()
+        if cliente:
+            query = query.filter(contains(Contract.cliente, cliente))
+
+        if only_with_nfs:
+            query = query.filter(nf_totais.c.total_nfs > 0)
 
-            # Calcular valor realizado
-            valor_realizado = self.calculate_contract_realized_value(contract.id)
+        query = query.order_by(Contract.id).offset(skip)
+        if limit is not None:
+            query = query.limit(limit)
+
+        contracts_summary = []
 
+        for contract, nfs_count, nfs_validadas, valor_realizado in query.all():
             contracts_summary.append({
                 "id": contract.id,
                 "numero_contrato": contract.numero_contrato,
@@ -496,4 +841,4 @@ class NotaFiscalService:
                 "data_fim_prevista": contract.data_fim_prevista.strftime("%Y-%m-%d") if contract.data_fim_prevista else None
             })
 
-        return contracts_summary
\ No newline at end of file
+        return contracts_summary
@@ -0,0 +1,262 @@
+"""
+Parser único de XML de NF-e.
+
+Uma passada por documento com XMLPullParser (iterparse incremental): ao
+fechar cada bloco de interesse (ide, emit, det, ICMSTot, ...) seus filhos
+diretos são lidos uma vez por tabelas pré-montadas com as tags já
+qualificadas (com e sem namespace), sem buscas `find()`/`.//`. Os blocos são
+limpos ao fechar, então a memória não cresce com a quantidade de itens.
+"""
+
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, IO, Optional, Union
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+
+
+CHUNK_SIZE = 64 * 1024
+NFE_NAMESPACE = "{http://www.portalfiscal.inf.br/nfe}"
+
+IDE_FIELDS = {
+    "nNF": "numero",
+    "serie": "serie",
+    "dhEmi": "data_emissao",
+    "dEmi": "data_emissao",
+    "dhSaiEnt": "data_entrada",
+    "dSaiEnt": "data_entrada",
+    "natOp": "natureza_operacao",
+}
+EMIT_FIELDS = {
+    "CNPJ": "cnpj_emitente",
+    "CPF": "cnpj_emitente",
+    "xNome": "nome_emitente",
+    "xFant": "nome_fantasia_emitente",
+}
+DEST_FIELDS = {
+    "CNPJ": "cnpj_destinatario",
+    "CPF": "cnpj_destinatario",
+    "xNome": "nome_destinatario",
+}
+PROT_FIELDS = {
+    "chNFe": "chave_acesso",
+}
+TOTAL_FIELDS = {
+    "vProd": "valor_produtos",
+    "vFrete": "valor_frete",
+    "vSeg": "valor_seguro",
+    "vDesc": "valor_desconto",
+    "vOutro": "valor_outros",
+    "vICMS": "valor_icms",
+    "vST": "valor_icms_st",
+    "vIPI": "valor_ipi",
+    "vPIS": "valor_pis",
+    "vCOFINS": "valor_cofins",
+    "vTotTrib": "valor_tributos",
+    "vNF": "valor_total",
+}
+ITEM_FIELDS = {
+    "cProd": "codigo_produto",
+    "xProd": "descricao",
+    "NCM": "ncm",
+    "CFOP": "cfop",
+    "uCom": "unidade",
+    "qCom": "quantidade",
+    "vUnCom": "valor_unitario",
+    "vProd": "valor_total",
+    "pesoL": "peso_liquido",
+    "pesoB": "peso_bruto",
+}
+# Pesos do transporte (somados entre os volumes)
+VOLUME_FIELDS = {
+    "pesoL": "peso_liquido",
+    "pesoB": "peso_bruto",
+}
+
+DECIMAL_FIELDS = {
+    "quantidade", "valor_unitario", "valor_total", "peso_liquido", "peso_bruto",
+    *TOTAL_FIELDS.values()
+}
+DATETIME_FIELDS = {"data_emissao", "data_entrada"}
+
+# Impostos somados quando a NF não informa vTotTrib
+TAX_FIELDS = ("valor_icms", "valor_icms_st", "valor_ipi", "valor_pis", "valor_cofins")
+
+
+def _qualified(mapping: Dict[str, Any]) -> Dict[str, Any]:
+    """Tabela indexada pela tag como o parser a entrega, com e sem namespace"""
+    return {prefix + tag: field for tag, field in mapping.items() for prefix in (NFE_NAMESPACE, "")}
+
+
+# Containers do cabeçalho: ao fechar, seus filhos diretos são lidos pela tabela
+HEADER_CONTAINERS = _qualified({
+    "ide": _qualified(IDE_FIELDS),
+    "emit": _qualified(EMIT_FIELDS),
+    "dest": _qualified(DEST_FIELDS),
+    "infProt": _qualified(PROT_FIELDS),
+    "ICMSTot": _qualified(TOTAL_FIELDS),
+})
+
+ITEM_TAGS = _qualified({"det": "det"})
+PROD_TAGS = _qualified({"prod": "prod"})
+VOLUME_TAGS = _qualified({"vol": "vol"})
+INF_NFE_TAGS = _qualified({"infNFe": "infNFe"})
+QUALIFIED_ITEM_FIELDS = _qualified(ITEM_FIELDS)
+QUALIFIED_VOLUME_FIELDS = _qualified(VOLUME_FIELDS)
+
+# Blocos sem dados de interesse: apenas liberados ao fechar
+DISCARD_TAGS = _qualified({tag: tag for tag in ("transp", "cobr", "pag", "infAdic", "Signature", "autXML")})
+
+
+def _to_decimal(text: str) -> Optional[Decimal]:
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+
+def _to_datetime(text: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _convert(field: str, text: Optional[str]) -> Any:
+    if text is None:
+        return None
+    text = text.strip()
+    if field in DECIMAL_FIELDS:
+        return _to_decimal(text)
+    if field in DATETIME_FIELDS:
+        return _to_datetime(text)
+    return text
+
+
+def _read_fields(elem: ET.Element, fields: Dict[str, str], target: Dict[str, Any]) -> None:
+    for child in elem:
+        field = fields.get(child.tag)
+        if field is not None:
+            target[field] = _convert(field, child.text)
+
+
+def parse_nfe(source: Union[bytes, str, IO]) -> Dict[str, Any]:
+    """
+    Extrai cabeçalho, emitente, chave de acesso, totais, pesos e itens de uma
+    NF-e (nfeProc ou NFe, com ou sem namespace). Aceita bytes, str ou um
+    arquivo/stream, que é lido em blocos. XML malformado gera ET.ParseError.
+    """
+    parser = ET.XMLPullParser(events=("end",))
+    nfe: Dict[str, Any] = {"itens": []}
+    itens = nfe["itens"]
+
+    def handle(events) -> None:
+        for _, elem in events:
+            tag = elem.tag
+
+            if tag in ITEM_TAGS:
+                item = {"numero_item": int(elem.get("nItem") or len(itens) + 1)}
+                for child in elem:
+                    if child.tag in PROD_TAGS:
+                        _read_fields(child, QUALIFIED_ITEM_FIELDS, item)
+                itens.append(item)
+                elem.clear()
+            elif tag in HEADER_CONTAINERS:
+                _read_fields(elem, HEADER_CONTAINERS[tag], nfe)
+                elem.clear()
+            elif tag in VOLUME_TAGS:
+                volume: Dict[str, Any] = {}
+                _read_fields(elem, QUALIFIED_VOLUME_FIELDS, volume)
+                for field, value in volume.items():
+                    if value is not None:
+                        nfe[field] = nfe.get(field, Decimal("0")) + value
+                elem.clear()
+            elif tag in INF_NFE_TAGS:
+                if elem.get("Id"):
+                    nfe.setdefault("chave_acesso", elem.get("Id")[-44:])
+                elem.clear()
+            elif tag in DISCARD_TAGS:
+                elem.clear()
+
+    if isinstance(source, (bytes, str)):
+        parser.feed(source)
+        handle(parser.read_events())
+    else:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            handle(parser.read_events())
+
+    parser.close()
+    handle(parser.read_events())
+
+    if nfe.get("valor_tributos") is not None:
+        nfe["valor_impostos"] = nfe["valor_tributos"]
+    else:
+        nfe["valor_impostos"] = sum((nfe.get(field) or Decimal("0") for field in TAX_FIELDS), Decimal("0"))
+
+    return nfe
+
+
+def parse_invoice_xml(content: Union[bytes, str, IO]) -> Optional[Dict[str, Any]]:
+    """
+    Formato usado pelo InvoiceProcessingService (numero_nf, fornecedor,
+    valor_total, data_emissao, items); retorna None se o XML for inválido
+    """
+    try:
+        nfe = parse_nfe(content)
+    except Exception as e:
+        print(f"Erro ao processar XML: {str(e)}")
+        return None
+
+    return {
+        'numero_nf': nfe.get('numero'),
+        'fornecedor': nfe.get('nome_emitente'),
+        'cnpj_fornecedor': nfe.get('cnpj_emitente'),
+        'chave_acesso': nfe.get('chave_acesso'),
+        'valor_total': nfe.get('valor_total') or Decimal('0'),
+        'data_emissao': nfe.get('data_emissao') or datetime.now(),
+        'items': [
+            {
+                'descricao': item.get('descricao') or 'Item não identificado',
+                'quantidade': item.get('quantidade'),
+                'valor_unitario': item.get('valor_unitario'),
+                'valor_total': item.get('valor_total') or Decimal('0'),
+                'unidade': item.get('unidade'),
+                'ncm': item.get('ncm'),
+                'centro_custo': 'Não Classificado'  # Will be classified later
+            }
+            for item in nfe['itens']
+        ]
+    }
+
+
+def parse_nfe_data(content: Union[bytes, str, IO]) -> Dict[str, Any]:
+    """
+    Formato usado pelo DataImportService (numero, data_emissao, valor_total,
+    itens); campos obrigatórios ausentes geram ValueError
+    """
+    try:
+        nfe = parse_nfe(content)
+        if not nfe.get('numero') or nfe.get('data_emissao') is None or nfe.get('valor_total') is None:
+            raise ValueError("nNF, dhEmi e vNF são obrigatórios")
+
+        return {
+            'numero': nfe['numero'],
+            'data_emissao': nfe['data_emissao'].replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None),
+            'valor_total': nfe['valor_total'],
+            'itens': [
+                {
+                    'descricao': item['descricao'],
+                    'unidade': item['unidade'],
+                    'quantidade': item['quantidade'],
+                    'valor_unitario': item['valor_unitario'],
+                    'valor_total': item['valor_total']
+                }
+                for item in nfe['itens']
+            ]
+        }
+
+    except Exception as e:
+        raise ValueError(f"Erro ao extrair dados da NF-e: {str(e)}")
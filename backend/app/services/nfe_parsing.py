@@ -0,0 +1,132 @@
+"""
+Parsing de XMLs de NF-e em um pool de processos.
+
+As funções de parsing (app.services.nfe_parser) são de módulo, portanto
+picláveis, e devolvem dicts simples; o processo principal continua sendo o
+único a gravar no banco. Assim o trabalho de CPU do parsing não bloqueia o
+event loop da API.
+
+Se um worker morrer (OOM em um arquivo enorme, crash no pypdf), o pool inteiro
+fica quebrado: ele é então descartado e recriado, e cada documento afetado é
+tentado mais uma vez no pool novo; se quebrar de novo, o documento entra como
+erro daquele arquivo em vez de derrubar o parsing dos demais.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, Tuple, TypeVar, Union
+
+from app.core.config import settings
+from app.services.nfe_parser import parse_invoice_xml, parse_nfe, parse_nfe_data  # noqa: F401
+from app.services.danfe_parser import DanfeNeedsXml, parse_invoice_pdf  # noqa: F401
+
+
+T = TypeVar("T")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def get_parse_workers() -> int:
+    """Quantidade de processos do pool (NFE_PARSE_WORKERS; 0 = um por núcleo)"""
+    return settings.nfe_parse_workers or os.cpu_count() or 1
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Pool de parsing compartilhado, criado no primeiro uso"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=get_parse_workers())
+        return _executor
+
+
+def _replace_broken_executor(broken: ProcessPoolExecutor) -> None:
+    """Descarta o pool quebrado; o próximo get_parse_executor cria outro"""
+    global _executor
+    with _executor_lock:
+        # Outro documento do mesmo pool pode já ter feito a troca
+        if _executor is broken:
+            logger.warning("Pool de parsing quebrado (worker encerrado); recriando")
+            broken.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+async def _retry_in_new_pool(broken: ProcessPoolExecutor, fn: Callable[..., T], *args) -> T:
+    """Segunda e última tentativa de um documento cujo pool quebrou"""
+    _replace_broken_executor(broken)
+    executor = get_parse_executor()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    except BrokenProcessPool:
+        _replace_broken_executor(executor)
+        raise
+
+
+def shutdown_parse_executor() -> None:
+    """Encerra o pool (chamado no shutdown da aplicação)"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+async def run_in_parse_pool(fn: Callable[..., T], *args) -> T:
+    """
+    Executa uma função de parsing no pool sem bloquear o event loop; se o pool
+    quebrar, tenta mais uma vez em um pool novo
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_parse_executor()
+    try:
+        return await loop.run_in_executor(executor, fn, *args)
+    except BrokenProcessPool:
+        return await _retry_in_new_pool(executor, fn, *args)
+
+
+async def parse_in_pool(
+    fn: Callable[[Any], T],
+    documents: Iterable[Tuple[Any, Any]],
+    window: Optional[int] = None
+) -> AsyncIterator[Tuple[Any, Union[T, BaseException]]]:
+    """
+    Distribui os documentos `(chave, conteúdo)` pelo pool e entrega
+    `(chave, resultado ou exceção)` na ordem de entrada.
+
+    No máximo `window` documentos (padrão: 2 por worker) ficam em voo, então a
+    memória não cresce com o tamanho do lote mesmo que `documents` seja lazy.
+    Documentos em voo quando o pool quebra são tentados de novo, um a um, em
+    um pool novo; o que quebrar o pool outra vez é entregue como exceção.
+    """
+    loop = asyncio.get_running_loop()
+    window = window or get_parse_workers() * 2
+    pending: deque = deque()
+
+    async def next_result():
+        key, content, executor, future = pending.popleft()
+        try:
+            return key, await future
+        except BrokenProcessPool:
+            try:
+                return key, await _retry_in_new_pool(executor, fn, content)
+            except Exception as e:
+                return key, e
+        except Exception as e:
+            return key, e
+
+    for key, content in documents:
+        executor = get_parse_executor()
+        pending.append((key, content, executor, loop.run_in_executor(executor, fn, content)))
+        if len(pending) >= window:
+            yield await next_result()
+
+    while pending:
+        yield await next_result()
@@ -0,0 +1,322 @@
+"""
+Busca de arquivos de pastas compartilhadas do OneDrive/SharePoint.
+
+FolderFetcher é a interface usada pelo InvoiceProcessingService: lista a pasta
+(paginada) e entrega os downloads à medida que terminam, com no máximo
+`max_concurrency` em andamento, para que o parsing comece antes de a pasta
+inteira ser baixada. GraphFolderFetcher implementa a interface sobre a API de
+compartilhamentos do Microsoft Graph (`/shares/{token}/driveItem`), com um
+único httpx.AsyncClient (keep-alive, pool de conexões) por ingestão e novas
+tentativas com backoff exponencial em erros de rede, 429 e 5xx.
+
+Autenticação: com ONEDRIVE_TENANT_ID/CLIENT_ID/CLIENT_SECRET o token vem do
+fluxo OAuth client credentials, fica em cache no processo até perto de expirar
+e é renovado uma vez se o Graph responder 401. ONEDRIVE_ACCESS_TOKEN (token
+fixo) serve para o stand-in e testes; no Graph real ele expira em cerca de uma
+hora e as ingestões passam a falhar com uma mensagem de token expirado.
+
+Para desenvolvimento, `onedrive_standin.py` (raiz do backend) serve uma pasta
+local no mesmo formato do Graph; basta apontar ONEDRIVE_GRAPH_URL para ele.
+"""
+
+import asyncio
+import base64
+import random
+import time
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional, Tuple, Union
+
+import httpx
+
+from app.core.config import settings
+
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+# Renova o token um pouco antes de expirar, para não vencer no meio de uma ingestão
+TOKEN_EXPIRY_MARGIN_SECONDS = 300
+
+# (url do token, client id) -> (access token, instante de expiração em time.monotonic)
+_token_cache: Dict[Tuple[str, str], Tuple[str, float]] = {}
+
+
+class RemoteFile(NamedTuple):
+    id: str
+    name: str
+    size: Optional[int]
+    download_url: str
+
+
+class OneDriveError(Exception):
+    """Falha ao listar ou baixar arquivos do OneDrive (após as novas tentativas)"""
+
+
+def share_token(folder_url: str) -> str:
+    """Token de compartilhamento do Graph: 'u!' + base64url da URL, sem padding"""
+    encoded = base64.urlsafe_b64encode(folder_url.encode()).decode().rstrip("=")
+    return f"u!{encoded}"
+
+
+class FolderFetcher:
+    """
+    Interface de busca de uma pasta remota. Uso:
+        async with fetcher:
+            async for remote, content in fetcher.iter_downloads(url, extensions):
+                ...  # content são os bytes ou a exceção do download
+    """
+
+    max_concurrency: int = 1
+
+    async def __aenter__(self) -> "FolderFetcher":
+        return self
+
+    async def __aexit__(self, *_exc) -> None:
+        return None
+
+    def list_files(self, folder_url: str) -> AsyncIterator[RemoteFile]:
+        raise NotImplementedError
+
+    async def download(self, remote: RemoteFile) -> bytes:
+        raise NotImplementedError
+
+    async def iter_downloads(
+        self,
+        folder_url: str,
+        extensions: Tuple[str, ...] = ()
+    ) -> AsyncIterator[Tuple[RemoteFile, Union[bytes, BaseException]]]:
+        """
+        Lista a pasta e baixa os arquivos com `extensions` (todos, se vazio),
+        entregando cada um assim que termina. A listagem avança conforme
+        abrem vagas, então nem a lista nem os conteúdos ficam inteiros em memória.
+        """
+        pending: set = set()
+        listing = self.list_files(folder_url).__aiter__()
+        listing_done = False
+
+        async def fetch(remote: RemoteFile) -> Tuple[RemoteFile, Union[bytes, BaseException]]:
+            try:
+                return remote, await self.download(remote)
+            except Exception as e:
+                return remote, e
+
+        try:
+            while True:
+                while not listing_done and len(pending) < self.max_concurrency:
+                    try:
+                        remote = await listing.__anext__()
+                    except StopAsyncIteration:
+                        listing_done = True
+                        break
+                    if not extensions or remote.name.lower().endswith(extensions):
+                        pending.add(asyncio.create_task(fetch(remote)))
+
+                if not pending:
+                    return
+
+                finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+class GraphFolderFetcher(FolderFetcher):
+    """Pasta compartilhada via Microsoft Graph (`/shares/{token}/driveItem/children`)"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        access_token: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff_seconds: Optional[float] = None,
+        max_file_bytes: Optional[int] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = (base_url or settings.onedrive_graph_url).rstrip("/")
+        self.access_token = access_token if access_token is not None else settings.onedrive_access_token
+        self.tenant_id = tenant_id if tenant_id is not None else settings.onedrive_tenant_id
+        self.client_id = client_id if client_id is not None else settings.onedrive_client_id
+        self.client_secret = client_secret if client_secret is not None else settings.onedrive_client_secret
+        self.max_concurrency = max_concurrency or settings.onedrive_max_concurrency
+        self.max_retries = max_retries if max_retries is not None else settings.onedrive_max_retries
+        self.backoff_seconds = backoff_seconds if backoff_seconds is not None else settings.onedrive_retry_backoff_seconds
+        self.max_file_bytes = max_file_bytes or settings.invoice_zip_max_member_mb * 1024 * 1024
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> "GraphFolderFetcher":
+        # Um cliente por ingestão: as conexões ficam abertas entre listagem e downloads
+        self.client = httpx.AsyncClient(
+            timeout=settings.onedrive_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency + 1,
+                max_keepalive_connections=self.max_concurrency + 1
+            ),
+            follow_redirects=True,
+            transport=self.transport
+        )
+        return self
+
+    async def __aexit__(self, *_exc) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    @property
+    def uses_client_credentials(self) -> bool:
+        return bool(self.tenant_id and self.client_id and self.client_secret)
+
+    async def _token(self, refresh: bool = False) -> Optional[str]:
+        """Token da API: client credentials (em cache até perto de expirar) ou o token fixo"""
+        if not self.uses_client_credentials:
+            return self.access_token or None
+
+        token_url = settings.onedrive_token_url.format(tenant_id=self.tenant_id)
+        cache_key = (token_url, self.client_id)
+        cached = _token_cache.get(cache_key)
+        if cached and not refresh and cached[1] > time.monotonic():
+            return cached[0]
+
+        try:
+            response = await self.client.post(token_url, data={
+                "grant_type": "client_credentials",
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "scope": GRAPH_SCOPE,
+            })
+            response.raise_for_status()
+            payload = response.json()
+            token = payload["access_token"]
+            expires_in = float(payload.get("expires_in", 3600))
+        except httpx.HTTPStatusError as e:
+            raise OneDriveError(f"Falha ao obter token do Microsoft Graph ({e.response.status_code}); confira ONEDRIVE_TENANT_ID, ONEDRIVE_CLIENT_ID e ONEDRIVE_CLIENT_SECRET")
+        except httpx.TransportError as e:
+            raise OneDriveError(f"Erro de conexão ao obter token do Microsoft Graph: {str(e)}")
+        except (KeyError, ValueError):
+            raise OneDriveError("Resposta inválida do servidor de tokens do Microsoft Graph")
+
+        _token_cache[cache_key] = (token, time.monotonic() + max(expires_in - TOKEN_EXPIRY_MARGIN_SECONDS, 0))
+        return token
+
+    async def _headers(self, url: str, refresh: bool = False) -> Dict[str, str]:
+        # downloadUrl do Graph já é pré-autenticada; o token só vai para a própria API
+        if not url.startswith(self.base_url):
+            return {}
+        token = await self._token(refresh)
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    async def _refresh_token(self, url: str) -> bool:
+        """Após um 401 da API, renova o token do aplicativo (uma vez por requisição); False se não há como renovar"""
+        if not self.uses_client_credentials or not url.startswith(self.base_url):
+            return False
+        await self._token(refresh=True)
+        return True
+
+    def _unauthorized(self) -> OneDriveError:
+        if self.uses_client_credentials:
+            return OneDriveError("Microsoft Graph recusou o token do aplicativo (401); confira as permissões de ONEDRIVE_CLIENT_ID")
+        if self.access_token:
+            return OneDriveError("Token do Microsoft Graph expirado ou inválido (401); configure ONEDRIVE_TENANT_ID, ONEDRIVE_CLIENT_ID e ONEDRIVE_CLIENT_SECRET para renovação automática")
+        return OneDriveError("Token do Microsoft Graph ausente (401); configure ONEDRIVE_TENANT_ID, ONEDRIVE_CLIENT_ID e ONEDRIVE_CLIENT_SECRET")
+
+    async def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> None:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random() / 2)
+        await asyncio.sleep(delay)
+
+    async def _get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        refreshed = False
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = await self.client.get(url, params=params, headers=await self._headers(url))
+                if response.status_code == 401 and not refreshed and await self._refresh_token(url):
+                    refreshed = True
+                    continue
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise OneDriveError(f"Erro de conexão com o OneDrive: {str(e)}")
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 401 and url.startswith(self.base_url):
+                    raise self._unauthorized()
+                raise OneDriveError(f"OneDrive respondeu {e.response.status_code} para {url}")
+
+            if attempt == self.max_retries:
+                raise OneDriveError(f"OneDrive indisponível ({response.status_code}) após {attempt + 1} tentativas")
+            await self._retry_delay(attempt, response)
+
+        raise OneDriveError("Falha ao acessar o OneDrive")
+
+    async def list_files(self, folder_url: str) -> AsyncIterator[RemoteFile]:
+        """Arquivos da pasta (sem subpastas), página a página via @odata.nextLink"""
+        url = f"{self.base_url}/shares/{share_token(folder_url)}/driveItem/children"
+        params: Optional[Dict[str, Any]] = {
+            "$top": settings.onedrive_page_size,
+            "$select": "id,name,size,file,parentReference,@microsoft.graph.downloadUrl",
+        }
+
+        while url:
+            page = await self._get_json(url, params)
+            for item in page.get("value", []):
+                if "file" not in item:
+                    continue
+                download_url = item.get("@microsoft.graph.downloadUrl") or (
+                    f"{self.base_url}/drives/{item['parentReference']['driveId']}/items/{item['id']}/content"
+                )
+                yield RemoteFile(item["id"], item["name"], item.get("size"), download_url)
+
+            # O nextLink já traz os parâmetros da próxima página
+            url, params = page.get("@odata.nextLink"), None
+
+    async def download(self, remote: RemoteFile) -> bytes:
+        """Baixa em stream, abortando se passar do limite por arquivo"""
+        if remote.size is not None and remote.size > self.max_file_bytes:
+            raise OneDriveError(f"Arquivo excede {self.max_file_bytes // (1024 * 1024)}MB")
+
+        refreshed = False
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                headers = await self._headers(remote.download_url)
+                async with self.client.stream("GET", remote.download_url, headers=headers) as response:
+                    if response.status_code == 401 and not refreshed and await self._refresh_token(remote.download_url):
+                        refreshed = True
+                        continue
+                    if response.status_code not in RETRY_STATUS:
+                        response.raise_for_status()
+                        chunks = []
+                        received = 0
+                        async for chunk in response.aiter_bytes():
+                            received += len(chunk)
+                            if received > self.max_file_bytes:
+                                raise OneDriveError(f"Arquivo excede {self.max_file_bytes // (1024 * 1024)}MB")
+                            chunks.append(chunk)
+                        return b"".join(chunks)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise OneDriveError(f"Erro de conexão ao baixar: {str(e)}")
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 401 and remote.download_url.startswith(self.base_url):
+                    raise self._unauthorized()
+                raise OneDriveError(f"OneDrive respondeu {e.response.status_code} ao baixar")
+
+            if attempt == self.max_retries:
+                raise OneDriveError(f"OneDrive indisponível ({response.status_code}) após {attempt + 1} tentativas")
+            await self._retry_delay(attempt, response)
+
+        raise OneDriveError("Falha ao baixar arquivo do OneDrive")
+
+
+def get_folder_fetcher() -> FolderFetcher:
+    """Fetcher configurado (ONEDRIVE_GRAPH_URL pode apontar para o onedrive_standin.py)"""
+    return GraphFolderFetcher()
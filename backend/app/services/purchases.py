@@ -4,6 +4,7 @@ from typing import List, Optional
 from decimal import Decimal
 from app.models.purchases import Supplier, PurchaseOrder, PurchaseOrderItem, Quotation, Invoice, InvoiceItem
 from app.models.contracts import Contract
+from app.services.dashboard_cache import TAG_PURCHASES, invalidate_dashboards
 from app.schemas.purchases import (
     SupplierCreate, PurchaseOrderCreate, QuotationCreate, InvoiceCreate
 )
@@ -30,6 +31,7 @@ class PurchaseService:
         supplier = Supplier(**supplier_data.dict())
         self.db.add(supplier)
         self.db.commit()
+        invalidate_dashboards(TAG_PURCHASES)
         self.db.refresh(supplier)
         return supplier
 
@@ -44,6 +46,7 @@ class PurchaseService:
         if supplier:
             supplier.is_approved = True
             self.db.commit()
+            invalidate_dashboards(TAG_PURCHASES)
             self.db.refresh(supplier)
         return supplier
 
@@ -115,6 +118,7 @@ class PurchaseService:
             self.db.add(quotation)
 
         self.db.commit()
+        invalidate_dashboards(TAG_PURCHASES)
         return purchase_order
 
     def get_purchase_orders(
@@ -156,6 +160,7 @@ class PurchaseService:
         purchase_order.valor_total = quotation.valor_total
 
         self.db.commit()
+        invalidate_dashboards(TAG_PURCHASES)
         self.db.refresh(quotation)
         return quotation
 
@@ -204,6 +209,7 @@ class PurchaseService:
             self.db.add(item)
 
         self.db.commit()
+        invalidate_dashboards(TAG_PURCHASES)
         return invoice
 
     def get_invoices(
@@ -224,5 +230,6 @@ class PurchaseService:
         if invoice:
             invoice.data_pagamento = func.now()
             self.db.commit()
+            invalidate_dashboards(TAG_PURCHASES)
             self.db.refresh(invoice)
         return invoice
\ No newline at end of file
@@ -0,0 +1,32 @@
+"""
+Worker Celery dos jobs de ingestão (JOB_RUNNER=celery).
+
+    celery -A app.worker worker --loglevel=info
+"""
+
+import asyncio
+from celery import Celery
+from celery.signals import worker_shutdown
+
+from app.core.config import settings
+from app.services.ingest_jobs import run_job
+from app.services.nfe_parsing import shutdown_parse_executor
+
+
+celery_app = Celery("gestor", broker=settings.redis_url, backend=settings.redis_url)
+celery_app.conf.update(
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+
+@celery_app.task(name="ingest_jobs.run")
+def run_ingest_job(job_id: str) -> None:
+    """Executa o job no worker; estado e progresso vão para ingest_jobs"""
+    asyncio.run(run_job(job_id))
+
+
+@worker_shutdown.connect
+def shutdown_workers(**_kwargs) -> None:
+    # O pool de parsing é reaproveitado entre tarefas e encerrado com o worker
+    shutdown_parse_executor()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark do sumário de contratos com NFs (GET /api/v1/nf/contracts/summary).
+Compara NotaFiscalService.get_contracts_summary_with_nfs (uma consulta
+agrupada com agregação condicional) com a versão antiga, que fazia três
+consultas por contrato, medindo tempo e idas ao banco em um SQLite temporário.
+
+As idas ao banco não dependem do dialeto; no PostgreSQL cada uma ainda paga a
+latência da rede, então a diferença de tempo é maior que a medida aqui.
+
+Uso: python benchmark_contracts_summary.py [contratos] [nfs_por_contrato] [repetições]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, create_engine, event, func, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+import app.models  # noqa: F401 (registra todas as tabelas)
+from app.models.contracts import Contract
+from app.models.notas_fiscais import NotaFiscal
+from app.models.users import User
+from app.services.nf_service import NotaFiscalService
+
+
+def seed(db, contracts: int, nfs_per_contract: int) -> None:
+    user = User(email="bench@gmx", username="bench", password="x", role="admin", isActive=True)
+    db.add(user)
+    db.flush()
+
+    db.execute(insert(Contract), [
+        {
+            "numero_contrato": f"C{index:05d}", "nome_projeto": f"Projeto {index}", "cliente": f"Cliente {index % 50}",
+            "tipo_contrato": "material", "valor_original": Decimal("500000"), "meta_reducao_percentual": 0,
+            "status": "Em Andamento", "data_inicio": datetime(2024, 1, 1), "criado_por": user.id
+        }
+        for index in range(contracts)
+    ])
+    contract_ids = [contract_id for (contract_id,) in db.query(Contract.id)]
+
+    rows = [
+        {
+            "numero": f"{contract_id}-{index}", "serie": "1", "cnpj_fornecedor": "00000000000100",
+            "nome_fornecedor": "Fornecedor", "valor_total": Decimal("1000.00"),
+            "data_emissao": datetime(2024, 1, 1 + index % 28), "pasta_origem": "pasta",
+            "status_processamento": "validado" if index % 3 == 0 else "processado", "contrato_id": contract_id
+        }
+        for contract_id in contract_ids
+        for index in range(nfs_per_contract)
+    ]
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(NotaFiscal), rows[start:start + 5000])
+    db.commit()
+
+
+def summary_per_contract(db):
+    """Versão antiga: todos os contratos e três consultas para cada um"""
+    summary = []
+    for contract in db.query(Contract).all():
+        total = db.query(NotaFiscal).filter(NotaFiscal.contrato_id == contract.id).count()
+        validadas = db.query(NotaFiscal).filter(and_(
+            NotaFiscal.contrato_id == contract.id,
+            NotaFiscal.status_processamento == 'validado'
+        )).count()
+        valor = db.query(func.sum(NotaFiscal.valor_total)).filter(and_(
+            NotaFiscal.contrato_id == contract.id,
+            NotaFiscal.status_processamento == 'validado'
+        )).scalar()
+        summary.append((contract.id, total, validadas, Decimal(valor or 0)))
+    return summary
+
+
+def measure(engine, db, label: str, call, repeat: int):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        timings = []
+        for _ in range(repeat):
+            db.expire_all()
+            started = time.perf_counter()
+            result = call()
+            timings.append(time.perf_counter() - started)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    best = min(timings)
+    print(f"{label:<34} {best * 1000:>10.1f} ms {len(statements) // repeat:>8} consultas")
+    return result
+
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:]]
+    contracts = args[0] if len(args) > 0 else 2000
+    nfs_per_contract = args[1] if len(args) > 1 else 10
+    repeat = args[2] if len(args) > 2 else 3
+
+    path = os.path.join(tempfile.mkdtemp(), "benchmark_contracts_summary.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    seed(db, contracts, nfs_per_contract)
+    print(f"{contracts} contratos, {contracts * nfs_per_contract} NFs (SQLite em {path})\n")
+
+    service = NotaFiscalService(db)
+    old = measure(engine, db, "três consultas por contrato", lambda: summary_per_contract(db), repeat)
+    new = measure(engine, db, "consulta agrupada", service.get_contracts_summary_with_nfs, repeat)
+    measure(engine, db, "consulta agrupada (página de 50)", lambda: service.get_contracts_summary_with_nfs(limit=50), repeat)
+
+    by_id = {row["id"]: row for row in new}
+    assert len(by_id) == len(old) and all(
+        by_id[contract_id]["total_nfs"] == total
+        and by_id[contract_id]["nfs_validadas"] == validadas
+        and Decimal(str(by_id[contract_id]["valor_realizado"])) == valor
+        for contract_id, total, validadas, valor in old
+    ), "resultados divergentes entre as versões"
+    print("\nresultados iguais nas duas versões")
+
+    db.close()
+    engine.dispose()
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
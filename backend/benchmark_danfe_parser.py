@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração de DANFE em PDF (app.services.danfe_parser).
+Mede o tempo por arquivo em série e a vazão no pool de processos de parsing,
+além de quantas páginas foram de fato lidas e quantos arquivos caíram em
+"precisa de XML".
+
+Sem argumentos usa um corpus sintético gerado com ReportLab (DANFEs de 1, 15,
+60 e 200 itens, de 1 a 6 folhas); com uma pasta, usa os PDFs dela.
+
+Uso: python benchmark_danfe_parser.py [pasta_com_pdfs] [repetições]
+"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+from decimal import Decimal
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from app.services.danfe_parser import DanfeNeedsXml, chave_valida, parse_danfe
+from app.services.nfe_parsing import get_parse_workers, parse_in_pool, shutdown_parse_executor
+
+
+ITEMS_FIRST_PAGE = 15
+ITEMS_PER_PAGE = 45
+
+
+def _money(value: Decimal) -> str:
+    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _chave(numero: int) -> str:
+    # cUF, AAMM, CNPJ, modelo 55, série 001, nNF, tpEmis, cNF
+    base = f"3524051234567800019055001{numero:09d}1{numero:08d}"
+    return next(base + str(digit) for digit in range(10) if chave_valida(base + str(digit)))
+
+
+def build_danfe(items: int, numero: int = 1234) -> bytes:
+    """DANFE retrato simplificado: canhoto, chave, totais e tabela de itens com folhas de continuação"""
+    chave = _chave(numero)
+    rows = [
+        (f"P{i}", f"CIMENTO CP-II 50KG LOTE {i}", "25232910", "000", "5102", "SC",
+         "10,0000", "35,9000", Decimal("359.00"))
+        for i in range(1, items + 1)
+    ]
+    total = sum(row[-1] for row in rows)
+    pages = [rows[:ITEMS_FIRST_PAGE]] + [
+        rows[i:i + ITEMS_PER_PAGE] for i in range(ITEMS_FIRST_PAGE, len(rows), ITEMS_PER_PAGE)
+    ]
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+
+    def box(x, y, label, value):
+        pdf.setFont("Helvetica", 5)
+        pdf.drawString(x, y, label)
+        pdf.setFont("Helvetica", 8)
+        pdf.drawString(x, y - 9, value)
+
+    for page_number, page_rows in enumerate(pages, start=1):
+        y = height - 30
+        if page_number == 1:
+            pdf.setFont("Helvetica", 6)
+            pdf.drawString(20, y, "RECEBEMOS DE FORNECEDOR TESTE LTDA OS PRODUTOS E/OU SERVIÇOS CONSTANTES DA NOTA FISCAL ELETRÔNICA INDICADA ABAIXO")
+            y -= 50
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawString(20, y, "FORNECEDOR TESTE LTDA")
+        pdf.setFont("Helvetica", 6)
+        pdf.drawString(230, y, "DANFE")
+        pdf.drawString(230, y - 10, f"Nº {numero:09d}  SÉRIE 001  FOLHA {page_number}/{len(pages)}")
+        box(350, y, "CHAVE DE ACESSO", " ".join(chave[i:i + 4] for i in range(0, 44, 4)))
+        y -= 50
+
+        if page_number == 1:
+            box(20, y, "NOME / RAZÃO SOCIAL", "CONSTRUTORA CLIENTE SA")
+            box(450, y, "DATA DA EMISSÃO", "10/05/2024")
+            y -= 25
+            for i, (label, value) in enumerate([
+                ("BASE DE CÁLC. DO ICMS", "0,00"), ("VALOR DO ICMS", "0,00"), ("VALOR TOTAL DOS PRODUTOS", _money(total))
+            ]):
+                box(20 + i * 150, y, label, value)
+            y -= 22
+            for i, (label, value) in enumerate([
+                ("VALOR DO FRETE", "0,00"), ("VALOR DO IPI", "0,00"), ("VALOR TOTAL DA NOTA", _money(total))
+            ]):
+                box(20 + i * 150, y, label, value)
+            y -= 25
+
+        pdf.setFont("Helvetica-Bold", 7)
+        pdf.drawString(20, y, "DADOS DOS PRODUTOS / SERVIÇOS")
+        y -= 10
+        columns = [20, 60, 230, 270, 290, 310, 330, 370, 420, 470, 510]
+        pdf.setFont("Helvetica", 5)
+        for x, header in zip(columns, ["CÓDIGO", "DESCRIÇÃO", "NCM/SH", "CST", "CFOP", "UN", "QUANT",
+                                       "VALOR UNIT", "VALOR TOTAL", "BC ICMS", "V. ICMS"]):
+            pdf.drawString(x, y, header)
+        y -= 10
+        pdf.setFont("Helvetica", 6)
+        for row in page_rows:
+            for x, value in zip(columns, list(row[:-1]) + [_money(row[-1]), "0,00", "0,00"]):
+                pdf.drawString(x, y, value)
+            y -= 12
+
+        if page_number == 1:
+            pdf.setFont("Helvetica-Bold", 7)
+            pdf.drawString(20, 60, "DADOS ADICIONAIS")
+        pdf.showPage()
+
+    pdf.save()
+    return buffer.getvalue()
+
+
+def load_corpus(directory: str = None):
+    if directory:
+        return [
+            (name, open(os.path.join(directory, name), "rb").read())
+            for name in sorted(os.listdir(directory)) if name.lower().endswith(".pdf")
+        ]
+    return [(f"danfe_{items}_itens.pdf", build_danfe(items, numero)) for numero, items in enumerate((1, 15, 60, 200), 1)]
+
+
+def run_serial(corpus):
+    print(f"{'arquivo':<32} {'itens':>6} {'folhas':>7} {'lidas':>6} {'ms':>9}")
+    for name, content in corpus:
+        started = time.perf_counter()
+        try:
+            danfe = parse_danfe(content)
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{name[:32]:<32} {len(danfe['itens']):>6} {danfe['paginas']:>7} {danfe['paginas_lidas']:>6} {elapsed:>9.1f}")
+        except DanfeNeedsXml as e:
+            print(f"{name[:32]:<32} precisa de XML: {e}")
+
+
+async def run_pool(corpus, repeat: int):
+    documents = [(name, content) for _ in range(repeat) for name, content in corpus]
+    needs_xml = 0
+    started = time.perf_counter()
+    async for _, result in parse_in_pool(parse_danfe, documents):
+        needs_xml += isinstance(result, DanfeNeedsXml)
+    elapsed = time.perf_counter() - started
+    print(
+        f"\npool ({get_parse_workers()} processos): {len(documents)} PDFs em {elapsed:.2f}s "
+        f"= {len(documents) / elapsed:,.1f} PDFs/s ({needs_xml} precisam de XML)"
+    )
+
+
+def main():
+    args = sys.argv[1:]
+    directory = args.pop(0) if args and os.path.isdir(args[0]) else None
+    repeat = int(args[0]) if args else 10
+
+    corpus = load_corpus(directory)
+    run_serial(corpus)
+    asyncio.run(run_pool(corpus, repeat))
+    shutdown_parse_executor()
+
+
+if __name__ == "__main__":
+    main()
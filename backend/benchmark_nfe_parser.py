@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark do parser de NF-e (app.services.nfe_parser).
+Compara o parser de uma passada com a extração antiga baseada em find()
+para documentos com 1, 100 e 1000 itens.
+
+Uso: python benchmark_nfe_parser.py [repetições]
+"""
+
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+
+from app.services.nfe_parser import parse_nfe
+
+NS = 'http://www.portalfiscal.inf.br/nfe'
+
+
+def build_nfe(items: int) -> bytes:
+    det = ''.join(
+        f'<det nItem="{i}"><prod><cProd>P{i}</cProd><xProd>Cimento CP-II 50kg lote {i}</xProd>'
+        f'<NCM>25232910</NCM><CFOP>5102</CFOP><uCom>SC</uCom><qCom>10.0000</qCom>'
+        f'<vUnCom>35.9000</vUnCom><vProd>359.00</vProd></prod>'
+        f'<imposto><ICMS><ICMS00><vICMS>64.62</vICMS></ICMS00></ICMS></imposto></det>'
+        for i in range(1, items + 1)
+    )
+    total = Decimal('359.00') * items
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="{NS}"><NFe><infNFe Id="NFe{"3" * 44}" versao="4.00">'
+        f'<ide><nNF>1234</nNF><serie>1</serie><dhEmi>2024-05-10T10:00:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>12345678000190</CNPJ><xNome>Fornecedor Teste</xNome></emit>'
+        f'{det}'
+        f'<total><ICMSTot><vProd>{total}</vProd><vFrete>0.00</vFrete><vICMS>0.00</vICMS>'
+        f'<vIPI>0.00</vIPI><vNF>{total}</vNF></ICMSTot></total>'
+        f'<transp><vol><pesoL>500.000</pesoL><pesoB>510.000</pesoB></vol></transp>'
+        f'</infNFe></NFe></nfeProc>'
+    ).encode()
+
+
+def legacy_parse(content: bytes) -> dict:
+    """Extração anterior: find() repetido e busca por descendentes a cada item"""
+    ns = {'nfe': NS}
+    root = ET.fromstring(content)
+    inf_nfe = root.find('.//nfe:infNFe', ns)
+    ide = inf_nfe.find('nfe:ide', ns)
+    total = inf_nfe.find('.//nfe:total/nfe:ICMSTot', ns)
+    itens = []
+    for det in inf_nfe.findall('nfe:det', ns):
+        prod = det.find('nfe:prod', ns)
+        itens.append({
+            'descricao': prod.find('nfe:xProd', ns).text,
+            'unidade': prod.find('nfe:uCom', ns).text,
+            'quantidade': Decimal(prod.find('nfe:qCom', ns).text),
+            'valor_unitario': Decimal(prod.find('nfe:vUnCom', ns).text),
+            'valor_total': Decimal(prod.find('nfe:vProd', ns).text)
+        })
+    return {'numero': ide.find('nfe:nNF', ns).text, 'valor_total': Decimal(total.find('nfe:vNF', ns).text), 'itens': itens}
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    print(f"{'itens':>6} {'parser (ms)':>12} {'anterior (ms)':>14} {'itens/s':>12}")
+    for items in (1, 100, 1000):
+        content = build_nfe(items)
+        number = max(1, repeat // max(1, items // 100))
+
+        assert len(parse_nfe(content)['itens']) == items
+        new = min(timeit.repeat(lambda: parse_nfe(content), number=number, repeat=3)) / number
+        old = min(timeit.repeat(lambda: legacy_parse(content), number=number, repeat=3)) / number
+
+        print(f"{items:>6} {new * 1000:>12.3f} {old * 1000:>14.3f} {items / new:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Stand-in local da API de compartilhamentos do Microsoft Graph, para testar a
+ingestão de pastas do OneDrive sem conta Microsoft.
+
+Serve os arquivos de uma pasta local como a pasta compartilhada de qualquer
+URL (o token de compartilhamento é ignorado), com paginação via
+@odata.nextLink e, opcionalmente, latência e falhas 503 aleatórias para
+exercitar as novas tentativas do GraphFolderFetcher.
+
+Uso:
+    python onedrive_standin.py <pasta> [--port 8765] [--page-size 50] [--fail-rate 0.1] [--latency 0.05]
+    ONEDRIVE_GRAPH_URL=http://127.0.0.1:8765 uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import os
+import random
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
+
+
+def create_app(directory: str, page_size: int = 50, fail_rate: float = 0.0, latency: float = 0.0) -> FastAPI:
+    app = FastAPI(title="OneDrive stand-in")
+    names = sorted(name for name in os.listdir(directory) if os.path.isfile(os.path.join(directory, name)))
+
+    @app.middleware("http")
+    async def chaos(request: Request, call_next):
+        if latency:
+            await asyncio.sleep(latency)
+        if fail_rate and random.random() < fail_rate:
+            return JSONResponse({"error": {"code": "serviceNotAvailable"}}, status_code=503, headers={"Retry-After": "0"})
+        return await call_next(request)
+
+    @app.get("/shares/{token}/driveItem/children")
+    async def children(token: str, request: Request):
+        top = int(request.query_params.get("$top", page_size))
+        top = min(top, page_size)
+        skip = int(request.query_params.get("$skiptoken", 0))
+        base = str(request.base_url).rstrip("/")
+
+        page = {
+            "value": [
+                {
+                    "id": str(index),
+                    "name": name,
+                    "size": os.path.getsize(os.path.join(directory, name)),
+                    "file": {},
+                    "parentReference": {"driveId": "standin"},
+                    "@microsoft.graph.downloadUrl": f"{base}/download/{index}",
+                }
+                for index, name in enumerate(names[skip:skip + top], start=skip)
+            ]
+        }
+        if skip + top < len(names):
+            page["@odata.nextLink"] = f"{base}/shares/{token}/driveItem/children?$top={top}&$skiptoken={skip + top}"
+        return page
+
+    @app.get("/download/{index}")
+    async def download(index: int):
+        if index >= len(names):
+            raise HTTPException(status_code=404)
+        return FileResponse(os.path.join(directory, names[index]))
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.directory, args.page_size, args.fail_rate, args.latency), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Script para reconstruir o agregado de NFs por contrato (contrato_nf_resumo)
+
+Use quando o agregado divergir das tabelas de origem, por exemplo depois de
+cargas feitas diretamente no banco pelo n8n.
+"""
+
+from app.core.database import SessionLocal
+from app.services.contract_ledger import ContractLedgerService
+
+
+def rebuild_contract_ledger():
+    db = SessionLocal()
+    try:
+        total = ContractLedgerService(db).rebuild()
+        print(f"Agregado reconstruído para {total} contrato(s) com NFs")
+    except Exception as e:
+        db.rollback()
+        print(f"Erro ao reconstruir agregado: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild_contract_ledger()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regressão de N+1 na listagem de notas fiscais (GET /api/v1/nf/)
+
+Conta os comandos SQL da listagem em um SQLite em memória e confere que a
+quantidade não cresce com o tamanho da página (contrato vem por join e a
+contagem de itens por subconsulta agrupada, sem carregar os itens).
+
+    python test_nf_listing_queries.py   (ou pytest test_nf_listing_queries.py)
+"""
+
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.database import Base
+import app.models  # noqa: F401 (registra todas as tabelas)
+from app.api.routes.nf import get_nfs
+from app.models.contracts import Contract
+from app.models.notas_fiscais import NotaFiscal, NotaFiscalItem
+from app.models.users import User
+from app.services.nf_service import NotaFiscalService
+
+PAGE_SIZES = (10, 50, 100)
+ITEMS_PER_NF = 5
+
+
+def _seed_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+
+    user = User(email="teste@gmx", username="teste", password="x", role="admin", isActive=True)
+    db.add(user)
+    db.flush()
+
+    contracts = [
+        Contract(
+            numero_contrato=f"C{index}", nome_projeto=f"Projeto {index}", cliente="Cliente",
+            tipo_contrato="material", valor_original=Decimal("100000"),
+            data_inicio=datetime(2024, 1, 1), criado_por=user.id
+        )
+        for index in range(3)
+    ]
+    db.add_all(contracts)
+    db.flush()
+
+    for index in range(max(PAGE_SIZES)):
+        nf = NotaFiscal(
+            numero=str(index), serie="1", cnpj_fornecedor="00000000000100", nome_fornecedor="Fornecedor",
+            valor_total=Decimal("100.00"), data_emissao=datetime(2024, 1, 1 + index % 28),
+            pasta_origem="pasta", status_processamento="processado",
+            contrato_id=contracts[index % 3].id if index % 4 else None
+        )
+        db.add(nf)
+        db.flush()
+        db.add_all(
+            NotaFiscalItem(
+                nota_id=nf.id, numero_item=item, descricao=f"item {item}", quantidade=1,
+                unidade="UN", valor_unitario=Decimal("20"), valor_total=Decimal("20.00")
+            )
+            for item in range(ITEMS_PER_NF)
+        )
+    db.commit()
+    return engine, db
+
+
+def _count_statements(engine, db, call):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db.expire_all()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        call()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return len(statements)
+
+
+def _list_route(db, limit):
+    return asyncio.run(get_nfs(
+        skip=0, limit=limit, status_filter=None, supplier=None, contract_id=None,
+        after=None, cursor=False, include_total=False, current_user=None, db=db
+    ))
+
+
+def test_nf_listing_query_count_is_constant():
+    """A listagem (serviço e rota) executa o mesmo número de consultas para qualquer página"""
+    engine, db = _seed_session()
+    service = NotaFiscalService(db)
+
+    service_counts = {
+        limit: _count_statements(engine, db, lambda: service.get_notas_fiscais(limit=limit))
+        for limit in PAGE_SIZES
+    }
+    route_counts = {
+        limit: _count_statements(engine, db, lambda: _list_route(db, limit))
+        for limit in PAGE_SIZES
+    }
+
+    response = _list_route(db, max(PAGE_SIZES))
+    assert len(response["nfs"]) == max(PAGE_SIZES)
+    assert all(row["items_count"] == ITEMS_PER_NF for row in response["nfs"])
+
+    assert len(set(service_counts.values())) == 1, f"Consultas do serviço variam com a página: {service_counts}"
+    assert len(set(route_counts.values())) == 1, f"Consultas da rota variam com a página: {route_counts}"
+    assert route_counts[max(PAGE_SIZES)] <= 3, f"Listagem executou {route_counts} consultas"
+
+    print(f"Consultas por página (serviço): {service_counts}")
+    print(f"Consultas por página (rota): {route_counts}")
+
+
+if __name__ == "__main__":
+    test_nf_listing_query_count_is_constant()
+    print("OK")
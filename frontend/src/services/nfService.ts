@@ -66,7 +66,7 @@ export const nfService = {
   processFolder: (folderName: string): Promise<ApiResponse<{
     success: boolean;
     message: string;
-    webhook_status: number;
+    webhook_status: number | null;
     processing_log_id: number;
     n8n_url: string;
   }>> => {
@@ -134,7 +134,7 @@ export const notasFiscaisService = {
   processFolder: async (folderName: string): Promise<ApiResponse<{
     success: boolean;
     message: string;
-    webhook_status: number;
+    webhook_status: number | null;
     processing_log_id: number;
     n8n_url: string;
   }>> => {